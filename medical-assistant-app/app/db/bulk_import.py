@@ -0,0 +1,379 @@
+"""Bulk loading of patients, doctors, queries, suggestions and reviews
+
+Source files (CSV or NDJSON, one object per line) are streamed in chunks.
+Each chunk is converted, has its foreign keys resolved, and is written with
+Core ``executemany`` inserts in one transaction, together with its
+checkpoint. An import that stops part way can therefore be rerun: chunks
+already committed are skipped.
+
+Rows are identified in the source by an ``id`` column, or by their 1-based
+position in the file when there is none. Imported rows are recorded in
+``import_key_map`` against that source id. References are resolved in one of
+two ways:
+
+- ``<entity>_id`` columns (``patient_id``, ``query_id``, ``doctor_id``) go
+  through the key map, so an export keeps its own numbering.
+- ``patient_external_id`` and ``doctor_external_id`` look up the
+  ``external_id`` of rows already in the database.
+
+For the duration of a load, the non-unique indexes of the table being
+loaded are dropped, and so are the FTS sync triggers and change-counter
+triggers. Afterwards the indexes are rebuilt once, the search tables are
+caught up in one pass, and the change counters are bumped so cached list
+ETags are invalidated.
+"""
+from datetime import datetime
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+import csv
+import json
+import os
+import time
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, bindparam, delete, insert, inspect, select, text
+from sqlalchemy.engine import Connection, Engine
+from sqlmodel import SQLModel
+
+from app.db.change_tracking import TRACKED_TABLES, drop_change_tracking_triggers, install_change_tracking, touch_tables
+from app.db.migrations import ensure_indexes
+from app.db.search import drop_search_triggers, index_missing, install_search, search_supported
+from app.models import AISuggestion, Doctor, Patient, PatientContext, Query, QueryPriority, QueryStatus, Review
+
+# Source rows converted and committed per transaction
+DEFAULT_CHUNK_SIZE = 5000
+
+# Kept apart from SQLModel.metadata, which app.models clears on import
+_import_metadata = MetaData()
+
+import_key_map = Table(
+    "import_key_map",
+    _import_metadata,
+    Column("entity", String, primary_key=True),
+    Column("source_id", String, primary_key=True),
+    Column("target_id", Integer, nullable=False),
+)
+
+import_progress = Table(
+    "import_progress",
+    _import_metadata,
+    Column("entity", String, primary_key=True),
+    Column("source", String, primary_key=True),
+    Column("rows_done", Integer, nullable=False),
+    Column("updated_at", DateTime, nullable=False),
+)
+
+class BulkImportError(ValueError):
+    """A source row could not be converted or its references resolved"""
+
+class Reference(NamedTuple):
+    """A foreign key filled from ``<entity>_id`` (key map) or ``<entity>_external_id`` (lookup)"""
+    column: str
+    entity: str
+    external_table: Optional[Table] = None
+
+class Entity(NamedTuple):
+    name: str
+    table: Table
+    convert: Callable[[Dict[str, Any]], Dict[str, Any]]
+    references: Tuple[Reference, ...] = ()
+
+def _text(row: Dict[str, Any], key: str, default: Optional[str] = None) -> Optional[str]:
+    value = row.get(key)
+    if value is None or value == "":
+        return default
+    return str(value)
+
+def _required(row: Dict[str, Any], key: str) -> str:
+    value = _text(row, key)
+    if value is None:
+        raise BulkImportError(f"missing {key}")
+    return value
+
+def _int(row: Dict[str, Any], key: str) -> Optional[int]:
+    value = _text(row, key)
+    return int(float(value)) if value is not None else None
+
+def _float(row: Dict[str, Any], key: str) -> Optional[float]:
+    value = _text(row, key)
+    return float(value) if value is not None else None
+
+def _bool(row: Dict[str, Any], key: str) -> bool:
+    value = row.get(key)
+    if isinstance(value, bool):
+        return value
+    return str(value or "").strip().lower() in ("1", "true", "yes", "y", "t")
+
+def _datetime(row: Dict[str, Any], key: str) -> Optional[datetime]:
+    value = _text(row, key)
+    if value is None:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).replace(tzinfo=None)
+    except ValueError:
+        raise BulkImportError(f"invalid {key} '{value}'")
+
+def _enum(enum_type, row: Dict[str, Any], key: str, default):
+    value = _text(row, key)
+    if value is None:
+        return default
+    try:
+        return enum_type[value.upper()]
+    except KeyError:
+        try:
+            return enum_type(value.lower())
+        except ValueError:
+            raise BulkImportError(f"invalid {key} '{value}'")
+
+def _timestamps(row: Dict[str, Any], now: datetime) -> Dict[str, Any]:
+    return {"created_at": _datetime(row, "created_at") or now, "updated_at": _datetime(row, "updated_at")}
+
+def _patient(row: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "external_id": _required(row, "external_id"),
+        "name": _required(row, "name"),
+        "email": _required(row, "email"),
+        "age": _int(row, "age"),
+    }
+
+def _doctor(row: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "external_id": _required(row, "external_id"),
+        "name": _required(row, "name"),
+        "email": _required(row, "email"),
+        "specialty": _text(row, "specialty"),
+    }
+
+def _query(row: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "content": _required(row, "content"),
+        "status": _enum(QueryStatus, row, "status", QueryStatus.PENDING),
+        "priority": _enum(QueryPriority, row, "priority", QueryPriority.MEDIUM),
+        "safety_score": _float(row, "safety_score"),
+        **_timestamps(row, datetime.utcnow()),
+    }
+
+def _suggestion(row: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "content": _required(row, "content"),
+        "model_used": _text(row, "model_used", "imported"),
+        "confidence_score": _float(row, "confidence_score"),
+        **_timestamps(row, datetime.utcnow()),
+    }
+
+def _review(row: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "content": _required(row, "content"),
+        "approved": _bool(row, "approved"),
+        "notes": _text(row, "notes"),
+        **_timestamps(row, datetime.utcnow()),
+    }
+
+PATIENT_TABLE = Patient.__table__
+DOCTOR_TABLE = Doctor.__table__
+
+# In load order: every entity only references the ones before it
+ENTITIES: Dict[str, Entity] = {
+    "patient": Entity("patient", PATIENT_TABLE, _patient),
+    "doctor": Entity("doctor", DOCTOR_TABLE, _doctor),
+    "query": Entity("query", Query.__table__, _query, (Reference("patient_id", "patient", PATIENT_TABLE),)),
+    "suggestion": Entity("suggestion", AISuggestion.__table__, _suggestion, (Reference("query_id", "query"),)),
+    "review": Entity("review", Review.__table__, _review, (
+        Reference("query_id", "query"),
+        Reference("doctor_id", "doctor", DOCTOR_TABLE),
+    )),
+}
+
+def read_rows(path: str) -> Iterator[Dict[str, Any]]:
+    """Stream rows from a CSV file (with a header) or an NDJSON file"""
+    if path.endswith((".ndjson", ".jsonl")):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    else:
+        with open(path, newline="", encoding="utf-8") as f:
+            yield from csv.DictReader(f)
+
+def _resolve(connection: Connection, entity: Entity, rows: List[Dict[str, Any]], records: List[Dict[str, Any]]) -> None:
+    """Fill each reference column of ``records`` from the matching source rows"""
+    for reference in entity.references:
+        by_key, by_external = {}, {}
+        external_column = reference.column.replace("_id", "_external_id")
+        for index, row in enumerate(rows):
+            external = _text(row, external_column)
+            if external is not None and reference.external_table is not None:
+                by_external.setdefault(external, []).append(index)
+            else:
+                by_key.setdefault(_required(row, reference.column), []).append(index)
+
+        resolved: Dict[int, int] = {}
+        if by_key:
+            found = connection.execute(
+                select(import_key_map.c.source_id, import_key_map.c.target_id).where(
+                    import_key_map.c.entity == reference.entity,
+                    import_key_map.c.source_id.in_(bindparam("keys", expanding=True)),
+                ),
+                {"keys": list(by_key)},
+            ).all()
+            for source_id, target_id in found:
+                for index in by_key[source_id]:
+                    resolved[index] = target_id
+        if by_external:
+            table = reference.external_table
+            found = connection.execute(
+                select(table.c.external_id, table.c.id).where(
+                    table.c.external_id.in_(bindparam("keys", expanding=True))
+                ),
+                {"keys": list(by_external)},
+            ).all()
+            for external_id, target_id in found:
+                for index in by_external[external_id]:
+                    resolved[index] = target_id
+
+        for index, record in enumerate(records):
+            if index not in resolved:
+                row = rows[index]
+                key = _text(row, external_column) or _text(row, reference.column)
+                raise BulkImportError(f"unknown {reference.entity} '{key}' in {reference.column}")
+            record[reference.column] = resolved[index]
+
+def _load_chunk(
+    connection: Connection,
+    entity: Entity,
+    rows: List[Dict[str, Any]],
+    first_row: int,
+) -> int:
+    records = []
+    for offset, row in enumerate(rows):
+        try:
+            records.append(entity.convert(row))
+        except ValueError as e:
+            raise BulkImportError(f"{entity.name} row {first_row + offset}: {e}") from e
+    try:
+        _resolve(connection, entity, rows, records)
+    except BulkImportError as e:
+        raise BulkImportError(f"{entity.name} rows {first_row}-{first_row + len(rows) - 1}: {e}") from e
+
+    ids = connection.execute(
+        insert(entity.table).returning(entity.table.c.id, sort_by_parameter_order=True), records
+    ).scalars().all()
+    connection.execute(insert(import_key_map), [
+        {"entity": entity.name, "source_id": _text(row, "id") or str(first_row + offset), "target_id": target_id}
+        for offset, (row, target_id) in enumerate(zip(rows, ids))
+    ])
+    return len(ids)
+
+def _deferrable_indexes(connection: Connection, table: Table) -> List[str]:
+    """Non-unique indexes that can be rebuilt after the load"""
+    return [
+        index["name"] for index in inspect(connection).get_indexes(table.name)
+        if not index["unique"] and index["name"] in {ix.name for ix in table.indexes}
+    ]
+
+def import_entity(
+    engine: Engine,
+    entity_name: str,
+    path: str,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    restart: bool = False,
+    defer_indexes: bool = True,
+    progress: Optional[Callable[[str, int], None]] = None,
+) -> Dict[str, Any]:
+    """Load one source file; returns row counts and throughput
+
+    Resumes after the last committed chunk for this entity and file unless
+    ``restart`` is set, in which case the checkpoint is ignored (rows from the
+    earlier attempt stay, so only restart after clearing them).
+    """
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be at least 1")
+    entity = ENTITIES[entity_name]
+    source = os.path.abspath(path)
+    checkpoint = {"entity": entity.name, "source": source}
+
+    with engine.begin() as connection:
+        _import_metadata.create_all(connection)
+        done = 0 if restart else connection.execute(
+            select(import_progress.c.rows_done).filter_by(**checkpoint)
+        ).scalar() or 0
+        deferred = _deferrable_indexes(connection, entity.table) if defer_indexes else []
+        for name in deferred:
+            connection.execute(text(f'DROP INDEX IF EXISTS "{name}"'))
+
+    stats = {"entity": entity.name, "source": path, "skipped": done, "imported": 0, "chunks": 0}
+    start = time.perf_counter()
+    try:
+        rows = read_rows(path)
+        # Rows committed by an earlier run
+        for _ in islice(rows, done):
+            pass
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            with engine.begin() as connection:
+                imported = _load_chunk(connection, entity, chunk, done + 1)
+                done += len(chunk)
+                connection.execute(import_progress.delete().filter_by(**checkpoint))
+                connection.execute(import_progress.insert().values(
+                    **checkpoint, rows_done=done, updated_at=datetime.utcnow()
+                ))
+            stats["imported"] += imported
+            stats["chunks"] += 1
+            if progress is not None:
+                progress(entity.name, done)
+    finally:
+        stats["load_seconds"] = time.perf_counter() - start
+        index_start = time.perf_counter()
+        with engine.begin() as connection:
+            ensure_indexes(connection, entity.table.name)
+        stats["index_seconds"] = time.perf_counter() - index_start
+
+    stats["rows_per_second"] = stats["imported"] / stats["load_seconds"] if stats["load_seconds"] else 0.0
+    return stats
+
+def bulk_import(
+    engine: Engine,
+    sources: Iterable[Tuple[str, str]],
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    restart: bool = False,
+    progress: Optional[Callable[[str, int], None]] = None,
+) -> Dict[str, Any]:
+    """Import ``(entity, path)`` pairs in dependency order
+
+    Search and change-tracking triggers are off for the duration; the search
+    tables are caught up and the change counters bumped at the end, also
+    when an entity fails part way.
+    """
+    sources = sorted(sources, key=lambda source: list(ENTITIES).index(source[0]))
+    SQLModel.metadata.create_all(engine)
+    with engine.begin() as connection:
+        if search_supported(connection):
+            drop_search_triggers(connection)
+        drop_change_tracking_triggers(connection)
+
+    results = []
+    start = time.perf_counter()
+    try:
+        for entity_name, path in sources:
+            results.append(import_entity(engine, entity_name, path, chunk_size, restart, progress=progress))
+    finally:
+        finish_start = time.perf_counter()
+        indexed = 0
+        with engine.begin() as connection:
+            if search_supported(connection):
+                install_search(connection)
+                indexed = index_missing(connection)
+            install_change_tracking(connection)
+            touch_tables(connection, TRACKED_TABLES)
+            # Patient context snapshots were not updated row by row; they are rebuilt on next use
+            connection.execute(delete(PatientContext))
+            connection.execute(text("ANALYZE"))
+        finish_seconds = time.perf_counter() - finish_start
+
+    return {
+        "entities": results,
+        "search_rows_indexed": indexed,
+        "finish_seconds": finish_seconds,
+        "elapsed_seconds": time.perf_counter() - start,
+    }
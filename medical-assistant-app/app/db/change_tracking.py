@@ -0,0 +1,86 @@
+"""Per-table change counters for conditional GETs
+
+``change_counter`` holds one row per tracked table whose ``version`` is
+bumped by triggers on every INSERT, UPDATE and DELETE, whichever process
+makes the write (API, workers, scripts). List endpoints derive their ETag
+from the counters of the tables they read, so checking whether a client's
+copy is still current costs one primary-key lookup instead of the listing.
+Counters start at a random value so a recreated database does not reissue
+ETags a client may still hold.
+
+SQLite gets row-level triggers; PostgreSQL gets one statement-level
+trigger per table calling a shared PL/pgSQL function.
+"""
+from typing import Dict, Iterable, List
+import secrets
+
+from sqlalchemy import bindparam, text
+from sqlalchemy.engine import Connection
+
+# Tables whose changes invalidate cached list responses
+TRACKED_TABLES = ("query", "review", "file", "aisuggestion")
+
+# Upper bound of a counter's random starting value
+INITIAL_VERSION_RANGE = 1_000_000_000
+
+_POSTGRES_BUMP_FUNCTION = (
+    "CREATE OR REPLACE FUNCTION change_counter_bump() RETURNS trigger AS $$ BEGIN "
+    "UPDATE change_counter SET version = version + 1 WHERE table_name = TG_ARGV[0]; RETURN NULL; "
+    "END $$ LANGUAGE plpgsql"
+)
+
+def _is_postgres(connection: Connection) -> bool:
+    return connection.dialect.name == "postgresql"
+
+def _trigger_ddl(connection: Connection, table: str) -> List[str]:
+    if _is_postgres(connection):
+        return [
+            f'DROP TRIGGER IF EXISTS change_counter_{table} ON "{table}"',
+            f'CREATE TRIGGER change_counter_{table} AFTER INSERT OR UPDATE OR DELETE ON "{table}" '
+            f"FOR EACH STATEMENT EXECUTE FUNCTION change_counter_bump('{table}')",
+        ]
+    bump = f"UPDATE change_counter SET version = version + 1 WHERE table_name = '{table}';"
+    return [
+        f'CREATE TRIGGER IF NOT EXISTS change_counter_{table}_{suffix} AFTER {event} ON "{table}" BEGIN {bump} END'
+        for suffix, event in (("ai", "INSERT"), ("au", "UPDATE"), ("ad", "DELETE"))
+    ]
+
+def install_change_tracking(connection: Connection) -> None:
+    """Create the counter table, its rows and the triggers that bump them"""
+    connection.execute(text(
+        "CREATE TABLE IF NOT EXISTS change_counter (table_name VARCHAR PRIMARY KEY, version BIGINT NOT NULL)"
+    ))
+    if _is_postgres(connection):
+        connection.execute(text(_POSTGRES_BUMP_FUNCTION))
+    for table in TRACKED_TABLES:
+        connection.execute(text(
+            "INSERT INTO change_counter (table_name, version) VALUES (:table, :version) ON CONFLICT (table_name) DO NOTHING"
+        ), {"table": table, "version": secrets.randbelow(INITIAL_VERSION_RANGE)})
+        for statement in _trigger_ddl(connection, table):
+            connection.execute(text(statement))
+
+def drop_change_tracking_triggers(connection: Connection) -> None:
+    """Remove the counter triggers (e.g. before a bulk load); call ``touch_tables`` afterwards"""
+    for table in TRACKED_TABLES:
+        if _is_postgres(connection):
+            connection.execute(text(f'DROP TRIGGER IF EXISTS change_counter_{table} ON "{table}"'))
+            continue
+        for suffix in ("ai", "au", "ad"):
+            connection.execute(text(f"DROP TRIGGER IF EXISTS change_counter_{table}_{suffix}"))
+
+def touch_tables(connection: Connection, tables: Iterable[str]) -> None:
+    """Bump the counters of ``tables`` for changes the triggers did not see"""
+    connection.execute(
+        text("UPDATE change_counter SET version = version + 1 WHERE table_name IN :tables")
+        .bindparams(bindparam("tables", expanding=True)),
+        {"tables": list(tables)},
+    )
+
+def table_versions(connection: Connection, tables: Iterable[str]) -> Dict[str, int]:
+    """Current change counter of each table"""
+    rows = connection.execute(
+        text("SELECT table_name, version FROM change_counter WHERE table_name IN :tables")
+        .bindparams(bindparam("tables", expanding=True)),
+        {"tables": list(tables)},
+    ).all()
+    return dict(rows)
@@ -1,6 +1,12 @@
 from sqlmodel import SQLModel, Session, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.ext.asyncio import create_async_engine
 import os
 from dotenv import load_dotenv
+from app.db.migrations import run_migrations
+from app.db.engine_profile import default_pragmas, engine_options, install_sqlite_pragmas
+from app.db.profiler import SQL_PROFILE, install_profiler
+from app.metrics.instruments import instrument_engine
 
 # Load environment variables
 load_dotenv()
@@ -8,20 +14,63 @@ load_dotenv()
 # Get database URL from environment or use default SQLite database
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./medical_assistant.db")
 
-# Create SQLAlchemy engine
+# Async drivers used for each database dialect by the API routes
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+}
+
+def to_async_url(url: str) -> str:
+    """Point a database URL at the async driver for its dialect"""
+    scheme, sep, rest = url.partition("://")
+    dialect = scheme.split("+")[0]
+    if dialect not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for database URL scheme '{scheme}'")
+    return f"{ASYNC_DRIVERS[dialect]}{sep}{rest}"
+
+# Async URL for the same database; override to pick another driver
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or to_async_url(DATABASE_URL)
+
+# SQLite pragmas applied to every connection (None with DB_ENGINE_PROFILE=default)
+SQLITE_PRAGMAS = default_pragmas()
+
+# Create SQLAlchemy engine (startup, background workers and scripts)
 engine = create_engine(
     DATABASE_URL, 
     echo=False,  # Set to True to see SQL queries
-    connect_args={"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {}
+    **engine_options(DATABASE_URL)
 )
+install_sqlite_pragmas(engine, SQLITE_PRAGMAS)
+instrument_engine(engine, "sync")
+
+# Async engine used by the API routes so database I/O never blocks the event loop
+async_engine = create_async_engine(ASYNC_DATABASE_URL, echo=False, **engine_options(ASYNC_DATABASE_URL))
+install_sqlite_pragmas(async_engine.sync_engine, SQLITE_PRAGMAS)
+instrument_engine(async_engine.sync_engine, "async")
+
+# Opt-in statement profiling on top of the metrics listeners (SQL_PROFILE=dev adds per-request headers, prod only aggregates)
+install_profiler(SQL_PROFILE)
 
 # Function to create all tables in the database
 def create_db_and_tables():
-    """Create all tables defined in SQLModel models"""
+    """Create all tables defined in SQLModel models and apply pending migrations"""
     SQLModel.metadata.create_all(engine)
+    run_migrations(engine)
 
-# Session dependency for FastAPI endpoints
+# Session for synchronous callers (scripts, background workers)
 def get_session():
-    """Provide a database session for dependency injection in FastAPI routes"""
+    """Provide a blocking database session"""
     with Session(engine) as session:
+        yield session
+
+# Session dependency for FastAPI endpoints
+async def get_async_session():
+    """Provide an async database session for dependency injection in FastAPI routes
+
+    Objects stay usable after commit (no expiry), since reloading an expired
+    attribute would need implicit I/O. Synchronous helpers shared with the
+    workers and scripts are called through ``session.run_sync``.
+    """
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
         yield session
\ No newline at end of file
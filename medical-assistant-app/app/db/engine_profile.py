@@ -0,0 +1,147 @@
+"""Engine settings for SQLite and server databases
+
+SQLite connections get a set of pragmas on connect: WAL journaling so
+readers never block the writer, ``synchronous=NORMAL`` so a commit only
+appends to the WAL instead of syncing a rollback journal, a busy timeout so
+writers from other processes wait instead of failing with "database is
+locked", and larger page cache, memory map and in-memory temp tables.
+Connection pooling is sized per backend: file databases share a small pool
+(SQLite allows one writer at a time anyway), ``:memory:`` databases use a
+single static connection, and server databases get a checked, recycled pool.
+"""
+from typing import Any, Dict, NamedTuple, Optional
+import os
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import Connection, Engine, make_url
+from sqlalchemy.pool import StaticPool
+
+# Set to "default" to leave SQLite's own settings alone (rollback journal, full sync)
+DB_ENGINE_PROFILE = os.getenv("DB_ENGINE_PROFILE", "tuned")
+
+# SQLite journal mode: WAL lets readers run alongside the single writer
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+
+# SQLite sync level: NORMAL is durable across application crashes in WAL mode
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+
+# Milliseconds a connection waits for a lock held by another writer
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+# Bytes of the database file memory-mapped for reads (0 disables)
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+
+# Page cache per connection; negative values are KiB (-65536 is 64 MiB)
+SQLITE_CACHE_SIZE = int(os.getenv("SQLITE_CACHE_SIZE", "-65536"))
+
+# Where temporary tables and indexes live (MEMORY, FILE or DEFAULT)
+SQLITE_TEMP_STORE = os.getenv("SQLITE_TEMP_STORE", "MEMORY")
+
+# Pool size and overflow for each engine (server databases and SQLite files)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+
+# Seconds to wait for a free pooled connection
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+# Seconds after which server connections are replaced (avoids server-side idle cutoffs)
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
+class SQLitePragmas(NamedTuple):
+    journal_mode: str = SQLITE_JOURNAL_MODE
+    synchronous: str = SQLITE_SYNCHRONOUS
+    busy_timeout: int = SQLITE_BUSY_TIMEOUT_MS
+    mmap_size: int = SQLITE_MMAP_SIZE
+    cache_size: int = SQLITE_CACHE_SIZE
+    temp_store: str = SQLITE_TEMP_STORE
+
+    def statements(self):
+        return [f"PRAGMA {name} = {value}" for name, value in self._asdict().items()]
+
+def default_pragmas() -> Optional[SQLitePragmas]:
+    """Pragmas for the configured profile, or None for SQLite's defaults"""
+    return SQLitePragmas() if DB_ENGINE_PROFILE == "tuned" else None
+
+def is_memory_url(url) -> bool:
+    url = make_url(url)
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+def engine_options(url, pool_size: int = DB_POOL_SIZE, max_overflow: int = DB_MAX_OVERFLOW) -> Dict[str, Any]:
+    """Keyword arguments for ``create_engine``/``create_async_engine`` for this URL"""
+    url = make_url(url)
+    if url.get_backend_name() == "sqlite":
+        if is_memory_url(url):
+            # Every pooled connection would get its own empty database
+            return {"poolclass": StaticPool, "connect_args": {"check_same_thread": False}}
+        return {
+            "pool_size": pool_size,
+            "max_overflow": max_overflow,
+            "pool_timeout": DB_POOL_TIMEOUT,
+            # The pysqlite driver waits on locks itself too; keep it in step with busy_timeout
+            "connect_args": {"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+        }
+    return {
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        # Drop connections the server closed while they sat in the pool
+        "pool_pre_ping": True,
+    }
+
+def install_sqlite_pragmas(engine: Engine, pragmas: Optional[SQLitePragmas]) -> None:
+    """Run ``pragmas`` on every new connection of a SQLite engine
+
+    Pass ``async_engine.sync_engine`` for async engines. Does nothing for
+    other backends or when ``pragmas`` is None.
+    """
+    if pragmas is None or engine.dialect.name != "sqlite":
+        return
+    statements = pragmas.statements()
+    if is_memory_url(engine.url):
+        # In-memory databases cannot use WAL (SQLite silently keeps "memory")
+        statements = [s for s in statements if not s.startswith("PRAGMA journal_mode")]
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for statement in statements:
+                cursor.execute(statement)
+        finally:
+            cursor.close()
+
+def read_pragmas(connection: Connection) -> Dict[str, Any]:
+    """Current pragma values on a live SQLite connection"""
+    return {
+        name: connection.execute(text(f"PRAGMA {name}")).scalar()
+        for name in SQLitePragmas._fields
+    }
+
+def describe_engine(engine: Engine, connection: Optional[Connection] = None) -> Dict[str, Any]:
+    """Driver, pool state and (for SQLite) effective pragmas of an engine
+
+    Pragmas are read on ``connection`` when given (e.g. from an async
+    engine's ``run_sync``), otherwise on a new connection from ``engine``.
+    """
+    pool = engine.pool
+    info: Dict[str, Any] = {
+        "url": engine.url.render_as_string(hide_password=True),
+        "dialect": engine.dialect.name,
+        "driver": engine.dialect.driver,
+        "pool_class": type(pool).__name__,
+        "pool_status": pool.status(),
+        "pool_size": getattr(pool, "size", lambda: None)(),
+        "checked_out": getattr(pool, "checkedout", lambda: None)(),
+        "pragmas": None,
+        "server_version": None,
+    }
+    if engine.dialect.name == "sqlite":
+        if connection is None:
+            with engine.connect() as own_connection:
+                return describe_engine(engine, own_connection)
+        info["pragmas"] = read_pragmas(connection)
+        info["server_version"] = connection.execute(text("SELECT sqlite_version()")).scalar()
+    elif engine.dialect.server_version_info:
+        info["server_version"] = ".".join(str(part) for part in engine.dialect.server_version_info)
+    return info
@@ -0,0 +1,217 @@
+"""Versioned schema migrations for existing databases
+
+``SQLModel.metadata.create_all`` creates missing tables but never alters an
+existing one, so columns and indexes added to the models after a database was
+created have to be applied here. Each migration runs once, in version order,
+and is recorded in the ``schema_migrations`` table. Migrations must be
+idempotent: on a fresh database ``create_all`` has already produced the final
+schema and they only need to notice that.
+
+Usage:
+    python -m app.db.migrations            # apply pending migrations
+    python -m app.db.migrations --status   # list applied/pending migrations
+"""
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect, select, text
+from sqlalchemy.engine import Connection, Engine
+from sqlmodel import SQLModel
+from typing import Callable, List, NamedTuple
+from datetime import datetime
+import hashlib
+import os
+
+# Kept apart from SQLModel.metadata, which app.models clears on import
+_migration_metadata = MetaData()
+
+schema_migrations = Table(
+    "schema_migrations",
+    _migration_metadata,
+    Column("version", Integer, primary_key=True),
+    Column("description", String, nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+class Migration(NamedTuple):
+    version: int
+    description: str
+    apply: Callable[[Connection], None]
+
+def add_column_if_missing(connection: Connection, table: str, column: str, ddl_type: str) -> bool:
+    """Add a column unless it already exists; returns True if it was added"""
+    existing = {c["name"] for c in inspect(connection).get_columns(table)}
+    if column in existing:
+        return False
+    connection.execute(text(f'ALTER TABLE "{table}" ADD COLUMN {column} {ddl_type}'))
+    return True
+
+def ensure_indexes(connection: Connection, table_name: str) -> List[str]:
+    """Create every index declared on a model table that the database lacks"""
+    table = SQLModel.metadata.tables[table_name]
+    existing = {ix["name"] for ix in inspect(connection).get_indexes(table_name)}
+    created = []
+    for index in sorted(table.indexes, key=lambda ix: ix.name):
+        if index.name not in existing:
+            index.create(connection)
+            created.append(index.name)
+    return created
+
+def _add_file_text_content(connection: Connection) -> None:
+    add_column_if_missing(connection, "file", "text_content", "TEXT")
+
+def _add_query_indexes(connection: Connection) -> None:
+    ensure_indexes(connection, "query")
+
+def _add_query_claims(connection: Connection) -> None:
+    add_column_if_missing(connection, "query", "claimed_by", "INTEGER REFERENCES doctor (id)")
+    add_column_if_missing(connection, "query", "claimed_at", "DATETIME")
+    ensure_indexes(connection, "query")
+
+def _add_file_sha256(connection: Connection) -> None:
+    add_column_if_missing(connection, "file", "sha256", "VARCHAR")
+    ensure_indexes(connection, "file")
+
+def _hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _add_blob_store(connection: Connection) -> None:
+    """Create the blob table and register existing uploads as blobs
+
+    Legacy files keep their current location; only new uploads go into the
+    sharded store. Files missing on disk are left without a digest.
+    """
+    blob_table = SQLModel.metadata.tables["blob"]
+    file_table = SQLModel.metadata.tables["file"]
+    blob_table.create(connection, checkfirst=True)
+
+    files = connection.execute(
+        select(file_table.c.id, file_table.c.file_path, file_table.c.file_size, file_table.c.sha256, file_table.c.text_content)
+        .order_by(file_table.c.id)
+    ).all()
+    blobs = {}
+    for file_id, path, size, digest, text_content in files:
+        if digest is None:
+            if not os.path.exists(path):
+                continue
+            digest = _hash_file(path)
+            connection.execute(file_table.update().where(file_table.c.id == file_id).values(sha256=digest))
+        blob = blobs.setdefault(digest, {"sha256": digest, "path": path, "size": size, "text_content": text_content, "ref_count": 0})
+        blob["ref_count"] += 1
+
+    existing = {row[0] for row in connection.execute(select(blob_table.c.sha256))}
+    for digest, blob in blobs.items():
+        if digest in existing:
+            connection.execute(blob_table.update().where(blob_table.c.sha256 == digest).values(ref_count=blob["ref_count"]))
+        else:
+            connection.execute(blob_table.insert().values(**blob, created_at=datetime.utcnow()))
+
+def _add_search_indexes(connection: Connection) -> None:
+    from app.db.search import index_missing, install_search, search_supported
+
+    if not search_supported(connection):
+        return
+    install_search(connection)
+    index_missing(connection)
+
+def _add_change_tracking(connection: Connection) -> None:
+    from app.db.change_tracking import install_change_tracking
+
+    install_change_tracking(connection)
+
+def _add_file_query_index(connection: Connection) -> None:
+    ensure_indexes(connection, "file")
+
+def _add_patient_context(connection: Connection) -> None:
+    SQLModel.metadata.tables["patientcontext"].create(connection, checkfirst=True)
+
+def _drop_query_status_priority_index(connection: Connection) -> None:
+    # Covered by the leading (status, priority) columns of ix_query_review_queue
+    connection.execute(text("DROP INDEX IF EXISTS ix_query_status_priority_created_at"))
+
+def _add_file_text_length(connection: Connection) -> None:
+    if add_column_if_missing(connection, "file", "text_length", "INTEGER"):
+        connection.execute(text('UPDATE "file" SET text_length = length(text_content) WHERE text_content IS NOT NULL'))
+
+def _read_file_text_from_blob(connection: Connection) -> None:
+    """Keep file text on the blob only; rows without a digest keep their own copy"""
+    from app.db.search import SEARCH_SOURCES, install_search, search_supported
+
+    indexed = search_supported(connection)
+    if indexed:
+        # Recreated below to index the blob's text; the indexed text itself is unchanged
+        for suffix in ("ai", "au"):
+            connection.execute(text(f"DROP TRIGGER IF EXISTS {SEARCH_SOURCES['file'].fts_table}_{suffix}"))
+    connection.execute(text(
+        'UPDATE "file" SET text_content = NULL WHERE sha256 IS NOT NULL AND EXISTS ('
+        'SELECT 1 FROM blob WHERE blob.sha256 = "file".sha256 AND blob.text_content IS NOT NULL)'
+    ))
+    if indexed:
+        install_search(connection)
+
+# Append new migrations here; never renumber or edit an applied one
+MIGRATIONS: List[Migration] = [
+    Migration(1, "Add text_content column to file", _add_file_text_content),
+    Migration(2, "Add review queue and patient history indexes to query", _add_query_indexes),
+    Migration(3, "Add review claims and priority queue index to query", _add_query_claims),
+    Migration(4, "Add sha256 digest column to file", _add_file_sha256),
+    Migration(5, "Add content-addressed blob table and backfill existing uploads", _add_blob_store),
+    Migration(6, "Add FTS5 search indexes and sync triggers", _add_search_indexes),
+    Migration(7, "Add per-table change counters for ETags", _add_change_tracking),
+    Migration(8, "Add query_id index to file", _add_file_query_index),
+    Migration(9, "Add patient context snapshots", _add_patient_context),
+    Migration(10, "Drop redundant status/priority index from query", _drop_query_status_priority_index),
+    Migration(11, "Store extracted text length on file", _add_file_text_length),
+    Migration(12, "Read file text through its blob", _read_file_text_from_blob),
+]
+
+def applied_versions(connection: Connection) -> List[int]:
+    _migration_metadata.create_all(connection)
+    return [row[0] for row in connection.execute(schema_migrations.select().order_by(schema_migrations.c.version))]
+
+def run_migrations(engine: Engine) -> List[Migration]:
+    """Apply pending migrations in order, each in its own transaction"""
+    import app.models  # noqa: F401 - register model tables before inspecting them
+
+    applied = []
+    with engine.begin() as connection:
+        done = set(applied_versions(connection))
+
+    for migration in sorted(MIGRATIONS, key=lambda m: m.version):
+        if migration.version in done:
+            continue
+        with engine.begin() as connection:
+            migration.apply(connection)
+            connection.execute(schema_migrations.insert().values(
+                version=migration.version,
+                description=migration.description,
+                applied_at=datetime.utcnow(),
+            ))
+        applied.append(migration)
+    return applied
+
+def main():
+    import argparse
+    from app.db.database import engine
+
+    parser = argparse.ArgumentParser(description="Apply schema migrations")
+    parser.add_argument("--status", action="store_true", help="Show migration status without applying anything")
+    args = parser.parse_args()
+
+    if args.status:
+        with engine.begin() as connection:
+            done = set(applied_versions(connection))
+        for migration in MIGRATIONS:
+            state = "applied" if migration.version in done else "pending"
+            print(f"{migration.version:04d} [{state}] {migration.description}")
+        return
+
+    applied = run_migrations(engine)
+    if not applied:
+        print("ℹ️  Database schema is up to date")
+    for migration in applied:
+        print(f"✅ Applied {migration.version:04d}: {migration.description}")
+
+if __name__ == "__main__":
+    main()
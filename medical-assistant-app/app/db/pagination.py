@@ -0,0 +1,124 @@
+from sqlalchemy import and_, func, or_
+from sqlmodel import Session, select
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from datetime import datetime
+import base64
+import os
+import threading
+import time
+
+# Seconds to reuse a COUNT(*) result for the same filter (0 disables caching)
+COUNT_CACHE_TTL = float(os.getenv("PAGINATION_COUNT_CACHE_TTL", "0"))
+
+class Page(NamedTuple):
+    """One page of results plus what a client needs to fetch the next one"""
+    items: List[Any]
+    total: int
+    next_cursor: Optional[str]
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor cannot be decoded"""
+
+class CountCache:
+    """Small TTL cache for pagination totals keyed by the rendered filter"""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._entries: Dict[Tuple[str, Tuple], Tuple[float, int]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple[str, Tuple]) -> Optional[int]:
+        if self.ttl <= 0:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, total = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            return total
+
+    def set(self, key: Tuple[str, Tuple], total: int) -> None:
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, total)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+count_cache = CountCache(COUNT_CACHE_TTL)
+
+def _cache_key(statement) -> Tuple[str, Tuple]:
+    compiled = statement.compile()
+    params = tuple(sorted((k, repr(v)) for k, v in compiled.params.items()))
+    return str(compiled), params
+
+def count_rows(session: Session, statement, cache: Optional[CountCache] = count_cache) -> int:
+    """Count the rows a SELECT would return with SELECT COUNT(*), without loading them"""
+    count_statement = select(func.count()).select_from(statement.order_by(None).subquery())
+    key = _cache_key(count_statement) if cache is not None else None
+    if key is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+    total = session.exec(count_statement).one()
+    if key is not None:
+        cache.set(key, total)
+    return total
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    """Encode a (created_at, id) position as an opaque URL-safe cursor"""
+    raw = f"{created_at.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Decode a cursor produced by encode_cursor"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = base64.urlsafe_b64decode(padded.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise InvalidCursor(f"Invalid cursor: {cursor}") from e
+
+def paginate(
+    session: Session,
+    statement,
+    model,
+    skip: int = 0,
+    limit: int = 10,
+    cursor: Optional[str] = None,
+    cache: Optional[CountCache] = count_cache,
+) -> Page:
+    """Run a filtered SELECT one page at a time, ordered by (created_at, id)
+
+    ``total`` is computed with COUNT(*) over the same filter. With ``cursor``
+    the page starts right after the cursor position (keyset pagination) and
+    ``skip`` is ignored; otherwise ``skip``/``limit`` are applied as before.
+    ``next_cursor`` is set when the page is full and can be passed back to
+    fetch the following page.
+    """
+    total = count_rows(session, statement, cache=cache)
+
+    page_statement = statement.order_by(model.created_at, model.id)
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        page_statement = page_statement.where(
+            or_(
+                model.created_at > created_at,
+                and_(model.created_at == created_at, model.id > row_id),
+            )
+        )
+    else:
+        page_statement = page_statement.offset(skip)
+    items = session.exec(page_statement.limit(limit)).all()
+
+    next_cursor = None
+    if items and len(items) == limit:
+        last = items[-1]
+        next_cursor = encode_cursor(last.created_at, last.id)
+
+    return Page(items=items, total=total, next_cursor=next_cursor)
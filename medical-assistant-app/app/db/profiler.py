@@ -0,0 +1,187 @@
+"""Opt-in SQL statement profiler and N+1 detector
+
+Enabled with ``SQL_PROFILE``:
+
+- ``dev``: each response carries its statement count, database time and
+  repeated statement shapes in headers, and N+1 patterns are printed.
+- ``prod``: nothing is added to responses; per-route totals, slow
+  statements and N+1 shapes are aggregated for ``/api/diagnostics/sql``.
+
+Statements are grouped by shape: the SQL with whitespace normalised and
+``IN (?, ?, ...)`` lists collapsed, so the same query issued for different
+rows counts as one shape. A shape run ``SQL_N_PLUS_ONE_THRESHOLD`` times or
+more within one request is flagged as N+1. Statements slower than
+``SQL_SLOW_MS`` are printed with their parameters in either mode.
+
+The profiler has no listeners or middleware of its own: statements are
+timed once, by the metrics listeners (``instrument_engine``), and their
+shapes are counted on the request's ``RequestTally``, which
+``MetricsMiddleware`` opens and hands back here when the request ends.
+"""
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import os
+import re
+import threading
+import time
+
+from app.metrics.instruments import RequestTally, add_statement_observer, current_tally, remove_statement_observer
+
+# off, dev (response headers) or prod (aggregated report only)
+SQL_PROFILE = os.getenv("SQL_PROFILE", "off").lower()
+
+# Statements slower than this many milliseconds are printed with their parameters
+SQL_SLOW_MS = float(os.getenv("SQL_SLOW_MS", "100"))
+
+# Runs of one statement shape within a request that count as N+1
+SQL_N_PLUS_ONE_THRESHOLD = int(os.getenv("SQL_N_PLUS_ONE_THRESHOLD", "5"))
+
+# Slow statements kept for the report
+SQL_SLOW_LOG_SIZE = 50
+
+PROFILE_MODES = ("off", "dev", "prod")
+
+_WHITESPACE = re.compile(r"\s+")
+_IN_LIST = re.compile(r"\(\s*(?:\?|%\(\w+\)s|:\w+)(?:\s*,\s*(?:\?|%\(\w+\)s|:\w+))*\s*\)")
+_NUMBER = re.compile(r"\b\d+\b")
+
+def statement_shape(statement: str) -> str:
+    """The statement with values and list lengths abstracted away"""
+    shape = _WHITESPACE.sub(" ", statement).strip()
+    shape = _IN_LIST.sub("(?)", shape)
+    return _NUMBER.sub("?", shape)
+
+def _short(value: Any, limit: int = 200) -> str:
+    text = repr(value)
+    return text if len(text) <= limit else text[:limit] + "..."
+
+def repeated_shapes(tally: RequestTally, threshold: int = SQL_N_PLUS_ONE_THRESHOLD) -> List[Tuple[str, int]]:
+    """Shapes run at least ``threshold`` times, most frequent first"""
+    return [(shape, count) for shape, count in (tally.shapes or {}).most_common() if count >= threshold]
+
+def profile_headers(tally: RequestTally) -> List[Tuple[bytes, bytes]]:
+    headers = [
+        (b"x-sql-statements", str(tally.statements).encode()),
+        (b"server-timing", f"db;dur={tally.seconds * 1000:.1f};desc=\"{tally.statements} statements\"".encode()),
+    ]
+    repeated = repeated_shapes(tally)
+    if repeated:
+        summary = "; ".join(f"{count}x {shape[:80]}" for shape, count in repeated[:3])
+        headers.append((b"x-sql-n-plus-one", summary.encode("ascii", "replace")))
+    return headers
+
+class SQLProfiler:
+    """Per-route totals, N+1 shapes and recent slow statements across requests"""
+
+    def __init__(self, threshold: int = SQL_N_PLUS_ONE_THRESHOLD, slow_log_size: int = SQL_SLOW_LOG_SIZE):
+        self.threshold = threshold
+        self.slow_log_size = slow_log_size
+        self.mode = "off"
+        self.slow_seconds = SQL_SLOW_MS / 1000
+        self._lock = threading.Lock()
+        self.reset()
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    def reset(self) -> None:
+        with self._lock:
+            self.routes: Dict[str, Dict[str, Any]] = {}
+            self.n_plus_one: Dict[Tuple[str, str], Dict[str, int]] = {}
+            self.slow: List[Dict[str, Any]] = []
+
+    def observe(self, tally: Optional[RequestTally], statement: str, parameters: Any, elapsed: float) -> None:
+        """Statement observer: count the shape on the tally and log slow statements"""
+        profiling = tally is not None and tally.shapes is not None
+        if not profiling and elapsed < self.slow_seconds:
+            return
+        shape = statement_shape(statement)
+        if profiling:
+            tally.shapes[shape] += 1
+        if elapsed >= self.slow_seconds:
+            label = (tally.label if tally is not None else "") or "-"
+            print(f"🐢 Slow SQL ({elapsed * 1000:.1f} ms, {label}): {shape} params={_short(parameters)}")
+            self.record_slow(shape, parameters, elapsed, label)
+
+    def record_request(self, route: str, tally: RequestTally) -> None:
+        repeated = repeated_shapes(tally, self.threshold)
+        with self._lock:
+            totals = self.routes.setdefault(route, {"requests": 0, "statements": 0, "seconds": 0.0, "max_statements": 0})
+            totals["requests"] += 1
+            totals["statements"] += tally.statements
+            totals["seconds"] += tally.seconds
+            totals["max_statements"] = max(totals["max_statements"], tally.statements)
+            for shape, count in repeated:
+                flagged = self.n_plus_one.setdefault((route, shape), {"requests": 0, "max_repeats": 0})
+                flagged["requests"] += 1
+                flagged["max_repeats"] = max(flagged["max_repeats"], count)
+
+    def record_slow(self, shape: str, parameters: Any, elapsed: float, label: str) -> None:
+        with self._lock:
+            self.slow.append({
+                "route": label,
+                "statement": shape,
+                "parameters": _short(parameters),
+                "ms": round(elapsed * 1000, 2),
+                "at": time.time(),
+            })
+            del self.slow[:-self.slow_log_size]
+
+    def report(self) -> Dict[str, Any]:
+        """Routes by total database time, N+1 shapes by how often they were seen"""
+        with self._lock:
+            routes = [
+                {
+                    "route": route,
+                    **totals,
+                    "seconds": round(totals["seconds"], 4),
+                    "avg_statements": round(totals["statements"] / totals["requests"], 2),
+                }
+                for route, totals in sorted(self.routes.items(), key=lambda item: -item[1]["seconds"])
+            ]
+            n_plus_one = [
+                {"route": route, "statement": shape, **flagged}
+                for (route, shape), flagged in sorted(self.n_plus_one.items(), key=lambda item: -item[1]["requests"])
+            ]
+            return {"routes": routes, "n_plus_one": n_plus_one, "slow_statements": list(self.slow)}
+
+profiler = SQLProfiler()
+
+def install_profiler(mode: str = SQL_PROFILE, slow_ms: float = SQL_SLOW_MS) -> None:
+    """Profile statements timed by the metrics listeners (see ``instrument_engine``); ``off`` stops it"""
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"SQL_PROFILE must be one of {', '.join(PROFILE_MODES)}, not '{mode}'")
+    profiler.mode = mode
+    profiler.slow_seconds = slow_ms / 1000
+    if mode == "off":
+        remove_statement_observer(profiler.observe)
+    else:
+        add_statement_observer(profiler.observe)
+
+def report_n_plus_one(tally: RequestTally) -> None:
+    for shape, count in repeated_shapes(tally):
+        print(f"⚠️ Possible N+1 in {tally.label}: {count}x {shape}")
+
+def finish_request(route: str, tally: RequestTally) -> None:
+    """Record a request's statements under its route (called by ``MetricsMiddleware``)"""
+    tally.label = route
+    profiler.record_request(route, tally)
+    if profiler.mode == "dev":
+        report_n_plus_one(tally)
+
+@contextmanager
+def profile_block(label: str) -> Iterator[RequestTally]:
+    """Profile the statements run inside the block (scripts and workers)
+
+    Nothing is recorded while profiling is off, or when no statement was seen.
+    """
+    tally = RequestTally(label, shapes=profiler.enabled)
+    token = current_tally.set(tally)
+    try:
+        yield tally
+    finally:
+        current_tally.reset(token)
+        if tally.shapes is not None and tally.statements:
+            profiler.record_request(label, tally)
+            report_n_plus_one(tally)
@@ -0,0 +1,306 @@
+"""Full-text search over queries, AI suggestions, reviews and file text
+
+Each searchable column has its own FTS5 table (``search_query``,
+``search_suggestion``, ``search_review``, ``search_file``) whose rowid is the
+source row's id and which also carries the owning query's id. Triggers on
+the source tables keep the indexes in step with every INSERT, UPDATE and
+DELETE (file text is read through the file's blob, and re-extracting a blob
+reindexes the files sharing it); ``reindex`` catches up on rows written while the triggers were
+absent (old databases, bulk loads) and can rebuild an index from scratch.
+
+FTS5 is SQLite-only. On other databases no index is installed and
+``search`` raises ``SearchUnavailable``.
+"""
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+import os
+import re
+import time
+
+from sqlalchemy import bindparam, text
+from sqlalchemy.engine import Connection, Engine
+
+from app.db.pagination import CountCache, count_cache
+
+# Rows indexed and committed per transaction by reindex
+DEFAULT_CHUNK_SIZE = 5000
+
+# Tokens around each match returned in a snippet
+SNIPPET_TOKENS = 16
+
+# Markers placed around matched terms in snippets (Markdown bold)
+SNIPPET_OPEN = "**"
+SNIPPET_CLOSE = "**"
+
+# Matches counted at most for a search's total; past it the total reads as the cap
+SEARCH_TOTAL_CAP = int(os.getenv("SEARCH_TOTAL_CAP", "1000"))
+
+class SearchSource(NamedTuple):
+    name: str
+    fts_table: str
+    table: str
+    column: str
+    query_id_column: str
+    # SQL for the indexed text over the row alias ``{row}``, when it is not just the column
+    body: Optional[str] = None
+    # Other columns whose update changes the indexed text
+    depends_on: Tuple[str, ...] = ()
+
+    def body_sql(self, row: str) -> str:
+        return (self.body or "{row}." + self.column).format(row=row)
+
+SEARCH_SOURCES: Dict[str, SearchSource] = {
+    source.name: source for source in (
+        SearchSource("query", "search_query", "query", "content", "id"),
+        SearchSource("suggestion", "search_suggestion", "aisuggestion", "content", "query_id"),
+        SearchSource("review", "search_review", "review", "content", "query_id"),
+        SearchSource(
+            "file", "search_file", "file", "text_content", "query_id",
+            body="coalesce((SELECT text_content FROM blob WHERE sha256 = {row}.sha256), {row}.text_content)",
+            depends_on=("sha256",),
+        ),
+    )
+}
+
+class SearchUnavailable(Exception):
+    """Full-text search is not supported by this database"""
+
+def search_supported(connection: Connection) -> bool:
+    return connection.dialect.name == "sqlite"
+
+class SearchHit(NamedTuple):
+    source: str
+    source_id: int
+    query_id: int
+    snippet: str
+    rank: float
+
+def _ddl(source: SearchSource) -> List[str]:
+    fts, table, qid = source.fts_table, source.table, source.query_id_column
+    insert_new = (
+        f'INSERT INTO {fts} (rowid, body, query_id) '
+        f'SELECT new.id, body, new.{qid} FROM (SELECT {source.body_sql("new")} AS body) WHERE body IS NOT NULL;'
+    )
+    watched = ", ".join((source.column, qid, *source.depends_on))
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+        f"body, query_id UNINDEXED, tokenize = 'porter unicode61 remove_diacritics 2')",
+        f'CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON "{table}" BEGIN {insert_new} END',
+        f'CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {watched} ON "{table}" BEGIN '
+        f'DELETE FROM {fts} WHERE rowid = old.id; {insert_new} END',
+        f'CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON "{table}" BEGIN '
+        f'DELETE FROM {fts} WHERE rowid = old.id; END',
+    ]
+
+def _blob_ddl() -> str:
+    # Files read their text from the blob, so a re-extracted blob reindexes its files
+    source = SEARCH_SOURCES["file"]
+    body = source.body_sql("f")
+    return (
+        f"CREATE TRIGGER IF NOT EXISTS {source.fts_table}_blob_au AFTER UPDATE OF text_content ON blob BEGIN "
+        f'DELETE FROM {source.fts_table} WHERE rowid IN (SELECT id FROM "file" WHERE sha256 = new.sha256); '
+        f"INSERT INTO {source.fts_table} (rowid, body, query_id) "
+        f'SELECT f.id, {body}, f.query_id FROM "file" f WHERE f.sha256 = new.sha256 AND {body} IS NOT NULL; END'
+    )
+
+def install_search(connection: Connection) -> None:
+    """Create the FTS5 tables, their sync triggers and the reindex bookkeeping table"""
+    connection.execute(text(
+        "CREATE TABLE IF NOT EXISTS search_index_state (source VARCHAR PRIMARY KEY, indexed_at VARCHAR NOT NULL)"
+    ))
+    for source in SEARCH_SOURCES.values():
+        for statement in _ddl(source):
+            connection.execute(text(statement))
+    connection.execute(text(_blob_ddl()))
+
+def drop_search_triggers(connection: Connection) -> None:
+    """Remove the sync triggers (e.g. before a bulk load); reindex afterwards"""
+    for source in SEARCH_SOURCES.values():
+        for suffix in ("ai", "au", "ad"):
+            connection.execute(text(f"DROP TRIGGER IF EXISTS {source.fts_table}_{suffix}"))
+    connection.execute(text(f"DROP TRIGGER IF EXISTS {SEARCH_SOURCES['file'].fts_table}_blob_au"))
+
+def _insert_missing_sql(source: SearchSource, where: str = "") -> str:
+    fts = source.fts_table
+    body = source.body_sql("t")
+    return (
+        f'INSERT INTO {fts} (rowid, body, query_id) '
+        f'SELECT id, {body}, {source.query_id_column} FROM "{source.table}" t '
+        f"WHERE {body} IS NOT NULL {where}"
+        f"AND NOT EXISTS (SELECT 1 FROM {fts} WHERE {fts}.rowid = t.id)"
+    )
+
+def index_missing(connection: Connection) -> int:
+    """Index every source row not yet in its search table, in one pass; returns rows added"""
+    return sum(
+        connection.execute(text(_insert_missing_sql(source))).rowcount
+        for source in SEARCH_SOURCES.values()
+    )
+
+def _timestamp(value: datetime) -> str:
+    # Same text format SQLAlchemy uses for DateTime columns on SQLite
+    return value.strftime("%Y-%m-%d %H:%M:%S.%f")
+
+def _reindex_source(connection_factory, source: SearchSource, rebuild: bool, chunk_size: int) -> Dict[str, int]:
+    fts, table = source.fts_table, source.table
+    stats = {"indexed": 0, "removed": 0}
+    started_at = _timestamp(datetime.utcnow())
+
+    with connection_factory() as connection:
+        if rebuild:
+            connection.execute(text(f"DELETE FROM {fts}"))
+            last_run = None
+        else:
+            last_run = connection.execute(
+                text("SELECT indexed_at FROM search_index_state WHERE source = :source"), {"source": source.name}
+            ).scalar()
+            # Drop index entries whose source row is gone
+            stats["removed"] += connection.execute(text(
+                f'DELETE FROM {fts} WHERE rowid NOT IN (SELECT id FROM "{table}")'
+            )).rowcount
+        low, high = connection.execute(text(f'SELECT min(id), max(id) FROM "{table}"')).one()
+
+    if low is not None:
+        for start in range(low, high + 1, chunk_size):
+            window = {"start": start, "end": start + chunk_size}
+            with connection_factory() as connection:
+                if last_run is not None:
+                    # Rows edited since the last run (while triggers may have been off)
+                    stale = {**window, "since": last_run}
+                    connection.execute(text(
+                        f'DELETE FROM {fts} WHERE rowid IN (SELECT id FROM "{table}" '
+                        f"WHERE id >= :start AND id < :end AND updated_at > :since)"
+                    ), stale)
+                stats["indexed"] += connection.execute(
+                    text(_insert_missing_sql(source, "AND id >= :start AND id < :end ")), window
+                ).rowcount
+
+    with connection_factory() as connection:
+        if rebuild:
+            connection.execute(text(f"INSERT INTO {fts} ({fts}) VALUES ('optimize')"))
+        connection.execute(text(
+            "INSERT OR REPLACE INTO search_index_state (source, indexed_at) VALUES (:source, :indexed_at)"
+        ), {"source": source.name, "indexed_at": started_at})
+    return stats
+
+def reindex(
+    engine: Engine,
+    sources: Optional[Iterable[str]] = None,
+    rebuild: bool = False,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Dict[str, Any]:
+    """Bring the search indexes up to date with their source tables
+
+    Incremental by default: rows missing from an index, rows updated since
+    the previous run and index entries whose row was deleted are fixed in
+    id-ordered chunks, each committed separately. ``rebuild`` empties each
+    index and re-reads everything. Returns per-source counters and timing.
+    """
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be at least 1")
+    names = list(sources or SEARCH_SOURCES)
+    unknown = set(names) - set(SEARCH_SOURCES)
+    if unknown:
+        raise ValueError(f"Unknown search sources: {', '.join(sorted(unknown))}")
+
+    with engine.begin() as connection:
+        if not search_supported(connection):
+            raise SearchUnavailable(f"Full-text search needs SQLite FTS5, not {connection.dialect.name}")
+        install_search(connection)
+
+    start = time.perf_counter()
+    results = {
+        name: _reindex_source(engine.begin, SEARCH_SOURCES[name], rebuild, chunk_size)
+        for name in names
+    }
+    return {"sources": results, "elapsed_seconds": time.perf_counter() - start}
+
+def to_match_expression(terms: str) -> Optional[str]:
+    """Turn free text into a safe FTS5 query: every word must appear, the last as a prefix
+
+    Quoting each word keeps user input from being parsed as FTS5 syntax.
+    Returns None when the text contains no searchable words.
+    """
+    words = re.findall(r"\w+", terms)
+    if not words:
+        return None
+    quoted = [f'"{word}"' for word in words]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+def _page_statement(names: List[str]) -> str:
+    # Each source is ranked and cut to the page window on its own, so FTS5
+    # never sorts more than skip + limit rows per table
+    selects = [
+        f"SELECT * FROM (SELECT '{name}' AS source, rowid AS source_id, query_id, bm25({fts}) AS rank "
+        f"FROM {fts} WHERE {fts} MATCH :match ORDER BY rank LIMIT :window)"
+        for name, fts in ((name, SEARCH_SOURCES[name].fts_table) for name in names)
+    ]
+    return " UNION ALL ".join(selects) + " ORDER BY rank LIMIT :limit OFFSET :skip"
+
+def _snippets(connection: Connection, name: str, match: str, rowids: List[int]) -> Dict[int, str]:
+    fts = SEARCH_SOURCES[name].fts_table
+    statement = text(
+        f"SELECT rowid, snippet({fts}, 0, :open, :close, '…', :tokens) FROM {fts} "
+        f"WHERE {fts} MATCH :match AND rowid IN :rowids"
+    ).bindparams(bindparam("rowids", expanding=True))
+    params = {"match": match, "rowids": rowids, "open": SNIPPET_OPEN, "close": SNIPPET_CLOSE, "tokens": SNIPPET_TOKENS}
+    return dict(connection.execute(statement, params).all())
+
+def _count_matches(connection: Connection, names: List[str], match: str, cache: Optional[CountCache]) -> int:
+    key = ("search", (match, tuple(names), SEARCH_TOTAL_CAP))
+    if cache is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+    matches = " UNION ALL ".join(
+        f"SELECT 1 FROM {fts} WHERE {fts} MATCH :match"
+        for fts in (SEARCH_SOURCES[name].fts_table for name in names)
+    )
+    total = connection.execute(
+        text(f"SELECT count(*) FROM ({matches} LIMIT :cap)"), {"match": match, "cap": SEARCH_TOTAL_CAP}
+    ).scalar()
+    if cache is not None:
+        cache.set(key, total)
+    return total
+
+def search(
+    connection: Connection,
+    terms: str,
+    sources: Optional[Iterable[str]] = None,
+    skip: int = 0,
+    limit: int = 20,
+    with_total: bool = True,
+    cache: Optional[CountCache] = count_cache,
+):
+    """Return ``(hits, total)`` for free-text ``terms``, best matches first
+
+    Ranking is FTS5's BM25 (lower is better), merged across sources, and
+    snippets are only built for the returned page. ``total`` counts at most
+    ``SEARCH_TOTAL_CAP`` matches, is reused from ``cache`` like pagination
+    totals, and is None with ``with_total=False``.
+    """
+    names = list(sources or SEARCH_SOURCES)
+    unknown = set(names) - set(SEARCH_SOURCES)
+    if unknown:
+        raise ValueError(f"Unknown search sources: {', '.join(sorted(unknown))}")
+    if not search_supported(connection):
+        raise SearchUnavailable(f"Full-text search needs SQLite FTS5, not {connection.dialect.name}")
+
+    match = to_match_expression(terms)
+    if match is None:
+        return [], 0 if with_total else None
+
+    rows = connection.execute(
+        text(_page_statement(names)), {"match": match, "window": skip + limit, "limit": limit, "skip": skip}
+    ).all()
+    snippets = {
+        name: _snippets(connection, name, match, [row.source_id for row in rows if row.source == name])
+        for name in {row.source for row in rows}
+    }
+    hits = [
+        SearchHit(row.source, row.source_id, row.query_id, snippets[row.source][row.source_id], row.rank)
+        for row in rows
+    ]
+    total = _count_matches(connection, names, match, cache) if with_total else None
+    return hits, total
@@ -0,0 +1,4 @@
+# Events package initialization
+# In-process broadcaster that pushes query state changes to event-stream subscribers
+from app.events.broadcaster import EventBroadcaster, Event, SlowSubscriber, get_broadcaster, set_broadcaster, publish_query_event
+from app.events.broadcaster import QUERY_CREATED, QUERY_TRIAGED, QUERY_STATUS_CHANGED, QUERY_REVIEWED, QUEUE_RETRIAGED, RESET_EVENT
@@ -0,0 +1,188 @@
+"""In-process fan-out of query state changes to event-stream subscribers
+
+Routes and workers call ``publish`` after committing a change. Every event
+gets a sequence number and is kept in a bounded history; each subscriber
+has its own bounded queue. Publishing never waits: a subscriber whose queue
+is full is disconnected (it reconnects and resumes from the history), so one
+slow client cannot hold up the API or the other subscribers.
+
+Event ids are resume tokens of the form ``<epoch>-<seq>``. The epoch is
+random per broadcaster, so a token from before a restart (or from another
+API process) is recognised as unknown and the client is told to reload
+instead of silently missing events.
+"""
+from collections import deque
+from datetime import datetime
+from typing import Any, AsyncIterator, Deque, Dict, Iterable, List, NamedTuple, Optional, Set
+import asyncio
+import json
+import os
+import secrets
+
+# Events kept for subscribers resuming after a reconnect
+EVENT_HISTORY_SIZE = int(os.getenv("EVENT_HISTORY_SIZE", "1000"))
+
+# Events buffered per subscriber before it is dropped as too slow
+EVENT_SUBSCRIBER_QUEUE_SIZE = int(os.getenv("EVENT_SUBSCRIBER_QUEUE_SIZE", "100"))
+
+# Sent instead of replaying when a resume token is unknown or too old
+RESET_EVENT = "reset"
+
+# Event types published for query state changes
+QUERY_CREATED = "query.created"
+QUERY_TRIAGED = "query.triaged"
+QUERY_STATUS_CHANGED = "query.status_changed"
+QUERY_REVIEWED = "query.reviewed"
+QUEUE_RETRIAGED = "queue.retriaged"
+
+class Event(NamedTuple):
+    id: str
+    seq: int
+    type: str
+    data: Dict[str, Any]
+
+    def matches(self, types: Optional[Set[str]], filters: Dict[str, Any]) -> bool:
+        # A reset concerns every list the client shows, whatever it filters on
+        if self.type == RESET_EVENT:
+            return True
+        if types and self.type not in types:
+            return False
+        return all(self.data.get(key) == value for key, value in filters.items())
+
+    def to_sse(self) -> str:
+        """Encode as a server-sent event (the id is the client's Last-Event-ID)"""
+        return f"id: {self.id}\nevent: {self.type}\ndata: {json.dumps(self.data, default=str)}\n\n"
+
+class SlowSubscriber(Exception):
+    """The subscriber fell too far behind and was disconnected"""
+
+class Subscription:
+    def __init__(self, queue_size: int):
+        self.queue: "asyncio.Queue[Optional[Event]]" = asyncio.Queue(maxsize=queue_size)
+        self.dropped = False
+
+class EventBroadcaster:
+    """Sequence, remember and fan out events to every subscriber"""
+
+    def __init__(self, history_size: int = EVENT_HISTORY_SIZE, queue_size: int = EVENT_SUBSCRIBER_QUEUE_SIZE):
+        self.epoch = secrets.token_hex(4)
+        self.queue_size = queue_size
+        self._seq = 0
+        self._history: Deque[Event] = deque(maxlen=history_size)
+        self._subscribers: Set[Subscription] = set()
+        self.published = 0
+        self.dropped_subscribers = 0
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def publish(self, event_type: str, data: Dict[str, Any]) -> Event:
+        """Record an event and hand it to every subscriber; must run on the event loop"""
+        self._seq += 1
+        event = Event(f"{self.epoch}-{self._seq}", self._seq, event_type, data)
+        self._history.append(event)
+        self.published += 1
+        for subscription in list(self._subscribers):
+            try:
+                subscription.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                self._drop(subscription)
+        return event
+
+    def _drop(self, subscription: Subscription) -> None:
+        self._subscribers.discard(subscription)
+        subscription.dropped = True
+        self.dropped_subscribers += 1
+        # Make room for the wake-up so the reader notices at once
+        while not subscription.queue.empty():
+            subscription.queue.get_nowait()
+        subscription.queue.put_nowait(None)
+
+    def replay_after(self, token: Optional[str]) -> Optional[List[Event]]:
+        """Events after a resume token, or None when they are no longer all available"""
+        if not token:
+            return []
+        epoch, _, seq = token.partition("-")
+        if epoch != self.epoch or not seq.isdigit():
+            return None
+        seq = int(seq)
+        if seq > self._seq:
+            return None
+        if seq < self._seq and (not self._history or self._history[0].seq > seq + 1):
+            return None
+        return [event for event in self._history if event.seq > seq]
+
+    def reset_event(self) -> Event:
+        """Tells a client it missed events and should reload its lists"""
+        return Event(f"{self.epoch}-{self._seq}", self._seq, RESET_EVENT, {"reason": "resume token expired"})
+
+    async def subscribe(
+        self,
+        last_event_id: Optional[str] = None,
+        types: Optional[Iterable[str]] = None,
+        idle_timeout: Optional[float] = None,
+        **filters: Any,
+    ) -> AsyncIterator[Optional[Event]]:
+        """Yield missed events after ``last_event_id``, then live ones, forever
+
+        ``types`` and ``filters`` (equality on event data, e.g. ``patient_id``)
+        narrow what is yielded; reset events are always delivered. With
+        ``idle_timeout``, None is yielded after that many quiet seconds so the
+        caller can send a keep-alive. Raises ``SlowSubscriber`` if the
+        consumer falls behind by a full queue.
+        """
+        types = set(types or ())
+        subscription = Subscription(self.queue_size)
+        # Registered in the same step as the replay is taken, so every later
+        # event lands in the queue exactly once
+        self._subscribers.add(subscription)
+        try:
+            backlog = self.replay_after(last_event_id)
+            if backlog is None:
+                backlog = [self.reset_event()]
+            for event in backlog:
+                if event.matches(types, filters):
+                    yield event
+
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), timeout=idle_timeout)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                if event is None:
+                    raise SlowSubscriber(f"Subscriber fell {self.queue_size} events behind")
+                if event.matches(types, filters):
+                    yield event
+        finally:
+            self._subscribers.discard(subscription)
+
+def query_event_data(query, **extra: Any) -> Dict[str, Any]:
+    """The fields subscribers filter and display on for a query event"""
+    return {
+        "query_id": query.id,
+        "patient_id": query.patient_id,
+        "status": query.status.value,
+        "priority": query.priority.value,
+        "at": datetime.utcnow().isoformat(),
+        **extra,
+    }
+
+_broadcaster: Optional[EventBroadcaster] = None
+
+def get_broadcaster() -> EventBroadcaster:
+    """Return the process-wide broadcaster, creating it on first use"""
+    global _broadcaster
+    if _broadcaster is None:
+        _broadcaster = EventBroadcaster()
+    return _broadcaster
+
+def set_broadcaster(broadcaster: Optional[EventBroadcaster]) -> None:
+    """Replace the process-wide broadcaster (tests)"""
+    global _broadcaster
+    _broadcaster = broadcaster
+
+def publish_query_event(event_type: str, query, **extra: Any) -> Event:
+    """Publish a change to ``query`` on the process-wide broadcaster"""
+    return get_broadcaster().publish(event_type, query_event_data(query, **extra))
@@ -0,0 +1,2 @@
+# Jobs package initialization
+# Durable background jobs (AI suggestion generation) and the worker pool that runs them
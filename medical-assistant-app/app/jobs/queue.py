@@ -0,0 +1,153 @@
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+import os
+import random
+
+from sqlalchemy import func, update
+from sqlmodel import Session, select
+
+from app.models import SuggestionJob, JobStatus
+
+# Attempts before a job is moved to the dead-letter state
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+
+# A running job not finished within this window is assumed lost (worker crash)
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "300"))
+
+# Base delay in seconds for retry backoff (doubled per attempt, with jitter)
+JOB_RETRY_BASE_SECONDS = float(os.getenv("JOB_RETRY_BASE_SECONDS", "5"))
+
+def enqueue_suggestion_job(session: Session, query_id: int) -> SuggestionJob:
+    """Queue suggestion generation for a query
+
+    The job is added to the caller's session, so it is committed in the same
+    transaction as the query it belongs to.
+    """
+    job = SuggestionJob(query_id=query_id, max_attempts=JOB_MAX_ATTEMPTS)
+    session.add(job)
+    return job
+
+def claim_job(session: Session) -> Optional[SuggestionJob]:
+    """Claim the oldest runnable job, or return None if there is none
+
+    The claim is a conditional UPDATE on the job's status, so several workers
+    (or processes) polling the same table never run a job twice.
+    """
+    now = datetime.utcnow()
+    while True:
+        job_id = session.exec(
+            select(SuggestionJob.id)
+            .where(SuggestionJob.status == JobStatus.QUEUED, SuggestionJob.run_after <= now)
+            .order_by(SuggestionJob.run_after, SuggestionJob.id)
+            .limit(1)
+        ).first()
+        if job_id is None:
+            return None
+
+        result = session.exec(
+            update(SuggestionJob)
+            .where(SuggestionJob.id == job_id, SuggestionJob.status == JobStatus.QUEUED)
+            .values(
+                status=JobStatus.RUNNING,
+                started_at=now,
+                attempts=SuggestionJob.attempts + 1,
+                updated_at=now,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        session.commit()
+        if result.rowcount == 1:
+            job = session.get(SuggestionJob, job_id)
+            session.refresh(job)
+            return job
+        # Lost the race to another worker; try the next job
+
+def complete_job(session: Session, job: SuggestionJob) -> None:
+    now = datetime.utcnow()
+    job.status = JobStatus.SUCCEEDED
+    job.finished_at = now
+    job.updated_at = now
+    job.last_error = None
+    session.add(job)
+    session.commit()
+
+def fail_job(session: Session, job: SuggestionJob, error: str) -> bool:
+    """Record a failed attempt; returns True if the job was dead-lettered"""
+    now = datetime.utcnow()
+    job.last_error = error[:2000]
+    job.updated_at = now
+    if job.attempts >= job.max_attempts:
+        job.status = JobStatus.DEAD
+        job.finished_at = now
+    else:
+        delay = JOB_RETRY_BASE_SECONDS * (2 ** (job.attempts - 1))
+        job.status = JobStatus.QUEUED
+        job.run_after = now + timedelta(seconds=random.uniform(delay / 2, delay))
+    session.add(job)
+    session.commit()
+    return job.status == JobStatus.DEAD
+
+def requeue_stale_jobs(session: Session) -> int:
+    """Put jobs whose worker disappeared mid-run back on the queue"""
+    now = datetime.utcnow()
+    result = session.exec(
+        update(SuggestionJob)
+        .where(
+            SuggestionJob.status == JobStatus.RUNNING,
+            SuggestionJob.started_at < now - timedelta(seconds=JOB_LEASE_SECONDS),
+        )
+        .values(status=JobStatus.QUEUED, run_after=now, updated_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    session.commit()
+    return result.rowcount
+
+def retry_dead_job(session: Session, job: SuggestionJob) -> SuggestionJob:
+    """Give a dead-lettered job a fresh set of attempts"""
+    now = datetime.utcnow()
+    job.status = JobStatus.QUEUED
+    job.attempts = 0
+    job.run_after = now
+    job.finished_at = None
+    job.updated_at = now
+    session.add(job)
+    session.commit()
+    session.refresh(job)
+    return job
+
+def _percentile(values: List[float], fraction: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+def queue_metrics(session: Session, sample_size: int = 500) -> Dict[str, Any]:
+    """Queue depth per status plus wait and run latency of recent jobs"""
+    depth = {s.value: 0 for s in JobStatus}
+    for job_status, count in session.exec(
+        select(SuggestionJob.status, func.count()).group_by(SuggestionJob.status)
+    ).all():
+        depth[job_status.value] = count
+
+    oldest_queued = session.exec(
+        select(func.min(SuggestionJob.created_at)).where(SuggestionJob.status == JobStatus.QUEUED)
+    ).one()
+
+    recent = session.exec(
+        select(SuggestionJob.created_at, SuggestionJob.started_at, SuggestionJob.finished_at)
+        .where(SuggestionJob.status == JobStatus.SUCCEEDED)
+        .order_by(SuggestionJob.finished_at.desc())
+        .limit(sample_size)
+    ).all()
+    waits = [(started - created).total_seconds() for created, started, _ in recent if started]
+    runs = [(finished - started).total_seconds() for _, started, finished in recent if started and finished]
+
+    return {
+        "depth": depth,
+        "oldest_queued_age_seconds": (datetime.utcnow() - oldest_queued).total_seconds() if oldest_queued else None,
+        "wait_seconds_p50": _percentile(waits, 0.5),
+        "wait_seconds_p95": _percentile(waits, 0.95),
+        "run_seconds_p50": _percentile(runs, 0.5),
+        "run_seconds_p95": _percentile(runs, 0.95),
+        "sample_size": len(recent),
+    }
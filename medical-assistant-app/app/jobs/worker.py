@@ -0,0 +1,167 @@
+import asyncio
+import os
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from sqlmodel import Session, select
+from starlette.concurrency import run_in_threadpool
+
+from app.db.database import engine
+from app.db.profiler import profile_block
+from app.models import AISuggestion, Query, QueryStatus, SuggestionJob
+from app.jobs.queue import claim_job, complete_job, fail_job, requeue_stale_jobs
+from app.llm.suggestion import demo_suggestion, generate_suggestion, llm_configured, save_suggestion
+from app.events.broadcaster import QUERY_STATUS_CHANGED, publish_query_event
+
+# Number of concurrent suggestion workers in this process
+SUGGESTION_WORKERS = int(os.getenv("SUGGESTION_WORKERS", "2"))
+
+# Seconds an idle worker waits before polling the queue again
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))
+
+def _set_status(session: Session, query: Query, status: QueryStatus) -> None:
+    query.status = status
+    query.updated_at = datetime.utcnow()
+    session.add(query)
+    session.commit()
+
+def _has_suggestion(session: Session, query_id: int) -> bool:
+    return session.exec(select(AISuggestion.id).where(AISuggestion.query_id == query_id)).first() is not None
+
+async def run_suggestion_job(session: Session, job: SuggestionJob) -> None:
+    """Generate the AI suggestion for a job's query: PENDING -> PROCESSING -> AWAITING_REVIEW
+
+    The session is blocking, so every database step runs in the thread pool;
+    events are published back on the loop.
+    """
+    query = await run_in_threadpool(session.get, Query, job.query_id)
+    if query is None:
+        raise LookupError(f"Query with ID {job.query_id} no longer exists")
+
+    if await run_in_threadpool(_has_suggestion, session, query.id):
+        # A previous attempt stored the suggestion but did not finish the job
+        if query.status in (QueryStatus.PENDING, QueryStatus.PROCESSING):
+            await run_in_threadpool(_set_status, session, query, QueryStatus.AWAITING_REVIEW)
+            publish_query_event(QUERY_STATUS_CHANGED, query)
+        return
+
+    if query.status not in (QueryStatus.PENDING, QueryStatus.PROCESSING):
+        # E.g. retried after dead-lettering, and a doctor has since claimed or reviewed the query
+        print(f"Suggestion job {job.id} skipped: query {query.id} is already {query.status.value}")
+        return
+
+    await run_in_threadpool(_set_status, session, query, QueryStatus.PROCESSING)
+    publish_query_event(QUERY_STATUS_CHANGED, query)
+
+    if llm_configured():
+        await generate_suggestion(query, session)
+    else:
+        await run_in_threadpool(save_suggestion, query, demo_suggestion(query.content), 0.75, "demo_model", session)
+    publish_query_event(QUERY_STATUS_CHANGED, query, suggestion=True)
+
+def _send_to_doctors_without_suggestion(session: Session, job: SuggestionJob) -> Optional[Query]:
+    """A dead-lettered query still needs a human: queue it for review without a suggestion
+
+    Returns the query when its status changed, for the caller to publish.
+    """
+    query = session.get(Query, job.query_id)
+    if query is not None and query.status in (QueryStatus.PENDING, QueryStatus.PROCESSING):
+        _set_status(session, query, QueryStatus.AWAITING_REVIEW)
+        return query
+    return None
+
+def _record_failure(session: Session, job: SuggestionJob, error: str) -> Tuple[bool, Optional[Query]]:
+    session.rollback()
+    dead = fail_job(session, job, error)
+    return dead, (_send_to_doctors_without_suggestion(session, job) if dead else None)
+
+async def process_next_job(session: Session) -> bool:
+    """Claim and run one job; returns False when the queue is empty"""
+    job = await run_in_threadpool(claim_job, session)
+    if job is None:
+        return False
+
+    try:
+        with profile_block("job suggestion"):
+            await run_suggestion_job(session, job)
+    except Exception as e:
+        print(f"Suggestion job {job.id} failed (attempt {job.attempts}/{job.max_attempts}): {e}")
+        dead, query = await run_in_threadpool(_record_failure, session, job, f"{type(e).__name__}: {e}")
+        if dead:
+            print(f"💀 Suggestion job {job.id} moved to dead letter")
+        if query is not None:
+            publish_query_event(QUERY_STATUS_CHANGED, query, suggestion=False)
+    else:
+        await run_in_threadpool(complete_job, session, job)
+    return True
+
+async def drain_jobs(session: Session) -> int:
+    """Run queued jobs until none are runnable; returns how many were processed"""
+    processed = 0
+    while await process_next_job(session):
+        processed += 1
+    return processed
+
+class WorkerPool:
+    """Asyncio workers that poll the job table and process suggestion jobs"""
+
+    def __init__(self, workers: int = SUGGESTION_WORKERS, poll_interval: float = JOB_POLL_INTERVAL, bind=engine):
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.bind = bind
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._tasks: List[asyncio.Task] = []
+
+    def notify(self) -> None:
+        self._wakeup.set()
+
+    async def start(self) -> None:
+        with Session(self.bind) as session:
+            requeued = await run_in_threadpool(requeue_stale_jobs, session)
+        if requeued:
+            print(f"♻️  Requeued {requeued} suggestion jobs left running by a previous worker")
+        self._tasks = [asyncio.create_task(self._run(i)) for i in range(self.workers)]
+
+    async def stop(self) -> None:
+        self._stopping = True
+        self._wakeup.set()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _run(self, worker_id: int) -> None:
+        while not self._stopping:
+            try:
+                # Not expired on commit: reading a job or query afterwards must not reload it on the loop
+                with Session(self.bind, expire_on_commit=False) as session:
+                    await drain_jobs(session)
+            except Exception as e:
+                print(f"Suggestion worker {worker_id} error: {e}")
+            if self._stopping:
+                break
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+_pool: Optional[WorkerPool] = None
+
+def notify_workers() -> None:
+    """Wake idle workers after enqueueing a job (no-op when no pool is running)"""
+    if _pool is not None:
+        _pool.notify()
+
+async def start_worker_pool(workers: int = SUGGESTION_WORKERS) -> Optional[WorkerPool]:
+    global _pool
+    if workers <= 0:
+        return None
+    _pool = WorkerPool(workers)
+    await _pool.start()
+    return _pool
+
+async def stop_worker_pool() -> None:
+    global _pool
+    if _pool is not None:
+        await _pool.stop()
+        _pool = None
@@ -1,2 +1,3 @@
 # LLM package initialization
-from app.llm.suggestion import generate_suggestion, process_query_with_files
+from app.llm.suggestion import generate_suggestion, process_query_with_files, complete_suggestion, SuggestionEngine, get_engine, set_engine, close_engine, regenerate_suggestion
+from app.llm.cache import SuggestionCache, suggestion_cache, suggestion_cache_key
@@ -0,0 +1,184 @@
+"""Content-addressed cache for LLM suggestions
+
+Suggestions are keyed by a SHA-256 over everything that determines the
+completion: system prompt, model, sampling parameters, the normalized query
+text and the digests of any attached file contents and patient context. Entries live in an
+in-memory LRU and, when ``SUGGESTION_CACHE_DB`` is set, in a SQLite file
+shared by all workers. Both tiers expire entries after a TTL.
+"""
+from collections import OrderedDict
+from typing import Any, Dict, Mapping, Optional, Tuple
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+
+# Entries kept in the in-memory tier
+SUGGESTION_CACHE_SIZE = int(os.getenv("SUGGESTION_CACHE_SIZE", "1024"))
+
+# Seconds a cached suggestion stays valid (0 disables caching)
+SUGGESTION_CACHE_TTL_SECONDS = float(os.getenv("SUGGESTION_CACHE_TTL_SECONDS", str(24 * 3600)))
+
+# Optional SQLite file for the persistent tier
+SUGGESTION_CACHE_DB = os.getenv("SUGGESTION_CACHE_DB") or None
+
+def normalize_text(text: str) -> str:
+    """Fold case, Unicode forms and whitespace so trivially different texts share a key"""
+    return " ".join(unicodedata.normalize("NFKC", text).casefold().split())
+
+def content_digest(content: str) -> str:
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+def suggestion_cache_key(
+    system_prompt: str,
+    model: str,
+    temperature: float,
+    max_tokens: int,
+    query_content: str,
+    file_contents: Optional[Mapping[str, str]] = None,
+    patient_context: Optional[str] = None,
+) -> str:
+    """Key a suggestion by everything that determines the completion"""
+    payload = {
+        "system_prompt": content_digest(system_prompt),
+        "model": model,
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+        "query": normalize_text(query_content),
+        "files": sorted(
+            (name, content_digest(content or "")) for name, content in (file_contents or {}).items()
+        ),
+    }
+    if patient_context:
+        payload["patient_context"] = content_digest(patient_context)
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+class SuggestionCache:
+    """Two-tier TTL cache: in-memory LRU in front of an optional SQLite table"""
+
+    def __init__(self, max_entries: int = SUGGESTION_CACHE_SIZE, ttl: float = SUGGESTION_CACHE_TTL_SECONDS, db_path: Optional[str] = SUGGESTION_CACHE_DB):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._memory: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS suggestion_cache ("
+                "key TEXT PRIMARY KEY, content TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.commit()
+        self.stats: Dict[str, int] = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "bypasses": 0,
+            "evictions": 0,
+            "expirations": 0,
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_entries > 0
+
+    @property
+    def persistent(self) -> bool:
+        """Whether get/set touch the SQLite tier (blocking I/O, keep it off the event loop)"""
+        return self._db is not None
+
+    def get(self, key: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, content = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self.stats["memory_hits"] += 1
+                    return content
+                del self._memory[key]
+                self.stats["expirations"] += 1
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT content, expires_at FROM suggestion_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    content, expires_at = row
+                    if expires_at > now:
+                        self._remember(key, content, expires_at)
+                        self.stats["disk_hits"] += 1
+                        return content
+                    self._db.execute("DELETE FROM suggestion_cache WHERE key = ?", (key,))
+                    self._db.commit()
+                    self.stats["expirations"] += 1
+
+            self.stats["misses"] += 1
+            return None
+
+    def set(self, key: str, content: str) -> None:
+        if not self.enabled:
+            return
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._remember(key, content, expires_at)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO suggestion_cache (key, content, expires_at) VALUES (?, ?, ?)",
+                    (key, content, expires_at),
+                )
+                self._db.commit()
+
+    def record_bypass(self) -> None:
+        with self._lock:
+            self.stats["bypasses"] += 1
+
+    def _remember(self, key: str, content: str, expires_at: float) -> None:
+        self._memory[key] = (expires_at, content)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def purge_expired(self) -> int:
+        """Drop expired entries from both tiers; returns how many were removed"""
+        now = time.time()
+        with self._lock:
+            stale = [k for k, (expires_at, _) in self._memory.items() if expires_at <= now]
+            for key in stale:
+                del self._memory[key]
+            removed = len(stale)
+            if self._db is not None:
+                removed += self._db.execute("DELETE FROM suggestion_cache WHERE expires_at <= ?", (now,)).rowcount
+                self._db.commit()
+            self.stats["expirations"] += removed
+            return removed
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM suggestion_cache")
+                self._db.commit()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Counters plus current size, for the stats endpoint"""
+        with self._lock:
+            hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+            lookups = hits + self.stats["misses"]
+            return {
+                **self.stats,
+                "entries": len(self._memory),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "persistent": self.persistent,
+                "hit_rate": hits / lookups if lookups else None,
+            }
+
+suggestion_cache = SuggestionCache()
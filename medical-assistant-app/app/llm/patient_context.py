@@ -0,0 +1,251 @@
+"""Per-patient context snapshots for suggestion prompts
+
+A snapshot is a small JSON document per patient: age, the latest
+doctor-approved reviews and key lab values from uploaded reports. It is
+stored in the ``patientcontext`` table and updated incrementally, when a
+review is created or a file is uploaded. A suggestion never reads the
+patient's history; it reads one row, or nothing at all when the rendered
+text is already in the in-process LRU. Every part of the snapshot is
+capped, so prompt assembly costs the same for a first visit and a
+hundredth.
+
+Snapshots missing from the table (new patients, databases older than the
+table, rows dropped by a bulk import or a purge) are rebuilt from the
+latest rows on first use.
+"""
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import json
+import os
+import re
+import threading
+import time
+
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select
+
+from app.models import File, Patient, PatientContext, Query, Review
+
+# Rendered snapshots kept in memory
+PATIENT_CONTEXT_CACHE_SIZE = int(os.getenv("PATIENT_CONTEXT_CACHE_SIZE", "2048"))
+
+# Seconds a cached snapshot is trusted before the table is read again (other processes may have updated it)
+PATIENT_CONTEXT_TTL_SECONDS = float(os.getenv("PATIENT_CONTEXT_TTL_SECONDS", "300"))
+
+# Approved reviews and lab values kept per patient
+PATIENT_CONTEXT_MAX_REVIEWS = int(os.getenv("PATIENT_CONTEXT_MAX_REVIEWS", "3"))
+PATIENT_CONTEXT_MAX_LABS = int(os.getenv("PATIENT_CONTEXT_MAX_LABS", "12"))
+
+# Upper bound on the rendered text added to the prompt
+PATIENT_CONTEXT_MAX_CHARS = int(os.getenv("PATIENT_CONTEXT_MAX_CHARS", "1500"))
+
+# Characters of each question and answer kept in a review entry
+REVIEW_EXCERPT_CHARS = 240
+
+# Files read when a snapshot is rebuilt, and how much of each is scanned for lab values
+REBUILD_MAX_FILES = 5
+LAB_SCAN_CHARS = 100_000
+
+# "Glucose     105     70-99 mg/dL     H": a test name, two or more spaces, a number, then units, range and flag
+_LAB_LINE = re.compile(r"^\s*([A-Za-z][A-Za-z0-9 ,()/%+\-]{0,38}?)\s{2,}([<>]?\d+(?:\.\d+)?)\s+(.*?)\s*$")
+_LAB_FLAG = re.compile(r"(?:^|\s)(H|L|HH|LL|HIGH|LOW|\*)$", re.IGNORECASE)
+
+def extract_lab_values(text: str) -> List[Dict[str, Any]]:
+    """Lab results found in a tabular report, one per test name (the last one wins)"""
+    values: Dict[str, Dict[str, Any]] = {}
+    for line in text[:LAB_SCAN_CHARS].splitlines():
+        match = _LAB_LINE.match(line)
+        if not match:
+            continue
+        name, value, rest = match.groups()
+        flag_match = _LAB_FLAG.search(rest)
+        flag = flag_match.group(1).upper()[0] if flag_match else None
+        reference = " ".join(rest[:flag_match.start()].split()) if flag_match else " ".join(rest.split())
+        values[name.strip().lower()] = {"test": name.strip(), "value": value, "reference": reference, "flag": flag}
+    return list(values.values())
+
+def _excerpt(text: str, limit: int = REVIEW_EXCERPT_CHARS) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[:limit - 1].rstrip() + "…"
+
+def empty_snapshot(age: Optional[int]) -> Dict[str, Any]:
+    return {"age": age, "reviews": [], "labs": []}
+
+def add_review(snapshot: Dict[str, Any], question: str, review: Review, max_reviews: int = PATIENT_CONTEXT_MAX_REVIEWS) -> bool:
+    """Put an approved review first; returns False when the review is not kept"""
+    if not review.approved:
+        return False
+    entry = {
+        "query_id": review.query_id,
+        "date": (review.created_at or datetime.utcnow()).strftime("%Y-%m-%d"),
+        "question": _excerpt(question),
+        "advice": _excerpt(review.content),
+    }
+    reviews = [r for r in snapshot["reviews"] if r["query_id"] != review.query_id]
+    snapshot["reviews"] = ([entry] + reviews)[:max_reviews]
+    return True
+
+def add_labs(snapshot: Dict[str, Any], text: str, collected: Optional[datetime] = None, max_labs: int = PATIENT_CONTEXT_MAX_LABS) -> bool:
+    """Merge a report's lab values; returns False when the text holds none
+
+    A newer value replaces the older one for the same test. Over the cap,
+    flagged (out-of-range) results are kept before normal ones, newer before
+    older.
+    """
+    found = extract_lab_values(text or "")
+    if not found:
+        return False
+    date = (collected or datetime.utcnow()).strftime("%Y-%m-%d")
+    labs = {lab["test"].lower(): lab for lab in snapshot["labs"]}
+    for lab in found:
+        labs[lab["test"].lower()] = {**lab, "date": date}
+    ranked = sorted(labs.values(), key=lambda lab: (lab["flag"] is not None, lab["date"]), reverse=True)
+    snapshot["labs"] = ranked[:max_labs]
+    return True
+
+def render_context(snapshot: Dict[str, Any], max_chars: int = PATIENT_CONTEXT_MAX_CHARS) -> str:
+    """Prompt text for a snapshot, empty when there is nothing to say"""
+    lines = []
+    if snapshot.get("age"):
+        lines.append(f"Age: {snapshot['age']}")
+    if snapshot["reviews"]:
+        lines.append("Recent doctor-approved advice:")
+        lines.extend(f"- {r['date']}: asked \"{r['question']}\"; advised \"{r['advice']}\"" for r in snapshot["reviews"])
+    if snapshot["labs"]:
+        lines.append("Key lab values (latest report):")
+        lines.extend(
+            f"- {lab['test']}: {lab['value']}" + (f" ({lab['reference']})" if lab["reference"] else "")
+            + (f" [{lab['flag']}]" if lab["flag"] else "") + f", {lab['date']}"
+            for lab in snapshot["labs"]
+        )
+    text = "\n".join(lines)
+    return text if len(text) <= max_chars else text[:max_chars - 1].rstrip() + "…"
+
+def build_snapshot(session: Session, patient_id: int) -> Dict[str, Any]:
+    """Rebuild a snapshot from the patient's latest reviews and files"""
+    patient = session.get(Patient, patient_id)
+    snapshot = empty_snapshot(patient.age if patient else None)
+    reviews = session.exec(
+        select(Review, Query.content)
+        .join(Query, Query.id == Review.query_id)
+        .where(Query.patient_id == patient_id, Review.approved == True)  # noqa: E712
+        .order_by(Review.created_at.desc())
+        .limit(PATIENT_CONTEXT_MAX_REVIEWS)
+    ).all()
+    # Added oldest first so the newest ends up on top
+    for review, question in reversed(reviews):
+        add_review(snapshot, question, review)
+    files = session.exec(
+        select(File.extracted_text, File.created_at)
+        .join(Query, Query.id == File.query_id)
+        .where(Query.patient_id == patient_id, File.extracted_text.is_not(None))
+        .order_by(File.created_at.desc())
+        .limit(REBUILD_MAX_FILES)
+    ).all()
+    for text, created_at in reversed(files):
+        add_labs(snapshot, text, created_at)
+    return snapshot
+
+class PatientContextStore:
+    """LRU of rendered snapshots in front of the ``patientcontext`` table"""
+
+    def __init__(self, max_entries: int = PATIENT_CONTEXT_CACHE_SIZE, ttl: float = PATIENT_CONTEXT_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # patient_id -> (expires_at, version, rendered text)
+        self._memory: "OrderedDict[int, Tuple[float, int, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats: Dict[str, int] = {"hits": 0, "loads": 0, "rebuilds": 0, "updates": 0, "evictions": 0}
+
+    def get(self, session: Session, patient_id: int) -> str:
+        """Rendered context for a patient: from memory, else one row, else rebuilt and stored"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(patient_id)
+            if entry is not None and entry[0] > now:
+                self._memory.move_to_end(patient_id)
+                self.stats["hits"] += 1
+                return entry[2]
+
+        row = session.get(PatientContext, patient_id)
+        if row is not None:
+            snapshot = json.loads(row.snapshot)
+            self.stats["loads"] += 1
+        else:
+            snapshot = build_snapshot(session, patient_id)
+            row = PatientContext(patient_id=patient_id, snapshot=json.dumps(snapshot))
+            session.add(row)
+            try:
+                session.commit()
+            except IntegrityError:
+                # A concurrent request stored it first; theirs is as good
+                session.rollback()
+                row = session.get(PatientContext, patient_id)
+                snapshot = json.loads(row.snapshot)
+            self.stats["rebuilds"] += 1
+        return self.remember(patient_id, row.version, snapshot)
+
+    def update(self, session: Session, patient_id: int, change: Callable[[Dict[str, Any]], bool]) -> Optional[Tuple[int, Dict[str, Any]]]:
+        """Apply ``change`` to a patient's stored snapshot in the caller's transaction
+
+        Returns ``(version, snapshot)`` to hand to ``remember`` once the
+        caller has committed, or None when ``change`` left it alone. The
+        session is flushed first so the write lock is held before the
+        snapshot is read and concurrent updates cannot overwrite each other.
+        """
+        session.flush()
+        row = session.get(PatientContext, patient_id)
+        if row is None:
+            snapshot = build_snapshot(session, patient_id)
+            row = PatientContext(patient_id=patient_id, snapshot=json.dumps(snapshot), version=0)
+        else:
+            snapshot = json.loads(row.snapshot)
+        if not change(snapshot) and row.version:
+            return None
+        row.snapshot = json.dumps(snapshot)
+        row.version += 1
+        row.updated_at = datetime.utcnow()
+        session.add(row)
+        self.stats["updates"] += 1
+        return row.version, snapshot
+
+    def remember(self, patient_id: int, version: int, snapshot: Dict[str, Any]) -> str:
+        """Cache a committed snapshot's rendered text and return it"""
+        text = render_context(snapshot)
+        with self._lock:
+            current = self._memory.get(patient_id)
+            # A slower request must not replace a newer snapshot
+            if current is None or current[1] <= version:
+                self._memory[patient_id] = (time.time() + self.ttl, version, text)
+                self._memory.move_to_end(patient_id)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+                self.stats["evictions"] += 1
+        return text
+
+    def discard(self, patient_id: Optional[int] = None) -> None:
+        """Forget one patient's cached context, or everyone's"""
+        with self._lock:
+            if patient_id is None:
+                self._memory.clear()
+            else:
+                self._memory.pop(patient_id, None)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.stats, "entries": len(self._memory), "max_entries": self.max_entries, "ttl_seconds": self.ttl}
+
+patient_contexts = PatientContextStore()
+
+def record_review(session: Session, query: Query, review: Review, store: Optional[PatientContextStore] = None) -> Optional[Tuple[int, Dict[str, Any]]]:
+    """Add a new review to its patient's snapshot (commit, then ``patient_contexts.remember``)"""
+    store = store or patient_contexts
+    return store.update(session, query.patient_id, lambda snapshot: add_review(snapshot, query.content, review))
+
+def record_file(session: Session, query: Query, text: Optional[str], store: Optional[PatientContextStore] = None) -> Optional[Tuple[int, Dict[str, Any]]]:
+    """Merge an uploaded report's lab values into its patient's snapshot"""
+    if not text:
+        return None
+    store = store or patient_contexts
+    return store.update(session, query.patient_id, lambda snapshot: add_labs(snapshot, text))
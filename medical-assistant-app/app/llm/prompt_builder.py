@@ -0,0 +1,233 @@
+"""Token-budgeted document excerpts for suggestion prompts
+
+Uploaded documents are not pasted into the prompt whole. Their extracted
+text is normalized first:
+
+- running headers and footers are removed
+- page numbers at the top or bottom of a page are dropped
+- words hyphenated across lines are joined
+- whitespace is collapsed
+
+The text is then cut into chunks of about ``PROMPT_CHUNK_TOKENS``. When
+everything fits in ``PROMPT_TOKEN_BUDGET`` it is all sent. Otherwise the
+chunks are ranked against the patient's query with BM25, and the best
+ones that fit are sent in their original order, with a marker wherever
+text was left out.
+
+Tokens are counted with ``tiktoken`` when it is installed, and estimated
+at four characters per token otherwise.
+"""
+from collections import Counter
+from typing import Dict, List, Mapping, NamedTuple, Optional
+import math
+import os
+import re
+
+from app.utils.text_extraction import PAGE_BREAK
+
+try:
+    import tiktoken
+except ImportError:  # optional: estimates are close enough for budgeting
+    tiktoken = None
+
+# Tokens of document text allowed in one prompt
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "3000"))
+
+# Target size of a document chunk in tokens
+PROMPT_CHUNK_TOKENS = int(os.getenv("PROMPT_CHUNK_TOKENS", "200"))
+
+# Okapi BM25 parameters
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# A line at the top or bottom of at least this share of pages is a running header or footer
+REPEATED_LINE_SHARE = 0.5
+
+# Marks text left out between two excerpts
+OMITTED = "[...]"
+
+_STOPWORDS = frozenset(
+    "a an and are as at be been but by can do does for from had has have i if in into is it its me my "
+    "no not of on or our she so than that the their them then there these they this to was we were what "
+    "when which who will with you your".split()
+)
+_WORD = re.compile(r"[a-z0-9]+(?:\.[0-9]+)?")
+_PAGE_NUMBER = re.compile(r"^(page\s*)?\d+(\s*(of|/)\s*\d+)?$", re.IGNORECASE)
+
+_encoding = None
+
+def count_tokens(text: str) -> int:
+    global _encoding
+    if tiktoken is not None:
+        if _encoding is None:
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        return len(_encoding.encode(text))
+    return (len(text) + 3) // 4
+
+def terms(text: str) -> List[str]:
+    return [word for word in _WORD.findall(text.lower()) if word not in _STOPWORDS]
+
+def _line_key(line: str) -> str:
+    # Headers differ only in page numbers or dates from page to page
+    return re.sub(r"\d+", "#", " ".join(line.split()).lower())
+
+def normalize_document(text: str) -> str:
+    """Clean extracted text for the prompt: no running headers, page numbers or split words"""
+    pages = [page.splitlines() for page in text.split(PAGE_BREAK)]
+    if len(pages) >= 3:
+        edges = Counter()
+        for lines in pages:
+            content = [line for line in lines if line.strip()]
+            edges.update({_line_key(line) for line in content[:2] + content[-2:]})
+        repeated = {key for key, seen in edges.items() if seen >= len(pages) * REPEATED_LINE_SHARE}
+        pages = [[line for line in lines if _line_key(line) not in repeated] for lines in pages]
+
+    lines = []
+    for page in pages:
+        page = [" ".join(line.split()) for line in page]
+        content = [i for i, line in enumerate(page) if line]
+        # Only at the top or bottom of a page: elsewhere a bare number is likely a table cell (a lab value)
+        edges = {content[0], content[-1]} if content else set()
+        lines.extend(line for i, line in enumerate(page) if not (i in edges and _PAGE_NUMBER.match(line)))
+        lines.append("")
+    text = "\n".join(lines)
+    # "hypo-\nthyroidism" -> "hypothyroidism"
+    text = re.sub(r"(\w)-\n(\w)", r"\1\2", text)
+    return re.sub(r"\n{3,}", "\n\n", text).strip()
+
+def _pack(units: List[str], joiner: str, max_tokens: int) -> List[str]:
+    pieces, current, current_tokens = [], [], 0
+    for unit in units:
+        tokens = count_tokens(unit) + 1
+        if current and current_tokens + tokens > max_tokens:
+            pieces.append(joiner.join(current))
+            current, current_tokens = [], 0
+        current.append(unit)
+        current_tokens += tokens
+    if current:
+        pieces.append(joiner.join(current))
+    return pieces
+
+def _split_long(paragraph: str, max_tokens: int) -> List[str]:
+    """Break an oversized paragraph at line, then word, boundaries"""
+    lines = []
+    for line in paragraph.split("\n"):
+        lines.extend([line] if count_tokens(line) <= max_tokens else _pack(line.split(" "), " ", max_tokens))
+    return _pack(lines, "\n", max_tokens)
+
+def chunk_document(text: str, max_tokens: int = PROMPT_CHUNK_TOKENS) -> List[str]:
+    """Group paragraphs into chunks of at most about ``max_tokens``"""
+    chunks, current, current_tokens = [], [], 0
+    for paragraph in (p for p in text.split("\n\n") if p.strip()):
+        tokens = count_tokens(paragraph)
+        if tokens > max_tokens:
+            if current:
+                chunks.append("\n\n".join(current))
+                current, current_tokens = [], 0
+            chunks.extend(_split_long(paragraph, max_tokens))
+            continue
+        if current and current_tokens + tokens > max_tokens:
+            chunks.append("\n\n".join(current))
+            current, current_tokens = [], 0
+        current.append(paragraph)
+        current_tokens += tokens
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+def bm25_scores(query: str, chunks: List[str], k1: float = BM25_K1, b: float = BM25_B) -> List[float]:
+    """Okapi BM25 relevance of each chunk to ``query``, with the chunks as the corpus"""
+    query_terms = set(terms(query))
+    documents = [Counter(terms(chunk)) for chunk in chunks]
+    if not query_terms or not documents:
+        return [0.0] * len(chunks)
+    average_length = sum(sum(doc.values()) for doc in documents) / len(documents) or 1.0
+    frequency = Counter(term for doc in documents for term in query_terms if term in doc)
+    idf = {term: math.log(1 + (len(documents) - n + 0.5) / (n + 0.5)) for term, n in frequency.items()}
+    scores = []
+    for doc in documents:
+        length = sum(doc.values())
+        score = 0.0
+        for term, weight in idf.items():
+            tf = doc.get(term, 0)
+            if tf:
+                score += weight * tf * (k1 + 1) / (tf + k1 * (1 - b + b * length / average_length))
+        scores.append(score)
+    return scores
+
+class DocumentChunk(NamedTuple):
+    filename: str
+    position: int
+    text: str
+    tokens: int
+
+class DocumentPrompt(NamedTuple):
+    # Excerpt sent for each file, in upload order
+    excerpts: Dict[str, str]
+    text: str
+    original_tokens: int
+    tokens: int
+    chunks: int
+    chunks_used: int
+
+    @property
+    def tokens_saved(self) -> int:
+        return max(self.original_tokens - self.tokens, 0)
+
+def _render(excerpts: Mapping[str, str]) -> str:
+    if not excerpts:
+        return ""
+    return "\n\nThe following files were uploaded with this query:\n\n" + "".join(
+        f"--- {filename} ---\n{excerpt}\n\n" for filename, excerpt in excerpts.items()
+    )
+
+def build_document_prompt(
+    query: str,
+    file_contents: Mapping[str, Optional[str]],
+    budget: int = PROMPT_TOKEN_BUDGET,
+    chunk_tokens: int = PROMPT_CHUNK_TOKENS,
+) -> DocumentPrompt:
+    """Choose the document text for a prompt within ``budget`` tokens"""
+    original_tokens = sum(count_tokens(content or "") for content in file_contents.values())
+    chunks: List[DocumentChunk] = []
+    for filename, content in file_contents.items():
+        for position, text in enumerate(chunk_document(normalize_document(content or ""), chunk_tokens)):
+            chunks.append(DocumentChunk(filename, position, text, count_tokens(text)))
+
+    if sum(chunk.tokens for chunk in chunks) <= budget:
+        chosen = chunks
+    else:
+        scores = bm25_scores(query, [chunk.text for chunk in chunks])
+        # Best first; among equals the earlier text, where reports put their summary
+        ranked = sorted(range(len(chunks)), key=lambda i: (-scores[i], i))
+        kept, used = [], 0
+        for i in ranked:
+            if used + chunks[i].tokens <= budget:
+                kept.append(i)
+                used += chunks[i].tokens
+        chosen = [chunks[i] for i in sorted(kept)]
+
+    # Per file: its excerpt pieces, with a marker at every gap (including a cut-off end)
+    totals = Counter(chunk.filename for chunk in chunks)
+    pieces: Dict[str, List[str]] = {}
+    last_position: Dict[str, int] = {}
+    for chunk in chosen:
+        if chunk.position != last_position.get(chunk.filename, -1) + 1:
+            pieces.setdefault(chunk.filename, []).append(OMITTED)
+        pieces.setdefault(chunk.filename, []).append(chunk.text)
+        last_position[chunk.filename] = chunk.position
+    excerpts = {}
+    for filename in file_contents:
+        if filename in pieces:
+            if last_position[filename] != totals[filename] - 1:
+                pieces[filename].append(OMITTED)
+            excerpts[filename] = "\n\n".join(pieces[filename])
+
+    return DocumentPrompt(
+        excerpts=excerpts,
+        text=_render(excerpts),
+        original_tokens=original_tokens,
+        tokens=sum(chunk.tokens for chunk in chosen),
+        chunks=len(chunks),
+        chunks_used=len(chosen),
+    )
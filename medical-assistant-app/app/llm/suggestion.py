@@ -1,21 +1,57 @@
 import os
+import asyncio
+import random
+import time
 from datetime import datetime
-from typing import Dict, Any, Optional
-import openai
+from typing import Dict, Any, List, Optional, Tuple
+from openai import (
+    AsyncOpenAI,
+    APIConnectionError,
+    InternalServerError,
+    RateLimitError,
+)
 from dotenv import load_dotenv
 
 # Import models
-from app.models import Query, AISuggestion, QueryStatus
-from sqlmodel import Session
+from app.models import Query, AISuggestion, QueryStatus, File
+from sqlalchemy.orm import undefer
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from app.llm.cache import SuggestionCache, suggestion_cache, suggestion_cache_key
+from app.llm.patient_context import patient_contexts
+from app.llm.prompt_builder import build_document_prompt
+from app.metrics.instruments import LLM_RETRIES, record_llm_attempt, record_prompt_documents
 
 # Load environment variables
 load_dotenv()
 
-# Configure OpenAI API
-openai.api_key = os.getenv("OPENAI_API_KEY")
-
 # Default model to use
-DEFAULT_MODEL = "gpt-4"
+DEFAULT_MODEL = os.getenv("OPENAI_MODEL", "gpt-4")
+
+# Optional OpenAI-compatible endpoint (e.g. a local mock server for load tests)
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+
+# Maximum number of completions in flight at once, per process
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+
+# Seconds allowed for a single completion attempt
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+
+# Retries after the first attempt for timeouts, connection errors, 429s and 5xx
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+
+# Exponential backoff bounds in seconds (full jitter is applied)
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "8"))
+
+# Errors worth retrying; anything else (bad request, auth) fails immediately
+RETRYABLE_ERRORS = (
+    APIConnectionError,  # includes APITimeoutError
+    RateLimitError,
+    InternalServerError,
+    asyncio.TimeoutError,
+)
 
 # System prompt for medical assistant
 SYSTEM_PROMPT = """
@@ -33,115 +69,287 @@ Your suggestions will be reviewed by a qualified medical professional before bei
 Format your response in a structured way with clear sections.
 """
 
-async def generate_suggestion(query: Query, session: Session) -> AISuggestion:
-    """Generate an AI suggestion for a patient query"""
-    try:
-        # Extract query content
-        query_content = query.content
-        
-        # Create messages for the API call
-        messages = [
-            {"role": "system", "content": SYSTEM_PROMPT},
-            {"role": "user", "content": query_content}
-        ]
-        
-        # Call OpenAI API
-        response = openai.ChatCompletion.create(
-            model=DEFAULT_MODEL,
-            messages=messages,
-            temperature=0.3,  # Lower temperature for more factual responses
-            max_tokens=1000,
-            top_p=0.95,
-            frequency_penalty=0,
-            presence_penalty=0
+def build_messages(user_content: str, patient_context: Optional[str] = None) -> List[Dict[str, str]]:
+    """System prompt, then the patient's record summary (if any), then the query"""
+    messages = [{"role": "system", "content": SYSTEM_PROMPT}]
+    if patient_context:
+        messages.append({
+            "role": "system",
+            "content": f"Patient record summary (may be incomplete):\n{patient_context}",
+        })
+    messages.append({"role": "user", "content": user_content})
+    return messages
+
+class SuggestionEngine:
+    """Asynchronous chat-completion client shared by all suggestion requests
+
+    One ``AsyncOpenAI`` client is reused so HTTP connections are pooled. A
+    semaphore bounds the number of completions in flight, every attempt has
+    its own timeout, and retryable failures are retried with exponential
+    backoff and full jitter.
+    """
+
+    def __init__(
+        self,
+        client: Optional[Any] = None,
+        model: str = DEFAULT_MODEL,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        timeout: float = LLM_TIMEOUT_SECONDS,
+        max_retries: int = LLM_MAX_RETRIES,
+        backoff_base: float = LLM_BACKOFF_BASE,
+        backoff_max: float = LLM_BACKOFF_MAX,
+    ):
+        # Retries are handled here, so the client's own retry loop is disabled
+        self.client = client or AsyncOpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            base_url=OPENAI_BASE_URL,
+            max_retries=0,
         )
-        
-        # Extract suggestion content
-        suggestion_content = response.choices[0].message.content
-        
-        # Calculate confidence score (simplified example)
-        confidence_score = 0.7  # In a real system, this would be more sophisticated
-        
-        # Create AI suggestion record
+        self.model = model
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    def backoff_delay(self, attempt: int) -> float:
+        """Full-jitter delay before retry number ``attempt`` (starting at 0)"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    async def complete(self, messages: List[Dict[str, str]], max_tokens: int = 1000, temperature: float = 0.3) -> str:
+        """Return the assistant message for a chat completion request"""
+        attempt = 0
+        while True:
+            try:
+                async with self._semaphore:
+                    # Timed inside the semaphore so queueing for a slot is not counted as API latency
+                    started = time.perf_counter()
+                    try:
+                        response = await asyncio.wait_for(
+                            self.client.chat.completions.create(
+                                model=self.model,
+                                messages=messages,
+                                temperature=temperature,
+                                max_tokens=max_tokens,
+                                top_p=0.95,
+                                frequency_penalty=0,
+                                presence_penalty=0,
+                            ),
+                            timeout=self.timeout,
+                        )
+                    except Exception:
+                        record_llm_attempt(self.model, time.perf_counter() - started, "error")
+                        raise
+                    record_llm_attempt(self.model, time.perf_counter() - started, "ok", getattr(response, "usage", None))
+                return response.choices[0].message.content
+            except RETRYABLE_ERRORS as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = self.backoff_delay(attempt)
+                attempt += 1
+                LLM_RETRIES.inc(model=self.model)
+                print(f"LLM call failed ({type(e).__name__}), retry {attempt}/{self.max_retries} in {delay:.2f}s")
+                # Sleep outside the semaphore so waiting retries don't hold a slot
+                await asyncio.sleep(delay)
+
+    async def aclose(self) -> None:
+        close = getattr(self.client, "close", None)
+        if close is not None:
+            await close()
+
+_engine: Optional[SuggestionEngine] = None
+
+def llm_configured() -> bool:
+    """True when an OpenAI key or compatible endpoint is available"""
+    return bool(os.getenv("OPENAI_API_KEY") or OPENAI_BASE_URL)
+
+def get_engine() -> SuggestionEngine:
+    """Return the process-wide suggestion engine, creating it on first use"""
+    global _engine
+    if _engine is None:
+        _engine = SuggestionEngine()
+    return _engine
+
+def set_engine(engine: Optional[SuggestionEngine]) -> None:
+    """Replace the process-wide engine (tests, benchmarks, alternative providers)"""
+    global _engine
+    _engine = engine
+
+async def close_engine() -> None:
+    """Close the shared engine's HTTP connections (called on app shutdown)"""
+    global _engine
+    if _engine is not None:
+        await _engine.aclose()
+        _engine = None
+
+# Canned suggestions used when no LLM endpoint is configured
+def demo_suggestion(content: str) -> str:
+    """Generate a simple AI suggestion for demo purposes"""
+    content_lower = content.lower()
+    
+    if 'headache' in content_lower:
+        return "For headaches, consider: 1) Rest in a quiet, dark room 2) Stay hydrated 3) Apply cold/warm compress 4) Over-the-counter pain relievers if appropriate. Seek immediate care if severe or accompanied by fever, stiff neck, or vision changes."
+    
+    elif 'fever' in content_lower:
+        return "For fever management: 1) Stay hydrated 2) Rest 3) Monitor temperature regularly 4) Consider fever reducers if appropriate. Seek medical attention if fever is high (>101.3°F/38.5°C) or persists."
+    
+    elif 'cough' in content_lower:
+        return "For cough symptoms: 1) Stay hydrated 2) Use honey or throat lozenges 3) Humidify air 4) Avoid irritants. Consult healthcare provider if cough persists >2 weeks, produces blood, or accompanied by fever/difficulty breathing."
+    
+    else:
+        return "Based on your symptoms, I recommend monitoring your condition and consulting with a healthcare provider for proper evaluation and personalized medical advice. If symptoms worsen or you're concerned, seek medical attention promptly."
+
+async def cached_complete(
+    engine: SuggestionEngine,
+    messages: List[Dict[str, str]],
+    cache_key: str,
+    max_tokens: int,
+    temperature: float,
+    use_cache: bool = True,
+    cache: SuggestionCache = suggestion_cache,
+) -> str:
+    """Serve a completion from the suggestion cache, calling the model on a miss
+
+    With ``use_cache=False`` the cache is not read (e.g. the doctor asked to
+    regenerate), but the fresh completion replaces the cached one.
+    """
+    if use_cache:
+        if cache.enabled and cache.persistent:
+            # The SQLite tier does blocking I/O under the cache lock
+            cached = await run_in_threadpool(cache.get, cache_key)
+        else:
+            cached = cache.get(cache_key)
+        if cached is not None:
+            return cached
+    else:
+        cache.record_bypass()
+
+    content = await engine.complete(messages, max_tokens=max_tokens, temperature=temperature)
+    if cache.enabled and cache.persistent:
+        await run_in_threadpool(cache.set, cache_key, content)
+    else:
+        cache.set(cache_key, content)
+    return content
+
+def save_suggestion(query: Query, content: str, confidence_score: float, model: str, session: Session) -> AISuggestion:
+    """Store (or replace) a query's AI suggestion and move the query to awaiting review"""
+    suggestion = session.exec(select(AISuggestion).where(AISuggestion.query_id == query.id)).first()
+    if suggestion:
+        suggestion.content = content
+        suggestion.model_used = model
+        suggestion.confidence_score = confidence_score
+        suggestion.updated_at = datetime.utcnow()
+    else:
         suggestion = AISuggestion(
             query_id=query.id,
-            content=suggestion_content,
-            model_used=DEFAULT_MODEL,
+            content=content,
+            model_used=model,
             confidence_score=confidence_score
         )
-        
-        # Update query status
+
+    # Update query status (a regenerated suggestion leaves reviewed queries alone)
+    if query.status in (QueryStatus.PENDING, QueryStatus.PROCESSING):
         query.status = QueryStatus.AWAITING_REVIEW
-        query.updated_at = datetime.utcnow()
-        
-        # Save to database
-        session.add(suggestion)
-        session.add(query)
-        session.commit()
-        session.refresh(suggestion)
-        
-        return suggestion
-        
+    query.updated_at = datetime.utcnow()
+
+    # Save to database
+    session.add(suggestion)
+    session.add(query)
+    session.commit()
+    session.refresh(suggestion)
+
+    return suggestion
+
+async def complete_suggestion(
+    query_content: str,
+    file_contents: Optional[Dict[str, Any]] = None,
+    engine: Optional[SuggestionEngine] = None,
+    use_cache: bool = True,
+    patient_context: Optional[str] = None,
+) -> Tuple[str, float, str]:
+    """Return ``(content, confidence_score, model)`` for a query, without touching the database
+
+    ``patient_context`` is the rendered snapshot from ``app.llm.patient_context``.
+    """
+    engine = engine or get_engine()
+    if file_contents:
+        # Only the document chunks most relevant to the query that fit the token budget
+        documents = build_document_prompt(query_content, file_contents)
+        record_prompt_documents(documents.tokens, documents.tokens_saved)
+        if documents.tokens_saved:
+            print(f"✂️ Sent {documents.chunks_used}/{documents.chunks} document chunks, "
+                  f"{documents.tokens} of {documents.original_tokens} tokens ({documents.tokens_saved} saved)")
+
+        # Increased max_tokens for file processing
+        messages = build_messages(query_content + documents.text, patient_context)
+        # Keyed on what the model sees, so a changed budget is a different prompt
+        cache_key = suggestion_cache_key(SYSTEM_PROMPT, engine.model, 0.3, 1500, query_content, documents.excerpts, patient_context)
+        content = await cached_complete(
+            engine, messages, cache_key, max_tokens=1500, temperature=0.3, use_cache=use_cache
+        )
+        # Lower for file-based queries due to complexity
+        return content, 0.65, engine.model
+
+    # Lower temperature for more factual responses
+    messages = build_messages(query_content, patient_context)
+    cache_key = suggestion_cache_key(SYSTEM_PROMPT, engine.model, 0.3, 1000, query_content, patient_context=patient_context)
+    content = await cached_complete(
+        engine, messages, cache_key, max_tokens=1000, temperature=0.3, use_cache=use_cache
+    )
+    # Calculate confidence score (simplified example)
+    return content, 0.7, engine.model
+
+async def generate_suggestion(query: Query, session: Session, engine: Optional[SuggestionEngine] = None, use_cache: bool = True) -> AISuggestion:
+    """Generate an AI suggestion for a patient query"""
+    try:
+        patient_context = await run_in_threadpool(patient_contexts.get, session, query.patient_id)
+        content, confidence_score, model = await complete_suggestion(
+            query.content, engine=engine, use_cache=use_cache, patient_context=patient_context
+        )
+        return await run_in_threadpool(save_suggestion, query, content, confidence_score, model, session)
+
     except Exception as e:
         # Log the error
         print(f"Error generating suggestion: {str(e)}")
         raise
 
-async def process_query_with_files(query: Query, file_contents: Dict[str, Any], session: Session) -> AISuggestion:
+async def process_query_with_files(query: Query, file_contents: Dict[str, Any], session: Session, engine: Optional[SuggestionEngine] = None, use_cache: bool = True) -> AISuggestion:
     """Generate an AI suggestion for a query with associated files"""
     try:
-        # Extract query content
-        query_content = query.content
-        
-        # Prepare file content for inclusion in the prompt
-        file_prompt = "\n\nThe following files were uploaded with this query:\n\n"
-        for filename, content in file_contents.items():
-            file_prompt += f"--- {filename} ---\n{content}\n\n"
-        
-        # Create messages for the API call
-        messages = [
-            {"role": "system", "content": SYSTEM_PROMPT},
-            {"role": "user", "content": query_content + file_prompt}
-        ]
-        
-        # Call OpenAI API
-        response = openai.ChatCompletion.create(
-            model=DEFAULT_MODEL,
-            messages=messages,
-            temperature=0.3,
-            max_tokens=1500,  # Increased for file processing
-            top_p=0.95,
-            frequency_penalty=0,
-            presence_penalty=0
-        )
-        
-        # Extract suggestion content
-        suggestion_content = response.choices[0].message.content
-        
-        # Calculate confidence score (simplified example)
-        confidence_score = 0.65  # Lower for file-based queries due to complexity
-        
-        # Create AI suggestion record
-        suggestion = AISuggestion(
-            query_id=query.id,
-            content=suggestion_content,
-            model_used=DEFAULT_MODEL,
-            confidence_score=confidence_score
+        patient_context = await run_in_threadpool(patient_contexts.get, session, query.patient_id)
+        content, confidence_score, model = await complete_suggestion(
+            query.content, file_contents, engine=engine, use_cache=use_cache, patient_context=patient_context
         )
-        
-        # Update query status
-        query.status = QueryStatus.AWAITING_REVIEW
-        query.updated_at = datetime.utcnow()
-        
-        # Save to database
-        session.add(suggestion)
-        session.add(query)
-        session.commit()
-        session.refresh(suggestion)
-        
-        return suggestion
-        
+        return await run_in_threadpool(save_suggestion, query, content, confidence_score, model, session)
+
     except Exception as e:
         # Log the error
         print(f"Error generating suggestion with files: {str(e)}")
         raise
+
+async def regenerate_suggestion(query: Query, session: AsyncSession) -> AISuggestion:
+    """Produce a fresh suggestion for a query, bypassing the suggestion cache
+
+    Called from the API with an async session: the files are loaded with an
+    explicit query (no lazy loads) and the result is saved through the
+    shared synchronous ``save_suggestion``.
+    """
+    if not llm_configured():
+        content, confidence_score, model = demo_suggestion(query.content), 0.75, "demo_model"
+    else:
+        files = (await session.exec(
+            select(File).where(File.query_id == query.id).options(undefer(File.extracted_text))
+        )).all()
+        file_contents = {f.filename: f.extracted_text for f in files if f.extracted_text}
+        patient_context = await session.run_sync(patient_contexts.get, query.patient_id)
+        try:
+            content, confidence_score, model = await complete_suggestion(
+                query.content, file_contents, use_cache=False, patient_context=patient_context
+            )
+        except Exception as e:
+            print(f"Error regenerating suggestion: {str(e)}")
+            raise
+
+    return await session.run_sync(
+        lambda sync_session: save_suggestion(query, content, confidence_score, model, sync_session)
+    )
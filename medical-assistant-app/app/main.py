@@ -1,14 +1,21 @@
 from fastapi import FastAPI, Depends, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response
 from contextlib import asynccontextmanager
 import os
 from dotenv import load_dotenv
 from sqlmodel import Session, select  
+from sqlmodel.ext.asyncio.session import AsyncSession
 from app.models import Patient, Doctor, Query, QueryStatus, QueryPriority
-from app.db.database import create_db_and_tables, get_session, engine  
+from app.db.database import create_db_and_tables, get_session, get_async_session, engine, async_engine
+from app.metrics import REGISTRY, CONTENT_TYPE, MetricsMiddleware, kpi_cache
+from app.llm.suggestion import close_engine
+from app.jobs.worker import start_worker_pool, stop_worker_pool
+from app.utils.text_extraction import close_extraction_engine
+from app.utils.uploads import UploadLimitMiddleware
 
 # Import routes
-from app.routes import query, file, triage, review
+from app.routes import query, file, triage, review, queue, jobs, suggestion, search, diagnostics, events
 
 # Load environment variables
 load_dotenv()
@@ -56,7 +63,18 @@ async def lifespan(app: FastAPI):
             session.add(query)
             session.commit()
     
+    # Start background workers that generate AI suggestions
+    await start_worker_pool()
+    
     yield
+    
+    await stop_worker_pool()
+    # Release pooled LLM connections
+    await close_engine()
+    # Stop document extraction workers
+    close_extraction_engine()
+    # Close pooled async database connections
+    await async_engine.dispose()
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -66,6 +84,9 @@ app = FastAPI(
     lifespan=lifespan,
 )
 
+# Refuse oversized uploads before Starlette spools the multipart body (inside CORS, so the 413 is readable)
+app.add_middleware(UploadLimitMiddleware)
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -75,11 +96,21 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Record latency, in-flight requests and SQL work per route (outermost, so CORS is timed too);
+# with SQL_PROFILE=dev or prod it also feeds the statement profiler
+app.add_middleware(MetricsMiddleware)
+
 # Include routers
 app.include_router(query.router, prefix="/api/query", tags=["queries"])
 app.include_router(file.router, prefix="/api/file", tags=["files"])
 app.include_router(triage.router, prefix="/api/triage", tags=["triage"])
 app.include_router(review.router, prefix="/api/review", tags=["review"])
+app.include_router(queue.router, prefix="/api/queue", tags=["queue"])
+app.include_router(jobs.router, prefix="/api/jobs", tags=["jobs"])
+app.include_router(suggestion.router, prefix="/api/suggestion", tags=["suggestions"])
+app.include_router(search.router, prefix="/api/search", tags=["search"])
+app.include_router(events.router, prefix="/api/events", tags=["events"])
+app.include_router(diagnostics.router, prefix="/api/diagnostics", tags=["diagnostics"])
 
 # Root endpoint
 @app.get("/", tags=["status"])
@@ -96,6 +127,13 @@ async def health_check():
 async def version():
     return {"version": app.version}
 
+# Prometheus metrics: request, database, LLM and upload metrics plus the mcp-flow.yaml workflow KPIs
+@app.get("/metrics", tags=["status"])
+async def metrics(session: AsyncSession = Depends(get_async_session)):
+    if kpi_cache.stale():
+        await kpi_cache.refresh_async(session)
+    return Response(content=REGISTRY.render(), media_type=CONTENT_TYPE)
+
 # Only run if not using reload
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,6 @@
+# Metrics package initialization
+# Prometheus-format request, database, LLM and upload metrics plus the workflow KPIs from mcp-flow.yaml
+from app.metrics.registry import Registry, Counter, Gauge, Histogram, CONTENT_TYPE
+from app.metrics.instruments import REGISTRY, instrument_engine, record_llm_attempt, record_prompt_documents, record_upload
+from app.metrics.middleware import MetricsMiddleware
+from app.metrics.kpi import workflow_kpis, kpi_cache
@@ -0,0 +1,147 @@
+"""Metrics recorded by the API, workers and LLM client
+
+All metrics live in the process-wide ``REGISTRY``. SQL statements are timed
+by engine event listeners; the HTTP middleware opens a per-request tally in
+a context variable so statements are also attributed to the request (and
+route) that issued them. The SQL profiler (``app.db.profiler``) observes the
+same listener rather than timing statements a second time.
+"""
+from collections import Counter
+from contextvars import ContextVar
+from typing import Any, Callable, List, Optional
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.metrics.registry import Registry
+
+REGISTRY = Registry()
+
+# Statement-count buckets for a single request
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+
+# Upload-size buckets in bytes, 1 KiB to 10 MiB
+SIZE_BUCKETS = (1024, 16 * 1024, 128 * 1024, 512 * 1024, 1024 ** 2, 5 * 1024 ** 2, 10 * 1024 ** 2)
+
+# HTTP
+HTTP_REQUESTS_IN_FLIGHT = REGISTRY.gauge(
+    "http_requests_in_flight", "Requests currently being handled"
+)
+HTTP_REQUEST_DURATION = REGISTRY.histogram(
+    "http_request_duration_seconds", "Request latency by route template", ("method", "route", "status")
+)
+HTTP_REQUEST_DB_STATEMENTS = REGISTRY.histogram(
+    "http_request_db_statements", "SQL statements executed per request", ("method", "route"), STATEMENT_BUCKETS
+)
+HTTP_REQUEST_DB_SECONDS = REGISTRY.histogram(
+    "http_request_db_seconds", "Time spent in SQL statements per request", ("method", "route")
+)
+
+# Database
+DB_STATEMENTS = REGISTRY.counter(
+    "db_statements_total", "SQL statements executed", ("engine",)
+)
+DB_STATEMENT_DURATION = REGISTRY.histogram(
+    "db_statement_duration_seconds", "SQL statement latency", ("engine",)
+)
+
+# LLM
+LLM_REQUEST_DURATION = REGISTRY.histogram(
+    "llm_request_duration_seconds", "Chat completion latency per attempt", ("model", "outcome")
+)
+LLM_TOKENS = REGISTRY.counter(
+    "llm_tokens_total", "Tokens reported by the completion API", ("model", "kind")
+)
+LLM_RETRIES = REGISTRY.counter(
+    "llm_retries_total", "Completion attempts retried after a transient error", ("model",)
+)
+PROMPT_DOCUMENT_TOKENS = REGISTRY.counter(
+    "prompt_document_tokens_total", "Uploaded-document tokens sent in prompts or left out by the budget", ("kind",)
+)
+
+# Uploads
+UPLOADS = REGISTRY.counter(
+    "uploads_total", "Files uploaded", ("deduplicated",)
+)
+UPLOAD_BYTES = REGISTRY.counter(
+    "upload_bytes_total", "Bytes received in uploads", ("deduplicated",)
+)
+UPLOAD_SIZE = REGISTRY.histogram(
+    "upload_size_bytes", "Size of uploaded files", (), SIZE_BUCKETS
+)
+
+class RequestTally:
+    """SQL statements and seconds attributed to the current request (or profiled block)
+
+    ``shapes`` counts statements by shape for the SQL profiler; it is None
+    unless profiling is on.
+    """
+    __slots__ = ("statements", "seconds", "label", "shapes")
+
+    def __init__(self, label: str = "", shapes: bool = False):
+        self.statements = 0
+        self.seconds = 0.0
+        self.label = label
+        self.shapes: Optional[Counter] = Counter() if shapes else None
+
+# Set by the HTTP middleware for the duration of a request
+current_tally: ContextVar[Optional[RequestTally]] = ContextVar("metrics_request_tally", default=None)
+
+# Called as observer(tally, statement, parameters, seconds) after every timed statement
+StatementObserver = Callable[[Optional[RequestTally], str, Any, float], None]
+_statement_observers: List[StatementObserver] = []
+
+def add_statement_observer(observer: StatementObserver) -> None:
+    if observer not in _statement_observers:
+        _statement_observers.append(observer)
+
+def remove_statement_observer(observer: StatementObserver) -> None:
+    if observer in _statement_observers:
+        _statement_observers.remove(observer)
+
+def instrument_engine(engine: Engine, name: str) -> None:
+    """Time every statement run through ``engine`` (pass ``async_engine.sync_engine`` for async engines)"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _stop(conn, cursor, statement, parameters, context, executemany):
+        started: List[float] = conn.info.get("metrics_start")
+        if not started:
+            return
+        elapsed = time.perf_counter() - started.pop()
+        DB_STATEMENTS.inc(engine=name)
+        DB_STATEMENT_DURATION.observe(elapsed, engine=name)
+        tally = current_tally.get()
+        if tally is not None:
+            tally.statements += 1
+            tally.seconds += elapsed
+        for observer in _statement_observers:
+            observer(tally, statement, parameters, elapsed)
+
+    @event.listens_for(engine, "handle_error")
+    def _failed(exception_context):
+        # after_cursor_execute is skipped for failed statements
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("metrics_start"):
+            conn.info["metrics_start"].pop()
+
+def record_llm_attempt(model: str, seconds: float, outcome: str, usage=None) -> None:
+    """Record one completion attempt and the tokens it used"""
+    LLM_REQUEST_DURATION.observe(seconds, model=model, outcome=outcome)
+    if usage is not None:
+        LLM_TOKENS.inc(getattr(usage, "prompt_tokens", 0) or 0, model=model, kind="prompt")
+        LLM_TOKENS.inc(getattr(usage, "completion_tokens", 0) or 0, model=model, kind="completion")
+
+def record_prompt_documents(sent: int, saved: int) -> None:
+    PROMPT_DOCUMENT_TOKENS.inc(sent, kind="sent")
+    PROMPT_DOCUMENT_TOKENS.inc(saved, kind="saved")
+
+def record_upload(size: int, deduplicated: bool) -> None:
+    label = "true" if deduplicated else "false"
+    UPLOADS.inc(deduplicated=label)
+    UPLOAD_BYTES.inc(size, deduplicated=label)
+    UPLOAD_SIZE.observe(size)
@@ -0,0 +1,182 @@
+"""Workflow KPIs declared under ``monitoring`` in mcp-flow.yaml
+
+``query_volume``, ``response_time`` and ``ai_suggestion_approval_rate`` are
+computed from the database when metrics are scraped, together with the
+alert conditions declared next to them. A scrape reruns the queries at most
+once per ``KPI_CACHE_SECONDS``, so frequent scrapers don't load the database.
+"""
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+import asyncio
+import os
+import time
+
+from sqlalchemy import and_, func
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.jobs.queue import _percentile
+from app.metrics.instruments import REGISTRY
+from app.models import AISuggestion, JobStatus, Query, QueryStatus, Review, SuggestionJob
+
+# Seconds a computed set of KPIs is reused between scrapes
+KPI_CACHE_SECONDS = float(os.getenv("KPI_CACHE_SECONDS", "15"))
+
+# Hours of reviews that response time and approval rate are computed over
+KPI_WINDOW_HOURS = float(os.getenv("KPI_WINDOW_HOURS", "168"))
+
+# Most recent reviews sampled for response-time percentiles
+KPI_SAMPLE_SIZE = int(os.getenv("KPI_SAMPLE_SIZE", "1000"))
+
+# Alert thresholds from mcp-flow.yaml
+ALERT_QUERY_VOLUME_PER_HOUR = float(os.getenv("ALERT_QUERY_VOLUME_PER_HOUR", "100"))
+ALERT_RESPONSE_TIME_HOURS = float(os.getenv("ALERT_RESPONSE_TIME_HOURS", "24"))
+ALERT_MIN_APPROVAL_RATE = float(os.getenv("ALERT_MIN_APPROVAL_RATE", "0.7"))
+
+# Queries still waiting for a doctor
+OPEN_STATUSES = (QueryStatus.PENDING, QueryStatus.PROCESSING, QueryStatus.AWAITING_REVIEW)
+
+QUERY_VOLUME = REGISTRY.gauge(
+    "workflow_query_volume", "Patient queries submitted in the trailing window", ("window",)
+)
+RESPONSE_TIME = REGISTRY.gauge(
+    "workflow_response_time_seconds", "Time from query submission to doctor review", ("stat",)
+)
+OLDEST_OPEN_QUERY = REGISTRY.gauge(
+    "workflow_oldest_open_query_age_seconds", "Age of the oldest query not yet reviewed"
+)
+OPEN_QUERIES = REGISTRY.gauge(
+    "workflow_open_queries", "Queries not yet reviewed, by status", ("status",)
+)
+APPROVAL_RATE = REGISTRY.gauge(
+    "workflow_ai_suggestion_approval_rate", "Share of reviewed AI suggestions approved without modification"
+)
+SUGGESTION_JOBS = REGISTRY.gauge(
+    "workflow_suggestion_jobs", "Suggestion jobs by status", ("status",)
+)
+ALERTS = REGISTRY.gauge(
+    "workflow_alert", "1 while an mcp-flow.yaml alert condition holds", ("alert",)
+)
+
+def workflow_kpis(
+    session: Session,
+    window_hours: float = KPI_WINDOW_HOURS,
+    sample_size: int = KPI_SAMPLE_SIZE,
+) -> Dict[str, Any]:
+    """Query volume, response time and approval rate, plus the alert states"""
+    now = datetime.utcnow()
+    since = now - timedelta(hours=window_hours)
+
+    volume_1h, volume_24h = session.exec(
+        select(
+            func.count(Query.id).filter(Query.created_at >= now - timedelta(hours=1)),
+            func.count(Query.id),
+        ).where(Query.created_at >= now - timedelta(hours=24))
+    ).one()
+
+    reviewed = session.exec(
+        select(Review.created_at, Query.created_at)
+        .join(Query, Query.id == Review.query_id)
+        .where(Review.created_at >= since)
+        .order_by(Review.created_at.desc())
+        .limit(sample_size)
+    ).all()
+    response_times = [(reviewed_at - created_at).total_seconds() for reviewed_at, created_at in reviewed]
+
+    open_counts = {s.value: 0 for s in OPEN_STATUSES}
+    for query_status, count in session.exec(
+        select(Query.status, func.count()).where(Query.status.in_(OPEN_STATUSES)).group_by(Query.status)
+    ).all():
+        open_counts[query_status.value] = count
+    oldest_open = session.exec(
+        select(func.min(Query.created_at)).where(Query.status.in_(OPEN_STATUSES))
+    ).one()
+
+    # Unmodified: the doctor sent the AI text as it was
+    judged, approved = session.exec(
+        select(
+            func.count(Review.id),
+            func.count(Review.id).filter(and_(Review.approved, Review.content == AISuggestion.content)),
+        )
+        .join(AISuggestion, AISuggestion.query_id == Review.query_id)
+        .where(Review.created_at >= since)
+    ).one()
+
+    jobs = {s.value: 0 for s in JobStatus}
+    for job_status, count in session.exec(
+        select(SuggestionJob.status, func.count()).group_by(SuggestionJob.status)
+    ).all():
+        jobs[job_status.value] = count
+
+    kpis = {
+        "query_volume_1h": volume_1h,
+        "query_volume_24h": volume_24h,
+        "response_time_seconds_p50": _percentile(response_times, 0.5),
+        "response_time_seconds_p95": _percentile(response_times, 0.95),
+        "response_time_seconds_avg": sum(response_times) / len(response_times) if response_times else None,
+        "oldest_open_query_age_seconds": (now - oldest_open).total_seconds() if oldest_open else None,
+        "open_queries": open_counts,
+        "ai_suggestion_approval_rate": approved / judged if judged else None,
+        "suggestion_jobs": jobs,
+    }
+    # A query nobody has answered yet is as late as a slow review
+    slowest = max(kpis["response_time_seconds_p95"] or 0, kpis["oldest_open_query_age_seconds"] or 0)
+    kpis["alerts"] = {
+        "high_query_volume": volume_1h > ALERT_QUERY_VOLUME_PER_HOUR,
+        "slow_response_time": slowest > ALERT_RESPONSE_TIME_HOURS * 3600,
+        "low_approval_rate": kpis["ai_suggestion_approval_rate"] is not None
+        and kpis["ai_suggestion_approval_rate"] < ALERT_MIN_APPROVAL_RATE,
+    }
+    return kpis
+
+def _set(gauge, values: Dict[str, Optional[float]]) -> None:
+    """Replace a gauge's series (label -> value; "" for an unlabelled gauge); unknown (None) values are left out"""
+    series = {((label,) if label else ()): value for label, value in values.items() if value is not None}
+    gauge.set_function(lambda: series)
+
+def publish_kpis(kpis: Dict[str, Any]) -> None:
+    """Copy computed KPIs onto the workflow gauges"""
+    _set(QUERY_VOLUME, {"1h": kpis["query_volume_1h"], "24h": kpis["query_volume_24h"]})
+    _set(RESPONSE_TIME, {
+        "p50": kpis["response_time_seconds_p50"],
+        "p95": kpis["response_time_seconds_p95"],
+        "avg": kpis["response_time_seconds_avg"],
+    })
+    _set(OLDEST_OPEN_QUERY, {"": kpis["oldest_open_query_age_seconds"] or 0})
+    _set(OPEN_QUERIES, kpis["open_queries"])
+    _set(APPROVAL_RATE, {"": kpis["ai_suggestion_approval_rate"]})
+    _set(SUGGESTION_JOBS, kpis["suggestion_jobs"])
+    _set(ALERTS, {name: float(firing) for name, firing in kpis["alerts"].items()})
+
+class KPICache:
+    """Recompute KPIs at most once per ``ttl`` seconds
+
+    Scrapes arrive on the event loop, so concurrent ones are serialized with
+    an ``asyncio.Lock``: a thread lock held across the awaited database work
+    would block the loop for every other scrape.
+    """
+
+    def __init__(self, ttl: float = KPI_CACHE_SECONDS):
+        self.ttl = ttl
+        self._computed_at: Optional[float] = None
+        self._locks: Dict[asyncio.AbstractEventLoop, asyncio.Lock] = {}
+
+    def stale(self) -> bool:
+        return self._computed_at is None or time.monotonic() - self._computed_at >= self.ttl
+
+    def refresh(self, session: Session) -> None:
+        publish_kpis(workflow_kpis(session))
+        self._computed_at = time.monotonic()
+
+    async def refresh_async(self, session: AsyncSession) -> None:
+        """Recompute from an async session if stale; scrapes that waited reuse the result"""
+        # One lock per event loop (tests and benchmarks run several loops in a process)
+        lock = self._locks.setdefault(asyncio.get_running_loop(), asyncio.Lock())
+        async with lock:
+            if self.stale():
+                await session.run_sync(self.refresh)
+
+    def invalidate(self) -> None:
+        self._computed_at = None
+
+kpi_cache = KPICache()
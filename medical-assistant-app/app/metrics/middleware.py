@@ -0,0 +1,64 @@
+"""ASGI middleware recording latency, in-flight requests and SQL work per route
+
+Requests are labelled by route template (``/api/query/{query_id}``) rather
+than the raw path, so the number of series stays bounded; requests that
+match no route share the ``unmatched`` label.
+
+With SQL profiling on (``app.db.profiler``) the same per-request tally also
+counts statement shapes, and the request is reported to the profiler; in
+``dev`` mode the counts are added to the response headers.
+"""
+import time
+
+from app.db import profiler as sql_profiler
+
+from app.metrics.instruments import (
+    HTTP_REQUEST_DB_SECONDS,
+    HTTP_REQUEST_DB_STATEMENTS,
+    HTTP_REQUEST_DURATION,
+    HTTP_REQUESTS_IN_FLIGHT,
+    RequestTally,
+    current_tally,
+)
+
+UNMATCHED_ROUTE = "unmatched"
+
+class MetricsMiddleware:
+    """Pure ASGI middleware, so streaming responses are not buffered"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        tally = RequestTally(f"{scope['method']} {scope['path']}", shapes=sql_profiler.profiler.enabled)
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if sql_profiler.profiler.mode == "dev":
+                    message = {**message, "headers": [*message.get("headers", []), *sql_profiler.profile_headers(tally)]}
+            await send(message)
+
+        token = current_tally.set(tally)
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            current_tally.reset(token)
+            # The router stores the matched route on the shared scope
+            route = getattr(scope.get("route"), "path", UNMATCHED_ROUTE)
+            method = scope["method"]
+            HTTP_REQUEST_DURATION.observe(elapsed, method=method, route=route, status=str(status_code))
+            HTTP_REQUEST_DB_STATEMENTS.observe(tally.statements, method=method, route=route)
+            HTTP_REQUEST_DB_SECONDS.observe(tally.seconds, method=method, route=route)
+            if tally.shapes is not None:
+                sql_profiler.finish_request(f"{method} {route}", tally)
@@ -1,12 +1,16 @@
 # Models package initialization
 from app.models.models import (
     Patient,
+    PatientContext,
     Doctor,
     Query,
     QueryStatus,
     QueryPriority,
     File,
+    Blob,
     AISuggestion,
     Review,
+    JobStatus,
+    SuggestionJob,
     TimestampModel
 )
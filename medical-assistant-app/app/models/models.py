@@ -1,4 +1,7 @@
 from sqlmodel import SQLModel, Field, Relationship 
+from sqlalchemy import Column, Index, Text, event, func, select, text
+from sqlalchemy.orm import column_property, deferred
+from sqlalchemy.orm.attributes import PASSIVE_NO_INITIALIZE, get_history
 from typing import Optional, List
 from datetime import datetime
 import enum
@@ -19,6 +22,13 @@ class QueryPriority(str, enum.Enum):
     HIGH = "high"
     URGENT = "urgent"
 
+# Enum for background job status
+class JobStatus(str, enum.Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    DEAD = "dead"
+
 # Base model for common fields
 class TimestampModel(SQLModel):
     created_at: datetime = Field(default_factory=datetime.utcnow)
@@ -50,12 +60,23 @@ class Doctor(SQLModel, table=True):
 
 # Query model for patient questions
 class Query(TimestampModel, table=True):
+    # Indexes backing the doctor review queue, list filters and patient history.
+    # Existing databases pick up additions through app.db.migrations.
+    __table_args__ = (
+        Index("ix_query_status_created_at", "status", "created_at"),
+        Index("ix_query_patient_id_created_at", "patient_id", "created_at"),
+        Index("ix_query_safety_score", "safety_score"),
+        Index("ix_query_review_queue", "status", "priority", text("safety_score DESC"), "created_at"),
+    )
     id: Optional[int] = Field(default=None, primary_key=True)
     patient_id: int = Field(foreign_key="patient.id")
     content: str
     status: QueryStatus = Field(default=QueryStatus.PENDING)
     priority: QueryPriority = Field(default=QueryPriority.MEDIUM)
     safety_score: Optional[float] = Field(default=None)
+    # Doctor currently working on the query in the review queue
+    claimed_by: Optional[int] = Field(default=None, foreign_key="doctor.id")
+    claimed_at: Optional[datetime] = Field(default=None)
     
     # Relationships
     patient: Patient = Relationship(back_populates="queries")
@@ -63,19 +84,57 @@ class Query(TimestampModel, table=True):
     ai_suggestion: Optional["AISuggestion"] = Relationship(back_populates="query")
     review: Optional["Review"] = Relationship(back_populates="query")
 
+# Stored upload content, shared by every File with the same SHA-256
+class Blob(TimestampModel, table=True):
+    sha256: str = Field(primary_key=True)
+    path: str
+    size: int
+    ref_count: int = Field(default=0)
+    # Extraction result cached per digest so duplicates are never parsed again
+    text_content: Optional[str] = None
+    extraction_backend: Optional[str] = None
+
+# Legacy copy of the extracted text, only kept for rows stored without a digest;
+# everything else reads it from the blob through File.extracted_text
+_file_text_column = Column("text_content", Text, nullable=True)
+
 # File model for uploaded documents
 class File(TimestampModel, table=True):
+    __mapper_args__ = {"properties": {"text_content": deferred(_file_text_column)}}
     id: Optional[int] = Field(default=None, primary_key=True)
-    query_id: int = Field(foreign_key="query.id")
+    # Indexed so purges can delete a chunk's files without scanning the table
+    query_id: int = Field(foreign_key="query.id", index=True)
     filename: str
     file_path: str
     file_type: str
     file_size: int
-    text_content: Optional[str] = None
+    sha256: Optional[str] = Field(default=None, foreign_key="blob.sha256", index=True)
+    text_content: Optional[str] = Field(default=None, sa_column=_file_text_column)
+    # Characters of extracted text: set from the blob on upload and re-extraction,
+    # and by _set_file_text_length for legacy rows
+    text_length: Optional[int] = None
     
     # Relationships
     query: Query = Relationship(back_populates="files")
 
+# Extracted text can run to megabytes, so it is deferred: listings load only
+# text_length, and the text itself is read on access or through the text endpoint
+File.extracted_text = column_property(
+    func.coalesce(
+        select(Blob.text_content).where(Blob.sha256 == File.__table__.c.sha256).correlate_except(Blob).scalar_subquery(),
+        _file_text_column,
+    ),
+    deferred=True,
+)
+
+@event.listens_for(File, "before_insert")
+@event.listens_for(File, "before_update")
+def _set_file_text_length(mapper, connection, target):
+    # Only for legacy rows whose text was written in this flush; an unloaded
+    # deferred text is left alone
+    if target.sha256 is None and get_history(target, "text_content", PASSIVE_NO_INITIALIZE).has_changes():
+        target.text_length = None if target.text_content is None else len(target.text_content)
+
 # AI Suggestion model
 class AISuggestion(TimestampModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
@@ -99,3 +158,26 @@ class Review(TimestampModel, table=True):
     # Relationships
     query: Query = Relationship(back_populates="review")
     doctor: Doctor = Relationship(back_populates="reviews")
+
+# Background job that generates the AI suggestion for a query
+class SuggestionJob(TimestampModel, table=True):
+    __table_args__ = (
+        Index("ix_suggestionjob_status_run_after", "status", "run_after"),
+    )
+    id: Optional[int] = Field(default=None, primary_key=True)
+    query_id: int = Field(foreign_key="query.id", index=True)
+    status: JobStatus = Field(default=JobStatus.QUEUED)
+    attempts: int = Field(default=0)
+    max_attempts: int = Field(default=3)
+    run_after: datetime = Field(default_factory=datetime.utcnow)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    last_error: Optional[str] = None
+
+# Compact per-patient summary included in suggestion prompts, kept current as
+# reviews and files arrive (see app.llm.patient_context)
+class PatientContext(SQLModel, table=True):
+    patient_id: int = Field(foreign_key="patient.id", primary_key=True)
+    snapshot: str
+    version: int = Field(default=1)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
@@ -0,0 +1,78 @@
+from fastapi import APIRouter, Depends
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import Any, Dict, List, Optional
+
+# Import models and schemas
+from app.db.database import get_async_session, SQLITE_PRAGMAS
+from app.db.engine_profile import DB_ENGINE_PROFILE, describe_engine
+from app.db.profiler import SQL_PROFILE, profiler
+
+# Import Pydantic models for request/response
+from pydantic import BaseModel
+
+# Define response models
+class EngineInfo(BaseModel):
+    url: str
+    dialect: str
+    driver: str
+    pool_class: str
+    pool_status: str
+    pool_size: Optional[int] = None
+    checked_out: Optional[int] = None
+    pragmas: Optional[Dict[str, Any]] = None
+    server_version: Optional[str] = None
+
+class RouteStatements(BaseModel):
+    route: str
+    requests: int
+    statements: int
+    seconds: float
+    max_statements: int
+    avg_statements: float
+
+class RepeatedStatement(BaseModel):
+    route: str
+    statement: str
+    requests: int
+    max_repeats: int
+
+class SlowStatement(BaseModel):
+    route: str
+    statement: str
+    parameters: str
+    ms: float
+    at: float
+
+class SQLProfileReport(BaseModel):
+    mode: str
+    routes: List[RouteStatements]
+    n_plus_one: List[RepeatedStatement]
+    slow_statements: List[SlowStatement]
+
+class DatabaseDiagnostics(BaseModel):
+    profile: str
+    configured_pragmas: Optional[Dict[str, Any]] = None
+    engine: EngineInfo
+
+# Create router
+router = APIRouter()
+
+# Settings of the engine serving API requests, with the pragmas in effect on its connections
+@router.get("/database", response_model=DatabaseDiagnostics)
+async def get_database_diagnostics(session: AsyncSession = Depends(get_async_session)):
+    connection = await session.connection()
+    info = await connection.run_sync(lambda sync_connection: describe_engine(sync_connection.engine, sync_connection))
+
+    return DatabaseDiagnostics(
+        profile=DB_ENGINE_PROFILE,
+        configured_pragmas=SQLITE_PRAGMAS._asdict() if SQLITE_PRAGMAS else None,
+        engine=EngineInfo(**info)
+    )
+
+# Statement counts per route, N+1 shapes and slow statements seen since startup (SQL_PROFILE=dev or prod)
+@router.get("/sql", response_model=SQLProfileReport)
+async def get_sql_profile(reset: bool = False):
+    report = SQLProfileReport(mode=SQL_PROFILE, **profiler.report())
+    if reset:
+        profiler.reset()
+    return report
@@ -0,0 +1,48 @@
+from fastapi import APIRouter, Header, Query as QueryParam
+from fastapi.responses import StreamingResponse
+from typing import AsyncIterator, List, Optional
+import os
+
+from app.events.broadcaster import EventBroadcaster, SlowSubscriber, get_broadcaster
+
+# Create router
+router = APIRouter()
+
+# Seconds without events before a keep-alive comment is sent (keeps proxies from closing the stream)
+EVENT_KEEPALIVE_SECONDS = float(os.getenv("EVENT_KEEPALIVE_SECONDS", "15"))
+
+# Milliseconds browsers wait before reconnecting a dropped stream
+EVENT_RETRY_MS = 3000
+
+async def event_stream(
+    broadcaster: EventBroadcaster,
+    last_event_id: Optional[str] = None,
+    types: Optional[List[str]] = None,
+    keepalive: float = EVENT_KEEPALIVE_SECONDS,
+    **filters,
+) -> AsyncIterator[str]:
+    """Encode a subscription as server-sent events"""
+    yield f"retry: {EVENT_RETRY_MS}\n\n"
+    try:
+        async for event in broadcaster.subscribe(last_event_id, types, idle_timeout=keepalive, **filters):
+            yield ": keep-alive\n\n" if event is None else event.to_sse()
+    except SlowSubscriber:
+        # End the stream; the client reconnects with its last event id and catches up from history
+        return
+
+# Stream query state changes (created, triaged, status changed, reviewed) as server-sent events
+@router.get("/")
+async def stream_events(
+    types: Optional[List[str]] = QueryParam(None),
+    patient_id: Optional[int] = None,
+    query_id: Optional[int] = None,
+    last_event_id: Optional[str] = QueryParam(None, description="Resume token; the Last-Event-ID header also works"),
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID"),
+):
+    filters = {key: value for key, value in (("patient_id", patient_id), ("query_id", query_id)) if value is not None}
+    return StreamingResponse(
+        event_stream(get_broadcaster(), last_event_id_header or last_event_id, types, **filters),
+        media_type="text/event-stream",
+        # Proxies must pass events through as they are written
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
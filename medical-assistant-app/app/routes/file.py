@@ -1,17 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File as FastAPIFile
-from sqlmodel import Session, select
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status, UploadFile, File as FastAPIFile, Query as QueryParam
+from sqlalchemy import func
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from typing import List, Optional
 import os
-import shutil
 from datetime import datetime
-import uuid
-import PyPDF2
-import io
 
 # Import models and schemas
 from app.models import File, Query
-from app.db.database import get_session
-from app.utils.file_validation import validate_file
+from app.db.database import get_async_session
+from app.utils.file_validation import validate_file, MAX_FILE_SIZE
+from app.utils.uploads import UploadTooLarge
+from app.utils.text_extraction import PDF_BACKENDS, PAGE_BREAK
+from app.utils.blob_store import BlobStore, ingest_upload, release_blob
+from app.metrics.instruments import record_upload
+from app.llm.patient_context import patient_contexts, record_file
+from app.utils.conditional import etag_matches, list_etag, not_modified, set_etag
 
 # Import Pydantic models for request/response
 from pydantic import BaseModel
@@ -23,13 +27,24 @@ class FileResponse(BaseModel):
     filename: str
     file_type: str
     file_size: int
+    sha256: Optional[str] = None
     created_at: datetime
+    text_length: Optional[int] = None
     text_content: Optional[str] = None  # Add this field
 
 class FileList(BaseModel):
     files: List[FileResponse]
     total: int
 
+class FileTextResponse(BaseModel):
+    file_id: int
+    offset: int
+    text: str
+    total_length: int
+    has_more: bool
+    page: Optional[int] = None
+    total_pages: Optional[int] = None
+
 # Create router
 router = APIRouter()
 
@@ -37,27 +52,12 @@ router = APIRouter()
 UPLOAD_DIR = os.path.join(os.getcwd(), "data", "uploads")
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
-# Utility functions for text extraction
-def extract_text_from_pdf(content: bytes) -> str:
-    """Extract text from PDF bytes"""
-    try:
-        pdf_file = io.BytesIO(content)
-        pdf_reader = PyPDF2.PdfReader(pdf_file)
-        text = ""
-        for page in pdf_reader.pages:
-            text += page.extract_text() + "\n"
-        return text.strip()
-    except Exception as e:
-        print(f"Error extracting PDF text: {e}")
-        return ""
-
-def extract_text_from_txt(content: bytes) -> str:
-    """Extract text from TXT bytes"""
-    try:
-        return content.decode('utf-8')
-    except Exception as e:
-        print(f"Error extracting TXT text: {e}")
-        return ""
+# Content-addressed store for upload bytes
+blob_store = BlobStore(UPLOAD_DIR)
+
+# Characters returned by the text endpoint when no limit is given, and the most allowed
+DEFAULT_TEXT_LIMIT = 4000
+MAX_TEXT_LIMIT = 100_000
 
 def sanitize_filename(filename: str) -> str:
     """Sanitize filename for safe storage"""
@@ -71,56 +71,61 @@ def sanitize_filename(filename: str) -> str:
 async def upload_file(
     query_id: int,
     file: UploadFile = FastAPIFile(...),
-    session: Session = Depends(get_session)
+    backend: Optional[str] = None,
+    session: AsyncSession = Depends(get_async_session)
 ):
     # 1. Validate file
     validation = validate_file(file)
     if not validation["valid"]:
         raise HTTPException(status_code=400, detail=validation["message"])
+    if backend is not None and backend not in PDF_BACKENDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown PDF backend '{backend}'. Choose from: {', '.join(PDF_BACKENDS)}"
+        )
     
     # 2. Check query existence
-    query = session.get(Query, query_id)
+    query = await session.get(Query, query_id)
     if not query:
         raise HTTPException(status_code=404, detail=f"Query with ID {query_id} not found")
     
-    # 3. Read contents and extract text
-    contents = await file.read()
+    # 3. Stream the upload into the blob store; known content is neither stored nor parsed again
     ext = os.path.splitext(file.filename.lower())[1]
-    
-    extracted_text = ""
-    if ext == ".pdf":
-        extracted_text = extract_text_from_pdf(contents)
-    elif ext == ".txt":
-        extracted_text = extract_text_from_txt(contents)
+    try:
+        ingested = await ingest_upload(session, blob_store, file, ext, backend=backend, max_size=MAX_FILE_SIZE)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+    blob = ingested.blob
+    record_upload(ingested.size, ingested.deduplicated)
+    extracted_text = blob.text_content or ""
 
+    # 4. Log the extracted text
+    if ingested.deduplicated:
+        print(f"♻️ Reusing stored content {blob.sha256[:12]} for {file.filename}")
     print("🧠 Extracted text from uploaded file:")
     print(extracted_text[:500])  # Show first 500 chars
 
-    # 4. Save file to disk
-    unique_filename = f"{uuid.uuid4()}{ext}"
-    file_path = os.path.join(UPLOAD_DIR, unique_filename)
-
-    with open(file_path, "wb") as buffer:
-        buffer.write(contents)  # use the read content, not file.file
-
-    file_size = os.path.getsize(file_path)
-
     # 5. Store file metadata in DB
     db_file = File(
         query_id=query_id,
         filename=sanitize_filename(file.filename),
-        file_path=file_path,
+        file_path=blob.path,
         file_type=file.content_type,
-        file_size=file_size,
-        text_content=extracted_text  # 👈 Save the extracted text
+        file_size=ingested.size,
+        sha256=blob.sha256,
+        # The text itself stays on the blob
+        text_length=len(extracted_text)
     )
 
     session.add(db_file)
-    session.commit()
-    session.refresh(db_file)
+    context_update = await session.run_sync(record_file, query, extracted_text)
+    await session.commit()
+    await session.refresh(db_file)
+    if context_update:
+        patient_contexts.remember(query.patient_id, *context_update)
     
     print("🧾 Extracted Text Content to be returned:")
-    print(db_file.text_content[:500] if db_file.text_content else "No text content")
+    print(extracted_text[:500] if extracted_text else "No text content")
 
     return FileResponse(
         id=db_file.id,
@@ -128,27 +133,36 @@ async def upload_file(
         filename=db_file.filename,
         file_type=db_file.file_type,
         file_size=db_file.file_size,
+        sha256=db_file.sha256,
         created_at=db_file.created_at,
-        text_content=db_file.text_content  # Include text content in response
+        text_length=len(extracted_text),
+        text_content=extracted_text  # Include text content in response
     )
 
 # Get all files for a specific query
 @router.get("/{query_id}", response_model=FileList)
 async def get_files_for_query(
     query_id: int,
-    session: Session = Depends(get_session)
+    request: Request,
+    response: Response,
+    session: AsyncSession = Depends(get_async_session)
 ):
+    etag = await list_etag(session, request, ("query", "file"))
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    set_etag(response, etag)
+    
     # Check if query exists
-    query = session.get(Query, query_id)
+    query = await session.get(Query, query_id)
     if not query:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Query with ID {query_id} not found"
         )
     
-    # Get files for query
+    # Get files for query (metadata only; the text is served by /{file_id}/text)
     files_query = select(File).where(File.query_id == query_id)
-    files = session.exec(files_query).all()
+    files = (await session.exec(files_query)).all()
     
     # Convert to response model
     file_responses = [
@@ -158,33 +172,88 @@ async def get_files_for_query(
             filename=f.filename,
             file_type=f.file_type,
             file_size=f.file_size,
+            sha256=f.sha256,
             created_at=f.created_at,
-            text_content=f.text_content
+            text_length=f.text_length
         ) for f in files
     ]
     
     return FileList(files=file_responses, total=len(file_responses))
 
+# Get a slice of a file's extracted text, by character range or by page
+@router.get("/{file_id}/text", response_model=FileTextResponse)
+async def get_file_text(
+    file_id: int,
+    offset: int = QueryParam(0, ge=0),
+    limit: int = QueryParam(DEFAULT_TEXT_LIMIT, ge=1, le=MAX_TEXT_LIMIT),
+    page: Optional[int] = QueryParam(None, ge=1),
+    pages: int = QueryParam(1, ge=1),
+    session: AsyncSession = Depends(get_async_session)
+):
+    if page is None:
+        # Slice inside SQLite so only the requested characters are read into Python
+        row = (await session.exec(
+            select(func.substr(File.extracted_text, offset + 1, limit), File.text_length)
+            .where(File.id == file_id)
+        )).first()
+        if row is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"File with ID {file_id} not found"
+            )
+        text, total_length = row[0] or "", row[1] or 0
+        return FileTextResponse(
+            file_id=file_id,
+            offset=offset,
+            text=text,
+            total_length=total_length,
+            has_more=offset + len(text) < total_length
+        )
+    
+    # Page slicing needs the page breaks, so the whole text is read
+    full_text = (await session.exec(select(File.extracted_text).where(File.id == file_id))).first()
+    if full_text is None and await session.get(File, file_id) is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"File with ID {file_id} not found"
+        )
+    page_texts = (full_text or "").split(PAGE_BREAK)
+    start = page - 1
+    text = PAGE_BREAK.join(page_texts[start:start + pages])
+    return FileTextResponse(
+        file_id=file_id,
+        offset=sum(len(p) + len(PAGE_BREAK) for p in page_texts[:start]),
+        text=text,
+        total_length=len(full_text or ""),
+        has_more=start + pages < len(page_texts),
+        page=page,
+        total_pages=len(page_texts)
+    )
+
 # Delete a file
 @router.delete("/{file_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_file(
     file_id: int,
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session)
 ):
     # Get file from database
-    db_file = session.get(File, file_id)
+    db_file = await session.get(File, file_id)
     if not db_file:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"File with ID {file_id} not found"
         )
     
-    # Delete file from disk if it exists
-    if os.path.exists(db_file.file_path):
-        os.remove(db_file.file_path)
+    # Delete from database, dropping this file's reference to its content
+    if db_file.sha256:
+        orphaned_path = await session.run_sync(release_blob, db_file.sha256)
+    else:
+        orphaned_path = db_file.file_path
+    await session.delete(db_file)
+    await session.commit()
     
-    # Delete from database
-    session.delete(db_file)
-    session.commit()
+    # Delete the bytes once nothing references them
+    if orphaned_path:
+        blob_store.remove(orphaned_path)
     
     return None
@@ -0,0 +1,106 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import Dict, List, Optional
+from datetime import datetime
+
+# Import models and schemas
+from app.models import SuggestionJob, JobStatus
+from app.db.database import get_async_session
+from app.db.pagination import paginate, InvalidCursor
+from app.jobs.queue import queue_metrics, retry_dead_job
+from app.jobs.worker import notify_workers
+
+# Import Pydantic models for request/response
+from pydantic import BaseModel
+
+# Define response models
+class JobResponse(BaseModel):
+    id: int
+    query_id: int
+    status: str
+    attempts: int
+    max_attempts: int
+    run_after: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    last_error: Optional[str] = None
+    created_at: datetime
+
+class JobList(BaseModel):
+    jobs: List[JobResponse]
+    total: int
+    next_cursor: Optional[str] = None
+
+class JobMetrics(BaseModel):
+    depth: Dict[str, int]
+    oldest_queued_age_seconds: Optional[float] = None
+    wait_seconds_p50: Optional[float] = None
+    wait_seconds_p95: Optional[float] = None
+    run_seconds_p50: Optional[float] = None
+    run_seconds_p95: Optional[float] = None
+    sample_size: int
+
+# Create router
+router = APIRouter()
+
+def to_job_response(job: SuggestionJob) -> JobResponse:
+    return JobResponse(
+        id=job.id,
+        query_id=job.query_id,
+        status=job.status.value,
+        attempts=job.attempts,
+        max_attempts=job.max_attempts,
+        run_after=job.run_after,
+        started_at=job.started_at,
+        finished_at=job.finished_at,
+        last_error=job.last_error,
+        created_at=job.created_at
+    )
+
+# Queue depth and latency
+@router.get("/metrics", response_model=JobMetrics)
+async def get_job_metrics(session: AsyncSession = Depends(get_async_session)):
+    return JobMetrics(**await session.run_sync(queue_metrics))
+
+# List jobs, e.g. the dead-letter queue with ?status=dead
+@router.get("/", response_model=JobList)
+async def get_jobs(
+    status: Optional[JobStatus] = None,
+    query_id: Optional[int] = None,
+    skip: int = 0,
+    limit: int = 10,
+    cursor: Optional[str] = None,
+    session: AsyncSession = Depends(get_async_session)
+):
+    query = select(SuggestionJob)
+    if status:
+        query = query.where(SuggestionJob.status == status)
+    if query_id:
+        query = query.where(SuggestionJob.query_id == query_id)
+    
+    try:
+        page = await session.run_sync(paginate, query, SuggestionJob, skip=skip, limit=limit, cursor=cursor)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return JobList(jobs=[to_job_response(j) for j in page.items], total=page.total, next_cursor=page.next_cursor)
+
+# Requeue a dead-lettered job
+@router.post("/{job_id}/retry", response_model=JobResponse)
+async def retry_job(job_id: int, session: AsyncSession = Depends(get_async_session)):
+    job = await session.get(SuggestionJob, job_id)
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Job with ID {job_id} not found"
+        )
+    if job.status != JobStatus.DEAD:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Only dead jobs can be retried (current status: {job.status.value})"
+        )
+    
+    job = await session.run_sync(retry_dead_job, job)
+    notify_workers()
+    return to_job_response(job)
@@ -1,11 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlmodel import Session, select
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status, Query as QueryParam
+from sqlalchemy.orm import selectinload
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from typing import List, Optional
 from datetime import datetime
 
 # Import models and schemas
-from app.models import Query, QueryStatus, Patient, QueryPriority, AISuggestion
-from app.db.database import get_session
+from app.models import Query, QueryStatus, Patient, QueryPriority, File
+from app.db.database import get_async_session
+from app.db.pagination import paginate, InvalidCursor
+from app.utils.conditional import etag_matches, list_etag, not_modified, set_etag
+from app.events.broadcaster import QUERY_CREATED, QUERY_STATUS_CHANGED, publish_query_event
+from app.routes.file import FileResponse
+from app.routes.review import ReviewResponse
+from app.jobs.queue import enqueue_suggestion_job
+from app.jobs.worker import notify_workers
 
 # Import Pydantic models for request/response
 from pydantic import BaseModel
@@ -26,6 +35,26 @@ class QueryResponse(BaseModel):
 class QueryList(BaseModel):
     queries: List[QueryResponse]
     total: int
+    next_cursor: Optional[str] = None
+
+class AISuggestionResponse(BaseModel):
+    id: int
+    content: str
+    model_used: str
+    confidence_score: Optional[float] = None
+    created_at: datetime
+
+class QueryDetail(QueryResponse):
+    patient_id: int
+    safety_score: Optional[float] = None
+    files: List[FileResponse] = []
+    ai_suggestion: Optional[AISuggestionResponse] = None
+    review: Optional[ReviewResponse] = None
+
+class QueryDetailList(BaseModel):
+    queries: List[QueryDetail]
+    total: int
+    next_cursor: Optional[str] = None
 
 # Create router
 router = APIRouter()
@@ -51,59 +80,117 @@ def simple_triage(content: str) -> QueryPriority:
     
     return QueryPriority.LOW
 
-# Simple AI suggestion generator
-def generate_ai_suggestion(content: str) -> str:
-    """Generate a simple AI suggestion for demo purposes"""
-    content_lower = content.lower()
-    
-    if 'headache' in content_lower:
-        return "For headaches, consider: 1) Rest in a quiet, dark room 2) Stay hydrated 3) Apply cold/warm compress 4) Over-the-counter pain relievers if appropriate. Seek immediate care if severe or accompanied by fever, stiff neck, or vision changes."
-    
-    elif 'fever' in content_lower:
-        return "For fever management: 1) Stay hydrated 2) Rest 3) Monitor temperature regularly 4) Consider fever reducers if appropriate. Seek medical attention if fever is high (>101.3°F/38.5°C) or persists."
+def filter_queries(statement, status_value: Optional[str] = None, patient_id: Optional[int] = None):
+    """Apply the status/patient filters shared by the query list endpoints"""
+    if status_value:
+        # Convert string status to enum for proper comparison
+        try:
+            status_enum = QueryStatus(status_value)
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Invalid status: {status_value}. Valid statuses are: {[s.value for s in QueryStatus]}"
+            )
+        statement = statement.where(Query.status == status_enum)
     
-    elif 'cough' in content_lower:
-        return "For cough symptoms: 1) Stay hydrated 2) Use honey or throat lozenges 3) Humidify air 4) Avoid irritants. Consult healthcare provider if cough persists >2 weeks, produces blood, or accompanied by fever/difficulty breathing."
+    if patient_id:
+        statement = statement.where(Query.patient_id == patient_id)
     
-    else:
-        return "Based on your symptoms, I recommend monitoring your condition and consulting with a healthcare provider for proper evaluation and personalized medical advice. If symptoms worsen or you're concerned, seek medical attention promptly."
+    return statement
+
+def to_query_detail(query: Query, include_text: bool = False) -> QueryDetail:
+    """Build a detail response from a query whose relationships are already loaded"""
+    suggestion = query.ai_suggestion
+    review = query.review
+    return QueryDetail(
+        id=query.id,
+        patient_id=query.patient_id,
+        content=query.content,
+        status=query.status.value,
+        priority=query.priority.value,
+        safety_score=query.safety_score,
+        created_at=query.created_at,
+        updated_at=query.updated_at,
+        files=[
+            FileResponse(
+                id=f.id,
+                query_id=f.query_id,
+                filename=f.filename,
+                file_type=f.file_type,
+                file_size=f.file_size,
+                created_at=f.created_at,
+                text_length=f.text_length,
+                text_content=f.extracted_text if include_text else None
+            ) for f in query.files
+        ],
+        ai_suggestion=AISuggestionResponse(
+            id=suggestion.id,
+            content=suggestion.content,
+            model_used=suggestion.model_used,
+            confidence_score=suggestion.confidence_score,
+            created_at=suggestion.created_at
+        ) if suggestion else None,
+        review=ReviewResponse(
+            id=review.id,
+            query_id=review.query_id,
+            doctor_id=review.doctor_id,
+            content=review.content,
+            approved=review.approved,
+            notes=review.notes,
+            created_at=review.created_at,
+            updated_at=review.updated_at
+        ) if review else None
+    )
+
+# Eager-load everything a detail view shows: one SELECT per relationship,
+# however many queries are on the page
+DETAIL_LOAD_OPTIONS = (
+    selectinload(Query.files),
+    selectinload(Query.ai_suggestion),
+    selectinload(Query.review),
+)
+
+# Same, with the deferred file text loaded in the same round trip
+DETAIL_WITH_TEXT_LOAD_OPTIONS = (
+    selectinload(Query.files).undefer(File.extracted_text),
+    selectinload(Query.ai_suggestion),
+    selectinload(Query.review),
+)
+
+def detail_load_options(include_text: bool):
+    return DETAIL_WITH_TEXT_LOAD_OPTIONS if include_text else DETAIL_LOAD_OPTIONS
 
 # Create a new query
 @router.post("/", response_model=QueryResponse, status_code=status.HTTP_201_CREATED)
-async def create_query(query_data: QueryCreate, session: Session = Depends(get_session)):
+async def create_query(query_data: QueryCreate, session: AsyncSession = Depends(get_async_session)):
     # Check if patient exists
-    patient = session.exec(select(Patient).where(Patient.id == query_data.patient_id)).first()
+    patient = (await session.exec(select(Patient).where(Patient.id == query_data.patient_id))).first()
     if not patient:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Patient with ID {query_data.patient_id} not found"
         )
     
-    # Create new query with immediate triage
+    # Create new query with immediate triage; the AI suggestion is generated
+    # by the background job queue, which moves it on to awaiting review
     priority = simple_triage(query_data.content)
     
     query = Query(
         patient_id=query_data.patient_id,
         content=query_data.content,
-        status=QueryStatus.AWAITING_REVIEW,  # Skip PENDING, go straight to awaiting review
+        status=QueryStatus.PENDING,
         priority=priority
     )
     
     session.add(query)
-    session.commit()
-    session.refresh(query)
-    
-    # Create AI suggestion
-    ai_content = generate_ai_suggestion(query_data.content)
-    ai_suggestion = AISuggestion(
-        query_id=query.id,
-        content=ai_content,
-        model_used="demo_model",
-        confidence_score=0.75
-    )
+    await session.flush()
+    enqueue_suggestion_job(session, query.id)
+    await session.commit()
+    await session.refresh(query)
     
-    session.add(ai_suggestion)
-    session.commit()
+    # Wake an idle worker so the job starts right away
+    notify_workers()
+    publish_query_event(QUERY_CREATED, query)
     
     # Return the created query
     return QueryResponse(
@@ -118,40 +205,29 @@ async def create_query(query_data: QueryCreate, session: Session = Depends(get_s
 # Get all queries with pagination
 @router.get("/", response_model=QueryList)
 async def get_queries(
+    request: Request,
+    response: Response,
     skip: int = 0, 
     limit: int = 10, 
     status: Optional[str] = None,
     patient_id: Optional[int] = None,
-    session: Session = Depends(get_session)
+    cursor: Optional[str] = None,
+    session: AsyncSession = Depends(get_async_session)
 ):
-    # Build query
-    query = select(Query)
-    
-    # Apply filters if provided
-    if status:
-        # Convert string status to enum for proper comparison
-        try:
-            status_enum = QueryStatus(status)
-            query = query.where(Query.status == status_enum)
-        except ValueError:
-            # If invalid status provided, return empty result
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Invalid status: {status}. Valid statuses are: {[s.value for s in QueryStatus]}"
-            )
-    
-    if patient_id:
-        query = query.where(Query.patient_id == patient_id)
-    
-    # Get total count for pagination
-    total = session.exec(query).all()
-    total_count = len(total)
+    # Unchanged since the client's copy: answer 304 without running the listing
+    etag = await list_etag(session, request, ("query",))
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    set_etag(response, etag)
     
-    # Apply pagination
-    query = query.offset(skip).limit(limit)
+    # Build query with filters if provided
+    query = filter_queries(select(Query), status, patient_id)
     
-    # Execute query
-    results = session.exec(query).all()
+    # Count matches and fetch one page (keyset when a cursor is given)
+    try:
+        page = await session.run_sync(paginate, query, Query, skip=skip, limit=limit, cursor=cursor)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
     # Convert to response model
     queries = [
@@ -162,15 +238,70 @@ async def get_queries(
             priority=q.priority.value,
             created_at=q.created_at,
             updated_at=q.updated_at
-        ) for q in results
+        ) for q in page.items
     ]
     
-    return QueryList(queries=queries, total=total_count)
+    return QueryList(queries=queries, total=page.total, next_cursor=page.next_cursor)
+
+# Get queries together with their files, AI suggestion and review
+# Declared before /{query_id} so "details" is not parsed as an ID
+@router.get("/details", response_model=QueryDetailList)
+async def get_query_details(
+    request: Request,
+    response: Response,
+    skip: int = 0,
+    limit: int = 10,
+    status: Optional[str] = None,
+    patient_id: Optional[int] = None,
+    ids: Optional[List[int]] = QueryParam(None),
+    include_text: bool = False,
+    cursor: Optional[str] = None,
+    session: AsyncSession = Depends(get_async_session)
+):
+    etag = await list_etag(session, request, ("query", "file", "aisuggestion", "review"))
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    set_etag(response, etag)
+    
+    query = filter_queries(select(Query), status, patient_id)
+    if ids:
+        query = query.where(Query.id.in_(ids))
+    
+    try:
+        page = await session.run_sync(
+            paginate, query.options(*detail_load_options(include_text)), Query, skip=skip, limit=limit, cursor=cursor
+        )
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return QueryDetailList(
+        queries=[to_query_detail(q, include_text) for q in page.items],
+        total=page.total,
+        next_cursor=page.next_cursor
+    )
+
+# Get one query together with its files, AI suggestion and review
+@router.get("/{query_id}/details", response_model=QueryDetail)
+async def get_query_detail(
+    query_id: int,
+    include_text: bool = False,
+    session: AsyncSession = Depends(get_async_session)
+):
+    query = (await session.exec(
+        select(Query).where(Query.id == query_id).options(*detail_load_options(include_text))
+    )).first()
+    if not query:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Query with ID {query_id} not found"
+        )
+    
+    return to_query_detail(query, include_text)
 
 # Get a specific query by ID
 @router.get("/{query_id}", response_model=QueryResponse)
-async def get_query(query_id: int, session: Session = Depends(get_session)):
-    query = session.get(Query, query_id)
+async def get_query(query_id: int, session: AsyncSession = Depends(get_async_session)):
+    query = await session.get(Query, query_id)
     if not query:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -191,9 +322,9 @@ async def get_query(query_id: int, session: Session = Depends(get_session)):
 async def update_query_status(
     query_id: int, 
     new_status: QueryStatus,
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session)
 ):
-    query = session.get(Query, query_id)
+    query = await session.get(Query, query_id)
     if not query:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -201,13 +332,15 @@ async def update_query_status(
         )
     
     # Update status and timestamp
+    previous_status = query.status
     query.status = new_status
     query.updated_at = datetime.utcnow()
     
     # Save changes
     session.add(query)
-    session.commit()
-    session.refresh(query)
+    await session.commit()
+    await session.refresh(query)
+    publish_query_event(QUERY_STATUS_CHANGED, query, previous_status=previous_status.value)
     
     return QueryResponse(
         id=query.id,
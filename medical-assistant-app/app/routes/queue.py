@@ -0,0 +1,112 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import List, Optional
+from datetime import datetime
+
+# Import models and schemas
+from app.models import Query, Doctor
+from app.db.database import get_async_session
+from app.utils.review_queue import next_queries, claim_next, claim_query, release_query
+
+# Import Pydantic models for request/response
+from pydantic import BaseModel
+
+# Define request and response models
+class QueueItem(BaseModel):
+    id: int
+    content: str
+    status: str
+    priority: str
+    safety_score: Optional[float] = None
+    created_at: datetime
+    claimed_by: Optional[int] = None
+    claimed_at: Optional[datetime] = None
+
+class QueueList(BaseModel):
+    queries: List[QueueItem]
+
+class ClaimRequest(BaseModel):
+    doctor_id: int
+    limit: int = 1
+
+class ClaimAction(BaseModel):
+    doctor_id: int
+
+# Create router
+router = APIRouter()
+
+def to_queue_item(query: Query) -> QueueItem:
+    return QueueItem(
+        id=query.id,
+        content=query.content,
+        status=query.status.value,
+        priority=query.priority.value,
+        safety_score=query.safety_score,
+        created_at=query.created_at,
+        claimed_by=query.claimed_by,
+        claimed_at=query.claimed_at
+    )
+
+async def get_doctor_or_404(session: AsyncSession, doctor_id: int) -> Doctor:
+    doctor = await session.get(Doctor, doctor_id)
+    if not doctor:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Doctor with ID {doctor_id} not found"
+        )
+    return doctor
+
+# Peek at the next queries awaiting review, most pressing first
+@router.get("/", response_model=QueueList)
+async def get_review_queue(
+    limit: int = 10,
+    doctor_id: Optional[int] = None,
+    session: AsyncSession = Depends(get_async_session)
+):
+    queries = await session.run_sync(next_queries, limit=limit, doctor_id=doctor_id)
+    return QueueList(queries=[to_queue_item(q) for q in queries])
+
+# Claim the next N unclaimed queries for a doctor
+@router.post("/claim", response_model=QueueList)
+async def claim_next_queries(
+    claim: ClaimRequest,
+    session: AsyncSession = Depends(get_async_session)
+):
+    await get_doctor_or_404(session, claim.doctor_id)
+    queries = await session.run_sync(claim_next, claim.doctor_id, limit=claim.limit)
+    return QueueList(queries=[to_queue_item(q) for q in queries])
+
+# Claim a specific query
+@router.post("/{query_id}/claim", response_model=QueueItem)
+async def claim_specific_query(
+    query_id: int,
+    claim: ClaimAction,
+    session: AsyncSession = Depends(get_async_session)
+):
+    await get_doctor_or_404(session, claim.doctor_id)
+    if not await session.run_sync(claim_query, query_id, claim.doctor_id):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Query with ID {query_id} is not available to claim"
+        )
+
+    query = await session.get(Query, query_id)
+    await session.refresh(query)
+    return to_queue_item(query)
+
+# Release a claimed query back to the queue
+@router.post("/{query_id}/release", response_model=QueueItem)
+async def release_claimed_query(
+    query_id: int,
+    claim: ClaimAction,
+    session: AsyncSession = Depends(get_async_session)
+):
+    if not await session.run_sync(release_query, query_id, claim.doctor_id):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Query with ID {query_id} is not claimed by doctor {claim.doctor_id}"
+        )
+
+    query = await session.get(Query, query_id)
+    await session.refresh(query)
+    return to_queue_item(query)
@@ -1,11 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlmodel import Session, select
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from typing import List, Optional
 from datetime import datetime
 
 # Import models and schemas
 from app.models import Review, Query, Doctor, QueryStatus, AISuggestion
-from app.db.database import get_session
+from app.db.database import get_async_session
+from app.db.pagination import paginate, InvalidCursor
+from app.utils.conditional import etag_matches, list_etag, not_modified, set_etag
+from app.events.broadcaster import QUERY_REVIEWED, publish_query_event
+from app.utils.review_queue import held_by_other
+from app.llm.patient_context import patient_contexts, record_review
 
 # Import Pydantic models for request/response
 from pydantic import BaseModel
@@ -30,6 +36,7 @@ class ReviewResponse(BaseModel):
 class ReviewList(BaseModel):
     reviews: List[ReviewResponse]
     total: int
+    next_cursor: Optional[str] = None
 
 # Create router
 router = APIRouter()
@@ -39,9 +46,9 @@ router = APIRouter()
 async def create_review(
     query_id: int,
     review_data: ReviewCreate,
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session)
 ):
-    query = session.get(Query, query_id)
+    query = await session.get(Query, query_id)
     if not query:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -54,16 +61,22 @@ async def create_review(
             detail=f"Query with ID {query_id} is not awaiting review (current status: {query.status})"
         )
     
-    doctor = session.get(Doctor, review_data.doctor_id)
+    doctor = await session.get(Doctor, review_data.doctor_id)
     if not doctor:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Doctor with ID {review_data.doctor_id} not found"
         )
     
-    existing_review = session.exec(
+    if held_by_other(query, review_data.doctor_id):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Query with ID {query_id} is claimed by another doctor"
+        )
+    
+    existing_review = (await session.exec(
         select(Review).where(Review.query_id == query_id)
-    ).first()
+    )).first()
     if existing_review:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -83,8 +96,12 @@ async def create_review(
     
     session.add(review)
     session.add(query)
-    session.commit()
-    session.refresh(review)
+    context_update = await session.run_sync(record_review, query, review)
+    await session.commit()
+    await session.refresh(review)
+    if context_update:
+        patient_contexts.remember(query.patient_id, *context_update)
+    publish_query_event(QUERY_REVIEWED, query, review_id=review.id, doctor_id=review.doctor_id, approved=review.approved)
     
     return ReviewResponse(
         id=review.id,
@@ -100,12 +117,20 @@ async def create_review(
 # Get all reviews with pagination
 @router.get("/", response_model=ReviewList)
 async def get_reviews(
+    request: Request,
+    response: Response,
     skip: int = 0,
     limit: int = 10,
     doctor_id: Optional[int] = None,
     approved: Optional[bool] = None,
-    session: Session = Depends(get_session)
+    cursor: Optional[str] = None,
+    session: AsyncSession = Depends(get_async_session)
 ):
+    etag = await list_etag(session, request, ("review",))
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    set_etag(response, etag)
+    
     query = select(Review)
     
     if doctor_id:
@@ -113,11 +138,10 @@ async def get_reviews(
     if approved is not None:
         query = query.where(Review.approved == approved)
     
-    total = session.exec(query).all()
-    total_count = len(total)
-    
-    query = query.offset(skip).limit(limit)
-    results = session.exec(query).all()
+    try:
+        page = await session.run_sync(paginate, query, Review, skip=skip, limit=limit, cursor=cursor)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
     reviews = [
         ReviewResponse(
@@ -129,20 +153,20 @@ async def get_reviews(
             notes=r.notes,
             created_at=r.created_at,
             updated_at=r.updated_at
-        ) for r in results
+        ) for r in page.items
     ]
     
-    return ReviewList(reviews=reviews, total=total_count)
+    return ReviewList(reviews=reviews, total=page.total, next_cursor=page.next_cursor)
 
 # Get a specific review by query ID
 @router.get("/{query_id}", response_model=ReviewResponse)
 async def get_review_by_query(
     query_id: int,
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session)
 ):
-    review = session.exec(
+    review = (await session.exec(
         select(Review).where(Review.query_id == query_id)
-    ).first()
+    )).first()
     
     if not review:
         raise HTTPException(
@@ -0,0 +1,49 @@
+from fastapi import APIRouter, Depends, HTTPException, Query as QueryParam
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import List, Optional
+
+# Import models and schemas
+from app.db.database import get_async_session
+from app.db.search import SearchUnavailable, search
+
+# Import Pydantic models for request/response
+from pydantic import BaseModel
+
+# Define response models
+class SearchResult(BaseModel):
+    source: str
+    source_id: int
+    query_id: int
+    snippet: str
+    rank: float
+
+class SearchResponse(BaseModel):
+    results: List[SearchResult]
+    total: Optional[int]
+
+# Create router
+router = APIRouter()
+
+# Full-text search over query text, AI suggestions, reviews and extracted file text
+# (total is capped at SEARCH_TOTAL_CAP; include_total=false skips counting)
+@router.get("/", response_model=SearchResponse)
+async def search_records(
+    q: str = QueryParam(..., min_length=1),
+    sources: Optional[List[str]] = QueryParam(None),
+    skip: int = QueryParam(0, ge=0),
+    limit: int = QueryParam(20, ge=1, le=100),
+    include_total: bool = QueryParam(True),
+    session: AsyncSession = Depends(get_async_session)
+):
+    try:
+        connection = await session.connection()
+        hits, total = await connection.run_sync(search, q, sources=sources, skip=skip, limit=limit, with_total=include_total)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except SearchUnavailable as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    
+    return SearchResponse(
+        results=[SearchResult(**hit._asdict()) for hit in hits],
+        total=total
+    )
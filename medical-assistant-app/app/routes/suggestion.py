@@ -0,0 +1,72 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import Optional
+from datetime import datetime
+
+# Import models and schemas
+from app.models import Query
+from app.db.database import get_async_session
+from app.llm.cache import suggestion_cache
+from app.llm.suggestion import regenerate_suggestion
+
+# Import Pydantic models for request/response
+from pydantic import BaseModel
+
+# Define response models
+class SuggestionResponse(BaseModel):
+    id: int
+    query_id: int
+    content: str
+    model_used: str
+    confidence_score: Optional[float] = None
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+
+class CacheStats(BaseModel):
+    memory_hits: int
+    disk_hits: int
+    misses: int
+    bypasses: int
+    evictions: int
+    expirations: int
+    entries: int
+    max_entries: int
+    ttl_seconds: float
+    persistent: bool
+    hit_rate: Optional[float] = None
+
+# Create router
+router = APIRouter()
+
+# Suggestion cache counters
+@router.get("/cache/stats", response_model=CacheStats)
+async def get_cache_stats():
+    return CacheStats(**suggestion_cache.snapshot())
+
+# Drop every cached suggestion
+@router.delete("/cache", status_code=status.HTTP_204_NO_CONTENT)
+async def clear_cache():
+    suggestion_cache.clear()
+    return None
+
+# Regenerate a query's AI suggestion without using the cache
+@router.post("/{query_id}/regenerate", response_model=SuggestionResponse)
+async def regenerate_query_suggestion(query_id: int, session: AsyncSession = Depends(get_async_session)):
+    query = await session.get(Query, query_id)
+    if not query:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Query with ID {query_id} not found"
+        )
+    
+    suggestion = await regenerate_suggestion(query, session)
+    
+    return SuggestionResponse(
+        id=suggestion.id,
+        query_id=suggestion.query_id,
+        content=suggestion.content,
+        model_used=suggestion.model_used,
+        confidence_score=suggestion.confidence_score,
+        created_at=suggestion.created_at,
+        updated_at=suggestion.updated_at
+    )
@@ -1,12 +1,16 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlmodel import Session, select
-from typing import List
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import List, Optional
 from datetime import datetime
 
 # Import models and schemas
 from app.models import Query, QueryPriority, QueryStatus
-from app.db.database import get_session
+from app.db.database import get_async_session
+from app.db.pagination import paginate, InvalidCursor
 from app.utils.triage import calculate_priority, calculate_safety_score
+from app.utils.bulk_triage import retriage_queries, DEFAULT_CHUNK_SIZE
+from app.events.broadcaster import QUERY_TRIAGED, QUEUE_RETRIAGED, get_broadcaster, publish_query_event
 
 # Import Pydantic models for request/response
 from pydantic import BaseModel
@@ -21,14 +25,58 @@ class TriageResponse(BaseModel):
 class TriageList(BaseModel):
     queries: List[TriageResponse]
     total: int
+    next_cursor: Optional[str] = None
+
+class BatchTriageRequest(BaseModel):
+    status: Optional[QueryStatus] = None
+    created_after: Optional[datetime] = None
+    created_before: Optional[datetime] = None
+    min_id: Optional[int] = None
+    max_id: Optional[int] = None
+    chunk_size: int = DEFAULT_CHUNK_SIZE
+
+class BatchTriageResponse(BaseModel):
+    scanned: int
+    updated: int
+    chunks: int
+    elapsed_seconds: float
+    queries_per_second: float
 
 # Create router
 router = APIRouter()
 
+# Re-triage every query matching a filter in chunked bulk updates
+# Declared before /{query_id} so "batch" is not parsed as an ID
+@router.post("/batch", response_model=BatchTriageResponse)
+async def batch_triage_queries(
+    batch: BatchTriageRequest,
+    session: AsyncSession = Depends(get_async_session)
+):
+    if batch.chunk_size < 1:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="chunk_size must be at least 1"
+        )
+    
+    stats = await session.run_sync(
+        retriage_queries,
+        status=batch.status,
+        created_after=batch.created_after,
+        created_before=batch.created_before,
+        min_id=batch.min_id,
+        max_id=batch.max_id,
+        chunk_size=batch.chunk_size
+    )
+    
+    if stats["updated"]:
+        get_broadcaster().publish(QUEUE_RETRIAGED, {"updated": stats["updated"]})
+    
+    return BatchTriageResponse(**stats)
+
 # Triage a specific query
 @router.post("/{query_id}", response_model=TriageResponse)
-async def triage_query(query_id: int, session: Session = Depends(get_session)):
-    query = session.get(Query, query_id)
+async def triage_query(query_id: int, session: AsyncSession = Depends(get_async_session)):
+    query = await session.get(Query, query_id)
     if not query:
         raise HTTPException(status_code=404, detail="Query not found")
     
@@ -43,8 +91,9 @@ async def triage_query(query_id: int, session: Session = Depends(get_session)):
     query.updated_at = datetime.utcnow()
     
     session.add(query)
-    session.commit()
-    session.refresh(query)
+    await session.commit()
+    await session.refresh(query)
+    publish_query_event(QUERY_TRIAGED, query, safety_score=query.safety_score)
     
     return TriageResponse(
         query_id=query.id,
@@ -61,7 +110,8 @@ async def get_triaged_queries(
     max_safety_score: float = None,
     skip: int = 0,
     limit: int = 10,
-    session: Session = Depends(get_session)
+    cursor: Optional[str] = None,
+    session: AsyncSession = Depends(get_async_session)
 ):
     # Build query
     query = select(Query).where(Query.safety_score.is_not(None))
@@ -74,15 +124,11 @@ async def get_triaged_queries(
     if max_safety_score is not None:
         query = query.where(Query.safety_score <= max_safety_score)
     
-    # Get total count for pagination
-    total = session.exec(query).all()
-    total_count = len(total)
-    
-    # Apply pagination
-    query = query.offset(skip).limit(limit)
-    
-    # Execute query
-    results = session.exec(query).all()
+    # Count matches and fetch one page (keyset when a cursor is given)
+    try:
+        page = await session.run_sync(paginate, query, Query, skip=skip, limit=limit, cursor=cursor)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
     # Convert to response model
     triage_responses = [
@@ -91,20 +137,20 @@ async def get_triaged_queries(
             priority=q.priority.value,
             safety_score=q.safety_score,
             status=q.status.value
-        ) for q in results
+        ) for q in page.items
     ]
     
-    return TriageList(queries=triage_responses, total=total_count)
+    return TriageList(queries=triage_responses, total=page.total, next_cursor=page.next_cursor)
 
 # Update priority for a query
 @router.patch("/{query_id}/priority", response_model=TriageResponse)
 async def update_query_priority(
     query_id: int,
     priority: QueryPriority,
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session)
 ):
     # Get query from database
-    query = session.get(Query, query_id)
+    query = await session.get(Query, query_id)
     if not query:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -117,8 +163,9 @@ async def update_query_priority(
     
     # Save changes
     session.add(query)
-    session.commit()
-    session.refresh(query)
+    await session.commit()
+    await session.refresh(query)
+    publish_query_event(QUERY_TRIAGED, query, safety_score=query.safety_score)
     
     # Return updated triage info
     return TriageResponse(
@@ -1,31 +1,18 @@
 from app.db.database import engine
-from sqlmodel import Session, select
-from app.models import Query, QueryStatus, AISuggestion, File
+from app.db.profiler import profile_block
+from app.models import QueryStatus
+from app.routes.file import UPLOAD_DIR
+from app.utils.retention import count_matching, purge_queries
 
 def delete_awaiting_review():
-    with Session(engine) as session:
-        # Get queries awaiting review
-        queries = session.exec(
-            select(Query).where(Query.status == QueryStatus.AWAITING_REVIEW)
-        ).all()
-
-        count = len(queries)
+    # Chunked, set-based deletes; app.scripts.purge_queries offers filters and archiving
+    with profile_block("delete_awaiting_queries"):
+        count = count_matching(engine, status=[QueryStatus.AWAITING_REVIEW])
         print(f"🗑 Found {count} awaiting_review queries")
 
-        for query in queries:
-            # Delete related files
-            for file in query.files:
-                session.delete(file)
-
-            # Delete related AI suggestion
-            if query.ai_suggestion:
-                session.delete(query.ai_suggestion)
-
-            # Delete the query itself
-            session.delete(query)
-
-        session.commit()
-        print(f"✅ Deleted {count} queries + their files + AI suggestions")
+        stats = purge_queries(engine, UPLOAD_DIR, status=[QueryStatus.AWAITING_REVIEW])
+        print(f"✅ Deleted {stats['queries']} queries + {stats['files']} files + {stats['suggestions']} AI suggestions "
+              f"+ {stats['reviews']} reviews, removed {stats['blobs_removed']} upload blobs")
 
 if __name__ == "__main__":
     delete_awaiting_review()
@@ -0,0 +1,65 @@
+import argparse
+from datetime import datetime, timedelta
+
+from app.db.database import create_db_and_tables, engine
+from app.models import QueryStatus
+from app.routes.file import UPLOAD_DIR
+from app.utils.retention import DEFAULT_CHUNK_SIZE, FileArchive, TableArchive, count_matching, purge_queries
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive and delete old queries with their files, suggestions and reviews")
+    parser.add_argument("--status", action="append", choices=[s.value for s in QueryStatus],
+                        help="Only queries with this status (repeatable)")
+    parser.add_argument("--older-than-days", type=float, help="Only queries created more than this many days ago")
+    parser.add_argument("--created-before", type=datetime.fromisoformat, help="Only queries created before this ISO timestamp")
+    parser.add_argument("--all", action="store_true", help="Purge every query when no --status or age filter is given")
+    parser.add_argument("--archive-table", action="store_true", help="Copy each case into the query_archive table first")
+    parser.add_argument("--archive-file", metavar="PATH", help="Append each case to a gzipped NDJSON file first")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Queries deleted and committed per transaction")
+    parser.add_argument("--pause", type=float, default=0.0, help="Seconds to sleep between chunks, leaving the database to other writers")
+    parser.add_argument("--limit", type=int, help="Delete at most this many queries")
+    parser.add_argument("--dry-run", action="store_true", help="Only count the matching queries")
+    args = parser.parse_args()
+
+    if args.archive_table and args.archive_file:
+        parser.error("choose one of --archive-table and --archive-file")
+    older_than = args.created_before
+    if args.older_than_days is not None:
+        cutoff = datetime.utcnow() - timedelta(days=args.older_than_days)
+        older_than = min(cutoff, older_than) if older_than else cutoff
+    status = [QueryStatus(s) for s in args.status] if args.status else None
+    if not status and older_than is None and not args.all:
+        parser.error("give --status, --older-than-days or --created-before, or --all to purge every query")
+
+    # The file.query_id index keeps each chunk's deletes off a full table scan
+    create_db_and_tables()
+
+    matching = count_matching(engine, status=status, older_than=older_than)
+    print(f"🗑 Found {matching} matching queries")
+    if args.dry_run or not matching:
+        return
+
+    archive = TableArchive() if args.archive_table else FileArchive(args.archive_file) if args.archive_file else None
+    stats = purge_queries(
+        engine,
+        UPLOAD_DIR,
+        status=status,
+        older_than=older_than,
+        archive=archive,
+        chunk_size=args.chunk_size,
+        pause=args.pause,
+        limit=args.limit,
+        everything=args.all,
+    )
+
+    if archive is not None:
+        print(f"📦 Archived {stats['archived']} cases")
+    print(f"✅ Deleted {stats['queries']} queries, {stats['files']} files, {stats['suggestions']} AI suggestions, "
+          f"{stats['reviews']} reviews and {stats['jobs']} jobs in {stats['chunks']} chunks, "
+          f"{stats['elapsed_seconds']:.2f}s ({stats['queries_per_second']:.0f} queries/s)")
+    print(f"🧹 Removed {stats['blobs_removed']} upload blobs ({stats['bytes_freed'] / 1024 / 1024:.1f} MB)")
+    if stats["blobs_outside_upload_root"]:
+        print(f"⚠️  Left {stats['blobs_outside_upload_root']} files outside {UPLOAD_DIR} on disk")
+
+if __name__ == "__main__":
+    main()
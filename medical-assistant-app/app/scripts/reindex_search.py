@@ -0,0 +1,20 @@
+import argparse
+
+from app.db.database import engine
+from app.db.search import SEARCH_SOURCES, DEFAULT_CHUNK_SIZE, reindex
+
+def main():
+    parser = argparse.ArgumentParser(description="Bring the full-text search indexes up to date")
+    parser.add_argument("--source", action="append", choices=list(SEARCH_SOURCES), help="Only this source (repeatable)")
+    parser.add_argument("--rebuild", action="store_true", help="Empty and rebuild the indexes instead of catching up")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Rows indexed and committed per transaction")
+    args = parser.parse_args()
+
+    stats = reindex(engine, sources=args.source, rebuild=args.rebuild, chunk_size=args.chunk_size)
+
+    for name, counts in stats["sources"].items():
+        print(f"🔎 {name}: indexed {counts['indexed']}, removed {counts['removed']}")
+    print(f"✅ Search indexes up to date in {stats['elapsed_seconds']:.2f}s")
+
+if __name__ == "__main__":
+    main()
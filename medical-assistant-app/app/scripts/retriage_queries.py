@@ -0,0 +1,35 @@
+import argparse
+from datetime import datetime
+
+from app.db.database import engine
+from sqlmodel import Session
+from app.models import QueryStatus
+from app.utils.bulk_triage import retriage_queries, DEFAULT_CHUNK_SIZE
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-score queries with the current triage keyword lists")
+    parser.add_argument("--status", choices=[s.value for s in QueryStatus], help="Only queries with this status")
+    parser.add_argument("--created-after", type=datetime.fromisoformat, help="Only queries created at or after this ISO timestamp")
+    parser.add_argument("--created-before", type=datetime.fromisoformat, help="Only queries created before this ISO timestamp")
+    parser.add_argument("--min-id", type=int, help="Lowest query ID to include")
+    parser.add_argument("--max-id", type=int, help="Highest query ID to include")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Rows scored and committed per transaction")
+    args = parser.parse_args()
+
+    with Session(engine) as session:
+        stats = retriage_queries(
+            session,
+            status=QueryStatus(args.status) if args.status else None,
+            created_after=args.created_after,
+            created_before=args.created_before,
+            min_id=args.min_id,
+            max_id=args.max_id,
+            chunk_size=args.chunk_size
+        )
+
+    print(f"🩺 Scanned {stats['scanned']} queries in {stats['chunks']} chunks")
+    print(f"✅ Updated {stats['updated']} queries in {stats['elapsed_seconds']:.2f}s "
+          f"({stats['queries_per_second']:.0f} queries/s)")
+
+if __name__ == "__main__":
+    main()
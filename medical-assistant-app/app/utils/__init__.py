@@ -1,3 +1,3 @@
 # Utils package initialization
-from app.utils.triage import calculate_priority, calculate_safety_score, should_escalate
+from app.utils.triage import calculate_priority, calculate_safety_score, should_escalate, triage_text, TriageResult
 from app.utils.file_validation import validate_file, sanitize_filename
@@ -0,0 +1,175 @@
+"""Content-addressed storage for uploaded files
+
+Every upload is stored once, under its SHA-256, in a sharded directory tree
+(``ab/cd/abcd…``) so no single directory grows without bound. ``File`` rows
+reference the content through ``Blob``, whose ``ref_count`` tracks how many
+files share it; the bytes are deleted only when the last reference goes.
+The extracted text is kept on the blob only (``File.extracted_text`` reads
+it from there), so uploading a duplicate costs one hash pass and no
+parsing. An extraction that timed out or crashed is not kept (the blob has
+neither text nor backend), and the next upload of the same content tries
+again.
+"""
+from typing import NamedTuple, Optional
+import os
+
+from fastapi import UploadFile
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from app.models import Blob, File
+from app.utils.file_validation import MAX_FILE_SIZE
+from app.utils.text_extraction import ExtractionEngine, ExtractionResult, get_extraction_engine
+from app.utils.uploads import StoredUpload, discard, stream_upload
+
+# Directory levels and hex characters per level used to shard blobs
+BLOB_SHARD_LEVELS = 2
+BLOB_SHARD_WIDTH = 2
+
+class IngestedUpload(NamedTuple):
+    blob: Blob
+    size: int
+    deduplicated: bool
+
+class BlobStore:
+    """Sharded on-disk blob directory rooted at ``root``"""
+
+    def __init__(self, root: str, shard_levels: int = BLOB_SHARD_LEVELS, shard_width: int = BLOB_SHARD_WIDTH):
+        self.root = root
+        self.shard_levels = shard_levels
+        self.shard_width = shard_width
+        # Temp files live under the root so the final rename stays on one filesystem
+        self.tmp_dir = os.path.join(root, ".tmp")
+        os.makedirs(self.tmp_dir, exist_ok=True)
+
+    def path_for(self, digest: str) -> str:
+        shards = [digest[i * self.shard_width:(i + 1) * self.shard_width] for i in range(self.shard_levels)]
+        return os.path.join(self.root, *shards, digest)
+
+    async def receive(self, upload: UploadFile, max_size: int = MAX_FILE_SIZE) -> StoredUpload:
+        """Stream an upload into a temporary file, hashing it on the way"""
+        return await stream_upload(upload, self.tmp_dir, max_size=max_size)
+
+    def _place(self, stored: StoredUpload) -> str:
+        final_path = self.path_for(stored.sha256)
+        os.makedirs(os.path.dirname(final_path), exist_ok=True)
+        if os.path.exists(final_path):
+            # Same digest, same bytes: keep the copy already in place
+            discard(stored.path)
+        else:
+            os.replace(stored.path, final_path)
+        return final_path
+
+    async def place(self, stored: StoredUpload) -> str:
+        """Move a received upload to its content address and return the path"""
+        return await run_in_threadpool(self._place, stored)
+
+    def remove(self, path: str) -> None:
+        discard(path)
+
+def acquire_blob(session: Session, digest: str) -> None:
+    """Count one more reference to a blob (committed with the caller's transaction)"""
+    session.exec(
+        update(Blob)
+        .where(Blob.sha256 == digest)
+        .values(ref_count=Blob.ref_count + 1)
+        .execution_options(synchronize_session=False)
+    )
+
+def release_blob(session: Session, digest: str) -> Optional[str]:
+    """Drop one reference to a blob
+
+    When it was the last one the blob row is deleted and its path returned;
+    the caller removes the bytes after committing, so a rolled-back delete
+    never loses content.
+    """
+    session.exec(
+        update(Blob)
+        .where(Blob.sha256 == digest)
+        .values(ref_count=Blob.ref_count - 1)
+        .execution_options(synchronize_session=False)
+    )
+    blob = session.get(Blob, digest)
+    if blob is None:
+        return None
+    session.refresh(blob)
+    if blob.ref_count > 0:
+        return None
+    session.delete(blob)
+    return blob.path
+
+async def _extract(engine: Optional[ExtractionEngine], path: str, ext: str, backend: Optional[str], filename: str) -> ExtractionResult:
+    extraction = await (engine or get_extraction_engine()).extract(path, ext, backend=backend)
+    if extraction.failed:
+        print(f"⚠️ Could not extract text from {filename}; it will be retried on the next upload")
+    elif extraction.truncated:
+        print(f"⚠️ Extracted {extraction.pages} of {extraction.total_pages} pages from {filename}")
+    return extraction
+
+def _store_extraction(blob: Blob, extraction: ExtractionResult) -> None:
+    # A failed extraction leaves both unset, which marks the blob for another attempt
+    blob.text_content = None if extraction.failed else extraction.text
+    blob.extraction_backend = None if extraction.failed else extraction.backend
+
+async def ingest_upload(
+    session: AsyncSession,
+    store: BlobStore,
+    upload: UploadFile,
+    ext: str,
+    backend: Optional[str] = None,
+    max_size: int = MAX_FILE_SIZE,
+    engine: Optional[ExtractionEngine] = None,
+) -> IngestedUpload:
+    """Store an upload by content and return its blob with a reference taken
+
+    Raises ``UploadTooLarge`` if the upload exceeds ``max_size``. The new
+    reference is flushed but not committed; the caller commits it together
+    with the ``File`` row that holds it.
+    """
+    stored = await store.receive(upload, max_size=max_size)
+
+    blob = await session.get(Blob, stored.sha256)
+    if blob is not None and os.path.exists(blob.path):
+        discard(stored.path)
+        if blob.text_content is None and blob.extraction_backend is None:
+            # The earlier extraction of this content failed; try again
+            _store_extraction(blob, await _extract(engine, blob.path, ext, backend, upload.filename))
+            session.add(blob)
+            # Files already sharing the blob read its text, so their stored length follows it
+            await session.exec(
+                update(File)
+                .where(File.sha256 == blob.sha256)
+                .values(text_length=len(blob.text_content or ""))
+                .execution_options(synchronize_session=False)
+            )
+            await session.flush()
+        await session.run_sync(acquire_blob, blob.sha256)
+        await session.refresh(blob)
+        return IngestedUpload(blob, stored.size, True)
+
+    path = await store.place(stored)
+    extraction = await _extract(engine, path, ext, backend, upload.filename)
+
+    if blob is not None:
+        # The row survived but its bytes were lost; restore them in place
+        blob.path = path
+        _store_extraction(blob, extraction)
+        session.add(blob)
+        await session.flush()
+    else:
+        blob = Blob(sha256=stored.sha256, path=path, size=stored.size)
+        _store_extraction(blob, extraction)
+        session.add(blob)
+        try:
+            await session.flush()
+        except IntegrityError:
+            # A concurrent upload of the same content registered it first
+            await session.rollback()
+            blob = await session.get(Blob, stored.sha256)
+
+    await session.run_sync(acquire_blob, blob.sha256)
+    await session.refresh(blob)
+    return IngestedUpload(blob, stored.size, False)
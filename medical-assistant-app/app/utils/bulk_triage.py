@@ -0,0 +1,93 @@
+from datetime import datetime
+from typing import Any, Dict, Optional
+import time
+
+from sqlalchemy import update
+from sqlmodel import Session, select
+
+from app.models import Query, QueryStatus
+from app.utils.triage import triage_text
+
+# Number of queries scored and written per transaction
+DEFAULT_CHUNK_SIZE = 1000
+
+def retriage_queries(
+    session: Session,
+    status: Optional[QueryStatus] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    min_id: Optional[int] = None,
+    max_id: Optional[int] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Dict[str, Any]:
+    """Re-score every matching query with the current keyword lists
+
+    Queries are streamed in primary-key order, ``chunk_size`` rows at a time,
+    loading only ``id``, ``content``, ``priority`` and ``safety_score``. Rows
+    whose priority or safety score changed are written back with a single
+    bulk UPDATE, and each chunk is committed in its own transaction. Query
+    status is left untouched so reviewed cases keep their place in the workflow.
+
+    Returns counters and the throughput achieved.
+    """
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be at least 1")
+
+    filters = []
+    if status is not None:
+        filters.append(Query.status == status)
+    if created_after is not None:
+        filters.append(Query.created_at >= created_after)
+    if created_before is not None:
+        filters.append(Query.created_at < created_before)
+    if min_id is not None:
+        filters.append(Query.id >= min_id)
+    if max_id is not None:
+        filters.append(Query.id <= max_id)
+
+    scanned = 0
+    updated = 0
+    chunks = 0
+    last_id = 0
+    started = time.perf_counter()
+
+    while True:
+        rows = session.exec(
+            select(Query.id, Query.content, Query.priority, Query.safety_score)
+            .where(Query.id > last_id, *filters)
+            .order_by(Query.id)
+            .limit(chunk_size)
+        ).all()
+        if not rows:
+            break
+
+        now = datetime.utcnow()
+        changes = []
+        for query_id, content, priority, safety_score in rows:
+            result = triage_text(content)
+            if result.priority != priority or result.safety_score != safety_score:
+                changes.append({
+                    "id": query_id,
+                    "priority": result.priority,
+                    "safety_score": result.safety_score,
+                    "updated_at": now,
+                })
+
+        if changes:
+            # ORM bulk UPDATE by primary key: one executemany per chunk
+            session.exec(update(Query), params=changes)
+        session.commit()
+
+        scanned += len(rows)
+        updated += len(changes)
+        chunks += 1
+        last_id = rows[-1][0]
+
+    elapsed = time.perf_counter() - started
+    return {
+        "scanned": scanned,
+        "updated": updated,
+        "chunks": chunks,
+        "elapsed_seconds": elapsed,
+        "queries_per_second": scanned / elapsed if elapsed > 0 else 0.0,
+    }
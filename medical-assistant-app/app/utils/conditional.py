@@ -0,0 +1,42 @@
+"""ETags and ``If-None-Match`` handling for list endpoints
+
+A list response is fully determined by its URL (path and query string) and
+the rows of the tables it reads, so its ETag is a digest of the URL and the
+tables' change counters (see ``app.db.change_tracking``). Routes compute it
+before touching the listing itself and answer a matching ``If-None-Match``
+with an empty 304.
+"""
+from typing import Iterable
+import hashlib
+
+from fastapi import Request, Response, status
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.db.change_tracking import table_versions
+
+async def list_etag(session: AsyncSession, request: Request, tables: Iterable[str]) -> str:
+    """Strong ETag for a list request reading ``tables``"""
+    connection = await session.connection()
+    versions = await connection.run_sync(table_versions, tables)
+    params = "&".join(f"{key}={value}" for key, value in sorted(request.query_params.multi_items()))
+    state = ",".join(f"{table}:{versions.get(table)}" for table in sorted(tables))
+    digest = hashlib.sha1(f"{request.url.path}?{params}|{state}".encode()).hexdigest()
+    return f'"{digest}"'
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """True when the request's ``If-None-Match`` covers ``etag`` (weak comparison, as RFC 9110 asks)"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    candidates = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return etag in candidates
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+def set_etag(response: Response, etag: str) -> None:
+    """Tag a full response; ``no-cache`` makes clients revalidate before reusing it"""
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
@@ -1,7 +1,6 @@
 from fastapi import UploadFile
 import os
 from typing import Dict, Any
-import fitz  # PyMuPDF
 
 # Maximum file size (10 MB)
 MAX_FILE_SIZE = 10 * 1024 * 1024
@@ -26,7 +25,10 @@ ALLOWED_EXTENSIONS = {
 }
 
 def validate_file(file: UploadFile) -> Dict[str, Any]:
-    """Validate uploaded file for type and size
+    """Validate uploaded file name and type
+    
+    The size limit is enforced while the upload is streamed to disk
+    (see ``app.utils.uploads.stream_upload``), so nothing is read here.
     
     Returns a dictionary with:
     - valid: Boolean indicating if file is valid
@@ -58,32 +60,12 @@ def validate_file(file: UploadFile) -> Dict[str, Any]:
             "message": f"Invalid content type. Expected {expected_content_type}, got {file.content_type}"
         }
     
-    # Check file size
-    # Note: This requires reading the file into memory, which could be problematic for large files
-    # In a production system, you might want to use a streaming approach
-    file.file.seek(0, os.SEEK_END)
-    file_size = file.file.tell()
-    file.file.seek(0)  # Reset file pointer
-    
-    if file_size > MAX_FILE_SIZE:
-        return {
-            "valid": False,
-            "message": f"File too large. Maximum size is {MAX_FILE_SIZE / 1024 / 1024} MB"
-        }
-    
     # All checks passed
     return {
         "valid": True,
         "message": "File is valid"
     }
     
-def extract_text_from_pdf(file_bytes: bytes) -> str:
-    doc = fitz.open(stream=file_bytes, filetype="pdf")
-    return "\n".join([page.get_text() for page in doc])
-
-def extract_text_from_txt(file_bytes: bytes) -> str:
-    return file_bytes.decode("utf-8", errors="ignore")
-
 def sanitize_filename(filename: str) -> str:
     """Sanitize filename to prevent path traversal and other security issues"""
     # Remove path components
@@ -0,0 +1,287 @@
+"""Set-based purging and archiving of old queries
+
+Matching query ids are walked in primary-key order, ``chunk_size`` at a
+time, so memory use does not depend on how many rows match. Each chunk is
+handled in one short transaction:
+
+1. Optionally, the case is copied to an archive, one compact row per
+   query: the question, the AI suggestion, the review and the file names.
+   The archive is either the ``query_archive`` table or a gzipped NDJSON
+   file.
+2. The chunk's references to upload blobs are released, counting every
+   reference.
+3. The chunk is deleted with ``DELETE ... WHERE query_id IN (...)`` for
+   reviews, suggestions, jobs, files and the queries themselves.
+
+The write lock is released between chunks, and ``pause`` adds an idle
+gap, so the API and the workers keep writing while a purge runs. Blobs
+whose last reference went are deleted from disk by a background pool, but
+only after the transaction that released them has committed: a failed
+chunk never loses content.
+"""
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import gzip
+import json
+import os
+import time
+
+from sqlalchemy import Boolean, Column, DateTime, Float, Integer, MetaData, String, Table, Text, bindparam, delete, func, select, update
+from sqlalchemy.engine import Connection, Engine
+
+from app.models import AISuggestion, Blob, File, PatientContext, Query, QueryStatus, Review, SuggestionJob
+from app.utils.uploads import discard
+
+# Queries archived and deleted per transaction
+DEFAULT_CHUNK_SIZE = 500
+
+# Threads deleting blob files from disk
+BLOB_REAPER_WORKERS = 4
+
+# Kept apart from SQLModel.metadata, which app.models clears on import
+_archive_metadata = MetaData()
+
+query_archive = Table(
+    "query_archive",
+    _archive_metadata,
+    Column("query_id", Integer, primary_key=True),
+    Column("patient_id", Integer, nullable=False, index=True),
+    Column("status", String, nullable=False),
+    Column("priority", String, nullable=False),
+    Column("safety_score", Float),
+    Column("content", Text, nullable=False),
+    Column("created_at", DateTime, nullable=False),
+    Column("suggestion", Text),
+    Column("suggestion_model", String),
+    Column("review", Text),
+    Column("review_approved", Boolean),
+    Column("doctor_id", Integer),
+    Column("reviewed_at", DateTime),
+    Column("filenames", Text),
+    Column("archived_at", DateTime, nullable=False),
+)
+
+def _ids(name: str = "ids"):
+    return bindparam(name, expanding=True)
+
+def archive_rows(connection: Connection, query_ids: List[int]) -> List[Dict[str, Any]]:
+    """One compact record per query: the question, its suggestion, its review and its file names"""
+    filenames = {}
+    for query_id, filename in connection.execute(
+        select(File.query_id, File.filename).where(File.query_id.in_(_ids())).order_by(File.id), {"ids": query_ids}
+    ):
+        filenames.setdefault(query_id, []).append(filename)
+
+    now = datetime.utcnow()
+    rows = connection.execute(
+        select(
+            Query.id, Query.patient_id, Query.status, Query.priority, Query.safety_score, Query.content, Query.created_at,
+            AISuggestion.content, AISuggestion.model_used,
+            Review.content, Review.approved, Review.doctor_id, Review.created_at,
+        )
+        .outerjoin(AISuggestion, AISuggestion.query_id == Query.id)
+        .outerjoin(Review, Review.query_id == Query.id)
+        .where(Query.id.in_(_ids()))
+        .order_by(Query.id),
+        {"ids": query_ids},
+    ).all()
+    return [
+        {
+            "query_id": row[0], "patient_id": row[1], "status": row[2].value, "priority": row[3].value,
+            "safety_score": row[4], "content": row[5], "created_at": row[6],
+            "suggestion": row[7], "suggestion_model": row[8],
+            "review": row[9], "review_approved": row[10], "doctor_id": row[11], "reviewed_at": row[12],
+            "filenames": json.dumps(filenames.get(row[0], [])),
+            "archived_at": now,
+        }
+        for row in rows
+    ]
+
+class TableArchive:
+    """Archive into the ``query_archive`` table of the same database"""
+
+    def prepare(self, connection: Connection) -> None:
+        _archive_metadata.create_all(connection)
+
+    def write(self, connection: Connection, rows: List[Dict[str, Any]]) -> None:
+        if rows:
+            # A query archived by an earlier, interrupted run is overwritten
+            connection.execute(query_archive.delete().where(query_archive.c.query_id.in_(_ids())),
+                               {"ids": [row["query_id"] for row in rows]})
+            connection.execute(query_archive.insert(), rows)
+
+    def close(self) -> None:
+        pass
+
+class FileArchive:
+    """Archive as gzipped NDJSON; each chunk is flushed before its rows are deleted"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def prepare(self, connection: Connection) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        # Appending adds a gzip member; readers see one continuous stream
+        self._file = gzip.open(self.path, "at", encoding="utf-8")
+
+    def write(self, connection: Connection, rows: List[Dict[str, Any]]) -> None:
+        for row in rows:
+            self._file.write(json.dumps(row, default=str) + "\n")
+        self._file.flush()
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+
+class BlobReaper:
+    """Deletes blob files in background threads, confined to the upload root"""
+
+    def __init__(self, root: str, workers: int = BLOB_REAPER_WORKERS):
+        self.root = os.path.realpath(root)
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="blob-reaper")
+        self._pending: List[Future] = []
+        self.removed = 0
+        self.skipped = 0
+
+    def submit(self, paths: Iterable[str]) -> None:
+        for path in paths:
+            if os.path.commonpath([self.root, os.path.realpath(path)]) != self.root:
+                # Legacy rows may point anywhere; only files under the upload root are ours to delete
+                self.skipped += 1
+                continue
+            self._pending.append(self._pool.submit(discard, path))
+
+    def wait(self) -> None:
+        for future in self._pending:
+            future.result()
+        self.removed += len(self._pending)
+        self._pending = []
+        self._pool.shutdown()
+
+def release_blobs(connection: Connection, query_ids: List[int]) -> Tuple[List[str], int]:
+    """Drop the chunk's blob references
+
+    Returns the paths whose last reference went, with their total size.
+    Files stored before the blob table existed have no digest and are
+    returned directly.
+    """
+    references = connection.execute(
+        select(File.sha256, func.count())
+        .where(File.query_id.in_(_ids()), File.sha256.is_not(None))
+        .group_by(File.sha256),
+        {"ids": query_ids},
+    ).all()
+    legacy = connection.execute(
+        select(File.file_path, File.file_size).where(File.query_id.in_(_ids()), File.sha256.is_(None)), {"ids": query_ids}
+    ).all()
+    paths = [path for path, _ in legacy]
+    freed = sum(size for _, size in legacy)
+    if not references:
+        return paths, freed
+
+    connection.execute(
+        update(Blob).where(Blob.sha256 == bindparam("digest")).values(ref_count=Blob.ref_count - bindparam("count")),
+        [{"digest": digest, "count": count} for digest, count in references],
+    )
+    digests = [digest for digest, _ in references]
+    unreferenced = connection.execute(
+        select(Blob.sha256, Blob.path, Blob.size).where(Blob.sha256.in_(_ids()), Blob.ref_count <= 0), {"ids": digests}
+    ).all()
+    if unreferenced:
+        connection.execute(delete(Blob).where(Blob.sha256.in_(_ids())), {"ids": [digest for digest, _, _ in unreferenced]})
+    return paths + [path for _, path, _ in unreferenced], freed + sum(size for _, _, size in unreferenced)
+
+def delete_queries(connection: Connection, query_ids: List[int]) -> Dict[str, int]:
+    """Delete queries and every row that references them, one statement per table"""
+    counts = {}
+    # Snapshots may quote the purged reviews; they are rebuilt from what remains
+    connection.execute(
+        delete(PatientContext).where(PatientContext.patient_id.in_(
+            select(Query.patient_id).where(Query.id.in_(_ids())).scalar_subquery()
+        )),
+        {"ids": query_ids},
+    )
+    for name, model in (("reviews", Review), ("suggestions", AISuggestion), ("jobs", SuggestionJob), ("files", File)):
+        counts[name] = connection.execute(delete(model).where(model.query_id.in_(_ids())), {"ids": query_ids}).rowcount
+    counts["queries"] = connection.execute(delete(Query).where(Query.id.in_(_ids())), {"ids": query_ids}).rowcount
+    return counts
+
+def _matching(status: Optional[List[QueryStatus]], older_than: Optional[datetime]):
+    conditions = []
+    if status:
+        conditions.append(Query.status.in_(status))
+    if older_than is not None:
+        conditions.append(Query.created_at < older_than)
+    return conditions
+
+def count_matching(engine: Engine, status: Optional[List[QueryStatus]] = None, older_than: Optional[datetime] = None) -> int:
+    with engine.connect() as connection:
+        return connection.execute(select(func.count()).select_from(Query).where(*_matching(status, older_than))).scalar()
+
+def purge_queries(
+    engine: Engine,
+    upload_root: str,
+    status: Optional[List[QueryStatus]] = None,
+    older_than: Optional[datetime] = None,
+    archive=None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    pause: float = 0.0,
+    limit: Optional[int] = None,
+    everything: bool = False,
+) -> Dict[str, Any]:
+    """Archive (optionally) and delete matching queries in id-ordered chunks
+
+    ``archive`` is a ``TableArchive``, a ``FileArchive`` or None. ``limit``
+    caps how many queries one run removes. Without a ``status`` or
+    ``older_than`` filter every query would match, so that takes
+    ``everything=True``. Returns per-table counts, blob cleanup figures and
+    timing.
+    """
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be at least 1")
+    conditions = _matching(status, older_than)
+    if not conditions and not everything:
+        raise ValueError("no status or age filter given; pass everything=True to purge every query")
+    stats: Dict[str, Any] = {"queries": 0, "reviews": 0, "suggestions": 0, "jobs": 0, "files": 0,
+                             "archived": 0, "chunks": 0, "bytes_freed": 0}
+    reaper = BlobReaper(upload_root)
+    start = time.perf_counter()
+    last_id = 0
+    try:
+        if archive is not None:
+            with engine.begin() as connection:
+                archive.prepare(connection)
+        while limit is None or stats["queries"] < limit:
+            size = chunk_size if limit is None else min(chunk_size, limit - stats["queries"])
+            with engine.begin() as connection:
+                query_ids = list(connection.execute(
+                    select(Query.id).where(Query.id > last_id, *conditions).order_by(Query.id).limit(size)
+                ).scalars())
+                if not query_ids:
+                    break
+                if archive is not None:
+                    rows = archive_rows(connection, query_ids)
+                    archive.write(connection, rows)
+                    stats["archived"] += len(rows)
+                orphaned, freed = release_blobs(connection, query_ids)
+                for name, count in delete_queries(connection, query_ids).items():
+                    stats[name] += count
+            # Committed: the bytes can go now
+            reaper.submit(orphaned)
+            stats["bytes_freed"] += freed
+            last_id = query_ids[-1]
+            stats["chunks"] += 1
+            if pause:
+                time.sleep(pause)
+    finally:
+        if archive is not None:
+            archive.close()
+        reaper.wait()
+
+    stats["blobs_removed"] = reaper.removed
+    stats["blobs_outside_upload_root"] = reaper.skipped
+    stats["elapsed_seconds"] = time.perf_counter() - start
+    stats["queries_per_second"] = stats["queries"] / stats["elapsed_seconds"] if stats["elapsed_seconds"] else 0.0
+    return stats
@@ -0,0 +1,103 @@
+from datetime import datetime, timedelta
+from typing import List, Optional
+import os
+
+from sqlalchemy import or_, update
+from sqlmodel import Session, select
+
+from app.models import Query, QueryPriority, QueryStatus
+
+# Claims not turned into a review within this window return to the queue
+CLAIM_TTL = timedelta(minutes=int(os.getenv("REVIEW_CLAIM_TTL_MINUTES", "30")))
+
+# Order in which priority levels are served
+PRIORITY_ORDER = [QueryPriority.URGENT, QueryPriority.HIGH, QueryPriority.MEDIUM, QueryPriority.LOW]
+
+def _available_to(doctor_id: Optional[int], now: datetime):
+    """Filter for queries nobody holds a live claim on (or held by ``doctor_id``)"""
+    conditions = [Query.claimed_by.is_(None), Query.claimed_at < now - CLAIM_TTL]
+    if doctor_id is not None:
+        conditions.append(Query.claimed_by == doctor_id)
+    return or_(*conditions)
+
+def next_queries(session: Session, limit: int = 10, doctor_id: Optional[int] = None) -> List[Query]:
+    """Return the next queries awaiting review, most pressing first
+
+    Queries are ordered by priority (urgent first), then safety score
+    (highest first), then age (oldest first). Each priority level is read
+    with its own range scan on ``ix_query_review_queue``, which is already
+    sorted by safety score and age, so the cost depends on ``limit`` and not
+    on the size of the backlog.
+    """
+    now = datetime.utcnow()
+    results: List[Query] = []
+    for priority in PRIORITY_ORDER:
+        remaining = limit - len(results)
+        if remaining <= 0:
+            break
+        results.extend(session.exec(
+            select(Query)
+            .where(
+                Query.status == QueryStatus.AWAITING_REVIEW,
+                Query.priority == priority,
+                _available_to(doctor_id, now),
+            )
+            .order_by(Query.safety_score.desc(), Query.created_at)
+            .limit(remaining)
+        ).all())
+    return results
+
+def claim_query(session: Session, query_id: int, doctor_id: int) -> bool:
+    """Atomically claim a query for a doctor
+
+    The claim is a single conditional UPDATE, so when two doctors race for
+    the same query exactly one of them gets it. Returns False if the query is
+    not awaiting review or someone else holds a live claim on it.
+    """
+    now = datetime.utcnow()
+    result = session.exec(
+        update(Query)
+        .where(
+            Query.id == query_id,
+            Query.status == QueryStatus.AWAITING_REVIEW,
+            _available_to(doctor_id, now),
+        )
+        .values(claimed_by=doctor_id, claimed_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    session.commit()
+    return result.rowcount == 1
+
+def claim_next(session: Session, doctor_id: int, limit: int = 1) -> List[Query]:
+    """Claim up to ``limit`` of the most pressing unclaimed queries for a doctor"""
+    claimed: List[Query] = []
+    while len(claimed) < limit:
+        candidates = next_queries(session, limit - len(claimed))
+        if not candidates:
+            break
+        for query in candidates:
+            # Another doctor may have claimed it since it was read; skip it then
+            if claim_query(session, query.id, doctor_id):
+                session.refresh(query)
+                claimed.append(query)
+    return claimed
+
+def release_query(session: Session, query_id: int, doctor_id: int) -> bool:
+    """Give a claimed query back to the queue; only the claim holder can release it"""
+    result = session.exec(
+        update(Query)
+        .where(Query.id == query_id, Query.claimed_by == doctor_id)
+        .values(claimed_by=None, claimed_at=None)
+        .execution_options(synchronize_session=False)
+    )
+    session.commit()
+    return result.rowcount == 1
+
+def held_by_other(query: Query, doctor_id: int) -> bool:
+    """True if another doctor holds a live claim on the query"""
+    return (
+        query.claimed_by is not None
+        and query.claimed_by != doctor_id
+        and query.claimed_at is not None
+        and query.claimed_at >= datetime.utcnow() - CLAIM_TTL
+    )
@@ -0,0 +1,243 @@
+"""Text extraction for uploaded documents
+
+Parsing runs in a process pool so a large PDF never blocks the event loop
+(or the GIL) of the API process. Each document is read page by page into a
+list that is joined once at the end with ``PAGE_BREAK`` between pages, and
+stops early when it reaches the page cap or the time limit; the result says
+whether that happened.
+"""
+from concurrent.futures import Executor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Set, Tuple
+import asyncio
+import itertools
+import multiprocessing
+import os
+import signal
+import time
+
+# PDF backend used when the caller does not pick one ("pymupdf" or "pypdf2")
+EXTRACTION_BACKEND = os.getenv("EXTRACTION_BACKEND", "pymupdf")
+
+# Worker processes for extraction (0 parses in a thread of the API process)
+EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", "2"))
+
+# Seconds allowed per document; pages after the limit are skipped
+EXTRACTION_TIMEOUT_SECONDS = float(os.getenv("EXTRACTION_TIMEOUT_SECONDS", "30"))
+
+# Maximum pages read from a single document
+EXTRACTION_MAX_PAGES = int(os.getenv("EXTRACTION_MAX_PAGES", "500"))
+
+# Separates pages in extracted PDF text (form feed, as pdftotext does)
+PAGE_BREAK = "\f"
+
+# Extra seconds the API waits for a worker before giving up on a document
+# stuck inside a single page
+EXTRACTION_GRACE_SECONDS = 5.0
+
+class ExtractionResult(NamedTuple):
+    text: str
+    pages: int
+    total_pages: int
+    truncated: bool
+    backend: str
+    # The worker hung or died: the document was not read, and trying again may succeed
+    failed: bool = False
+
+def _pymupdf_pages(path: str) -> Tuple[int, Iterator[str]]:
+    import fitz  # PyMuPDF
+
+    doc = fitz.open(path)
+
+    def pages() -> Iterator[str]:
+        try:
+            for page in doc:
+                yield page.get_text()
+        finally:
+            doc.close()
+
+    return doc.page_count, pages()
+
+def _pypdf2_pages(path: str) -> Tuple[int, Iterator[str]]:
+    import PyPDF2
+
+    reader = PyPDF2.PdfReader(path)
+    return len(reader.pages), (page.extract_text() or "" for page in reader.pages)
+
+PDF_BACKENDS: Dict[str, Callable[[str], Tuple[int, Iterator[str]]]] = {
+    "pymupdf": _pymupdf_pages,
+    "pypdf2": _pypdf2_pages,
+}
+
+def extract_document(
+    path: str,
+    ext: str,
+    backend: str = EXTRACTION_BACKEND,
+    max_pages: int = EXTRACTION_MAX_PAGES,
+    timeout: float = EXTRACTION_TIMEOUT_SECONDS,
+) -> ExtractionResult:
+    """Extract the text of one document; runs inside an extraction worker
+
+    Unsupported types yield an empty result, and parse errors are logged
+    and return whatever pages were read before the failure.
+    """
+    if ext == ".txt":
+        try:
+            with open(path, encoding="utf-8") as f:
+                return ExtractionResult(f.read(), 1, 1, False, "text")
+        except Exception as e:
+            print(f"Error extracting TXT text: {e}")
+            return ExtractionResult("", 0, 1, False, "text")
+
+    if ext != ".pdf":
+        return ExtractionResult("", 0, 0, False, "none")
+
+    if backend not in PDF_BACKENDS:
+        raise ValueError(f"Unknown PDF backend {backend!r}; choose from {', '.join(PDF_BACKENDS)}")
+
+    deadline = time.monotonic() + timeout
+    parts: List[str] = []
+    total_pages = 0
+    try:
+        total_pages, pages = PDF_BACKENDS[backend](path)
+        for text in itertools.islice(pages, max_pages):
+            parts.append(text)
+            if time.monotonic() > deadline:
+                break
+    except Exception as e:
+        print(f"Error extracting PDF text with {backend}: {e}")
+
+    truncated = len(parts) < total_pages
+    return ExtractionResult(PAGE_BREAK.join(parts).strip(), len(parts), total_pages, truncated, backend)
+
+def _report_worker_pid(pids) -> None:
+    # Pool initializer: every worker reports its PID once, as it starts
+    pids.put(os.getpid())
+
+class ExtractionEngine:
+    """Runs ``extract_document`` on a process pool for async callers
+
+    A worker stuck inside one page past the deadline is not waited for:
+    the pool is retired, new documents go to a fresh pool, the retired
+    pool's other documents finish, and then its remaining (stuck)
+    processes are terminated by the PIDs its workers reported on start.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = EXTRACTION_WORKERS,
+        backend: str = EXTRACTION_BACKEND,
+        max_pages: int = EXTRACTION_MAX_PAGES,
+        timeout: float = EXTRACTION_TIMEOUT_SECONDS,
+        extractor: Callable[..., ExtractionResult] = extract_document,
+    ):
+        if backend not in PDF_BACKENDS:
+            raise ValueError(f"Unknown PDF backend {backend!r}; choose from {', '.join(PDF_BACKENDS)}")
+        self.max_workers = max_workers
+        self.backend = backend
+        self.max_pages = max_pages
+        self.timeout = timeout
+        # Module-level function run in the workers (replaceable in tests)
+        self.extractor = extractor
+        self._executor: Optional[Executor] = None
+        # Documents in flight per pool, so a retired pool is reaped only after the others finish
+        self._running: Dict[Executor, Set[asyncio.Future]] = {}
+        self._reapers: Set[asyncio.Task] = set()
+        # PIDs reported by each pool's workers: the queue they report on and those read so far
+        self._workers: Dict[Executor, Tuple[Any, List[int]]] = {}
+
+    def _get_executor(self) -> Optional[Executor]:
+        if self.max_workers > 0 and self._executor is None:
+            # Spawned workers don't inherit the API's threads, sockets or DB connections
+            context = multiprocessing.get_context("spawn")
+            pids = context.SimpleQueue()
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=context,
+                initializer=_report_worker_pid,
+                initargs=(pids,),
+            )
+            self._workers[self._executor] = (pids, [])
+        return self._executor
+
+    def worker_pids(self, executor: Optional[Executor] = None) -> List[int]:
+        """PIDs of the workers a pool has started (the current pool by default)"""
+        queue, pids = self._workers.get(executor or self._executor, (None, []))
+        while queue is not None and not queue.empty():
+            pids.append(queue.get())
+        return list(pids)
+
+    async def extract(self, path: str, ext: str, backend: Optional[str] = None) -> ExtractionResult:
+        backend = backend or self.backend
+        if backend not in PDF_BACKENDS:
+            raise ValueError(f"Unknown PDF backend {backend!r}; choose from {', '.join(PDF_BACKENDS)}")
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        future = loop.run_in_executor(executor, self.extractor, path, ext, backend, self.max_pages, self.timeout)
+        running = self._running.setdefault(executor, set()) if executor is not None else set()
+        running.add(future)
+        # A timed-out document's future may fail later, when its process is terminated
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        try:
+            # Shielded: a timeout must not cancel the future the reaper waits on
+            return await asyncio.wait_for(asyncio.shield(future), timeout=self.timeout + EXTRACTION_GRACE_SECONDS)
+        except asyncio.TimeoutError:
+            if executor is not None and executor is self._executor:
+                # The worker is stuck inside one page; later uploads go to a fresh pool
+                print(f"Text extraction of {path} exceeded {self.timeout}s; recycling extraction workers")
+                self._executor = None
+                reaper = asyncio.create_task(self._reap(executor))
+                self._reapers.add(reaper)
+                reaper.add_done_callback(self._reapers.discard)
+            return ExtractionResult("", 0, 0, True, backend, failed=True)
+        except BrokenProcessPool:
+            # Reaped together with a stuck document after outliving its own deadline
+            return ExtractionResult("", 0, 0, True, backend, failed=True)
+        finally:
+            running.discard(future)
+
+    async def _reap(self, executor: Executor) -> None:
+        """Let a retired pool's other documents finish, then kill the processes still busy"""
+        others = [future for future in self._running.pop(executor, set()) if not future.done()]
+        if others:
+            await asyncio.wait(others, timeout=self.timeout + EXTRACTION_GRACE_SECONDS)
+        # Killed while the pool still owns them, so none of the PIDs can have been reused
+        for pid in self.worker_pids(executor):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        executor.shutdown(wait=False, cancel_futures=True)
+        self._forget_workers(executor)
+
+    def _forget_workers(self, executor: Executor) -> None:
+        queue, _ = self._workers.pop(executor, (None, []))
+        if queue is not None:
+            queue.close()
+
+    def close(self, wait: bool = True) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._forget_workers(self._executor)
+            self._executor = None
+
+_engine: Optional[ExtractionEngine] = None
+
+def get_extraction_engine() -> ExtractionEngine:
+    """Return the process-wide extraction engine, creating it on first use"""
+    global _engine
+    if _engine is None:
+        _engine = ExtractionEngine()
+    return _engine
+
+def set_extraction_engine(engine: Optional[ExtractionEngine]) -> None:
+    """Replace the process-wide engine (tests, benchmarks)"""
+    global _engine
+    _engine = engine
+
+def close_extraction_engine() -> None:
+    """Shut down the extraction workers (called on app shutdown)"""
+    global _engine
+    if _engine is not None:
+        _engine.close()
+        _engine = None
@@ -1,4 +1,5 @@
 from app.models import QueryPriority
+from typing import Callable, Dict, FrozenSet, Iterable, NamedTuple, Pattern
 import re
 
 # Keywords for priority levels
@@ -12,46 +13,194 @@ URGENT_KEYWORDS = [
 HIGH_KEYWORDS = [
     "infection", "fever", "vomiting", "diarrhea", "dehydration", "pregnant",
     "pregnancy", "blood", "dizzy", "dizziness", "fainting", "chronic pain",
-    "worsening", "deteriorating", "not improving", "getting worse", "medication",
-    "side effect", "reaction", "rash", "swelling"
+    "medication", "side effect", "reaction", "rash", "swelling"
 ]
 
 MEDIUM_KEYWORDS = [
     "persistent", "ongoing", "recurring", "chronic", "weeks", "days",
     "uncomfortable", "pain", "ache", "sore", "tired", "fatigue", "weakness",
-    "concerned", "worried", "anxiety", "stress", "depression", "mental health"
+    "concerned", "worried", "anxiety", "stress", "depression", "mental health",
+    # A trend, not a symptom: the symptom itself decides whether it is more urgent
+    "worsening", "deteriorating", "not improving", "getting worse"
 ]
 
-# Safety concerns keywords
+# Intent to harm or acute danger; one is enough to escalate
+CRITICAL_SAFETY_KEYWORDS = [
+    "suicide", "suicidal", "self-harm", "hurt myself", "hurting myself", "harm myself",
+    "kill myself", "end my life", "end it all", "want to die", "overdose", "too many pills",
+    "all my pills", "harm others", "harming others", "thoughts of harming", "hurt someone",
+    "domestic violence", "fear for my life"
+]
+
+# Signs of distress that need a doctor's attention but do not escalate on their own
+DISTRESS_KEYWORDS = [
+    "hopeless", "worthless", "depressed", "dark thoughts", "wasn't here", "not be here",
+    "angry", "breaks things", "drinking more", "to cope"
+]
+
+# Other safety concerns keywords
 SAFETY_CONCERN_KEYWORDS = [
-    "suicide", "self-harm", "hurt myself", "end my life", "kill myself",
-    "overdose", "too many pills", "harm others", "hurt someone", "violent",
-    "abuse", "domestic violence", "assault", "emergency", "urgent", "critical",
+    "violent", "abuse", "assault", "emergency", "urgent", "critical",
     "life-threatening", "dying", "death", "fatal", "severe", "extreme"
 ]
 
+# Safety score added per keyword hit (the total is capped at 1.0)
+CRITICAL_SAFETY_WEIGHT = 0.8
+DISTRESS_KEYWORD_WEIGHT = 0.25
+SAFETY_KEYWORD_WEIGHT = 0.2
+
+# Safety score above which a query is escalated
+ESCALATION_THRESHOLD = 0.6
+
+# Keyword count from which one regex over a keyword trie beats a substring scan
+# per keyword (bench_triage: about 250 on CPython 3.11)
+TRIE_MIN_KEYWORDS = 250
+
+class TriageResult(NamedTuple):
+    """Outcome of a single triage pass over a piece of text"""
+    priority: QueryPriority
+    safety_score: float
+    escalate: bool
+
+def _build_keyword_pattern(keywords: Iterable[str]) -> Pattern:
+    """Compile keywords into a single prefix-factored alternation regex
+
+    Keywords are folded into a trie so that at any position of the text the
+    regex engine only follows the branch matching the next characters, and
+    longer keywords are tried before their prefixes. The cost of a scan is
+    therefore bounded by the text length and the trie depth rather than the
+    number of keywords.
+    """
+    trie: Dict[str, dict] = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def to_regex(node: Dict[str, dict]) -> str:
+        branches = [re.escape(char) + to_regex(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        # A keyword ends here, so the longer continuations are optional
+        return f"(?:{body})?" if "" in node else body
+
+    return re.compile(to_regex(trie))
+
+class KeywordMatcher:
+    """Find every keyword occurring in a text
+
+    Matching follows the same substring semantics as ``keyword in text``:
+    keywords may overlap and may appear inside longer words. Short lists are
+    checked with one C-level substring scan per keyword; from
+    ``trie_min_keywords`` on, one regex over the keyword trie walks the text
+    instead, so the cost stops growing with the number of keywords.
+    """
+
+    def __init__(self, keywords: Iterable[str], trie_min_keywords: int = TRIE_MIN_KEYWORDS):
+        self.keywords: FrozenSet[str] = frozenset(k.lower() for k in keywords)
+        self.uses_trie = len(self.keywords) >= trie_min_keywords
+        if not self.uses_trie:
+            return
+        self._pattern = _build_keyword_pattern(self.keywords)
+        # Keywords found inside each match, including the prefixes the regex skipped
+        self._contained: Dict[str, FrozenSet[str]] = {
+            keyword: frozenset(k for k in self.keywords if k in keyword) for keyword in self.keywords
+        }
+        # Where the next match may start: the first offset at which the rest of
+        # the match begins another keyword (the failure link of an Aho-Corasick
+        # automaton), else the end of the match
+        self._resume: Dict[str, int] = {
+            keyword: next(
+                (i for i in range(1, len(keyword)) if any(k.startswith(keyword[i:]) and k != keyword[i:] for k in self.keywords)),
+                len(keyword),
+            )
+            for keyword in self.keywords
+        }
+
+    def contains(self, text: str) -> Callable[[str], bool]:
+        """A ``keyword -> bool`` test for ``text``, for callers that can stop at the first hit"""
+        if self.uses_trie:
+            return self.find(text).__contains__
+        return text.lower().__contains__
+
+    def find(self, text: str) -> FrozenSet[str]:
+        """Return the set of keywords present in ``text`` (case-insensitive)"""
+        text_lower = text.lower()
+        if not self.uses_trie:
+            return frozenset(k for k in self.keywords if k in text_lower)
+        search = self._pattern.search
+        found: set = set()
+        pos = 0
+        while True:
+            match = search(text_lower, pos)
+            if match is None:
+                return frozenset(found)
+            keyword = match.group()
+            found.update(self._contained[keyword])
+            pos = match.start() + self._resume[keyword]
+
+class KeywordTriage:
+    """Priority and safety score of a text from weighted keyword lists"""
+
+    def __init__(
+        self,
+        urgent: Iterable[str],
+        high: Iterable[str],
+        medium: Iterable[str],
+        safety_weights: Dict[str, float],
+        trie_min_keywords: int = TRIE_MIN_KEYWORDS,
+    ):
+        self._levels = tuple(
+            (priority, tuple(k.lower() for k in keywords))
+            for priority, keywords in ((QueryPriority.URGENT, urgent), (QueryPriority.HIGH, high), (QueryPriority.MEDIUM, medium))
+        )
+        self._safety = tuple((k.lower(), weight) for k, weight in safety_weights.items())
+        self.matcher = KeywordMatcher(
+            [k for _, keywords in self._levels for k in keywords] + [k for k, _ in self._safety], trie_min_keywords
+        )
+
+    def _priority(self, contains: Callable[[str], bool]) -> QueryPriority:
+        for priority, keywords in self._levels:
+            if any(map(contains, keywords)):
+                return priority
+        return QueryPriority.LOW
+
+    def _safety_score(self, contains: Callable[[str], bool]) -> float:
+        # Rounded so three 0.2 hits are 0.6, not just above the escalation threshold
+        return round(min(sum(weight for keyword, weight in self._safety if contains(keyword)), 1.0), 2)
+
+    def priority(self, text: str) -> QueryPriority:
+        return self._priority(self.matcher.contains(text))
+
+    def safety_score(self, text: str) -> float:
+        return self._safety_score(self.matcher.contains(text))
+
+    def triage(self, text: str) -> TriageResult:
+        """Priority, safety score and escalation with the text lowered (or matched) once"""
+        contains = self.matcher.contains(text)
+        priority = self._priority(contains)
+        safety_score = self._safety_score(contains)
+        escalate = safety_score > ESCALATION_THRESHOLD or priority == QueryPriority.URGENT
+        return TriageResult(priority=priority, safety_score=safety_score, escalate=escalate)
+
+SAFETY_WEIGHTS: Dict[str, float] = {
+    **{k: SAFETY_KEYWORD_WEIGHT for k in SAFETY_CONCERN_KEYWORDS},
+    **{k: DISTRESS_KEYWORD_WEIGHT for k in DISTRESS_KEYWORDS},
+    **{k: CRITICAL_SAFETY_WEIGHT for k in CRITICAL_SAFETY_KEYWORDS},
+}
+
+# Built once at import time
+_TRIAGE = KeywordTriage(URGENT_KEYWORDS, HIGH_KEYWORDS, MEDIUM_KEYWORDS, SAFETY_WEIGHTS)
+
+def triage_text(text: str) -> TriageResult:
+    """Compute priority, safety score and escalation with the text lowered once"""
+    return _TRIAGE.triage(text)
+
 def calculate_priority(text: str) -> QueryPriority:
     """Calculate priority level based on text content"""
-    # Convert to lowercase for case-insensitive matching
-    text_lower = text.lower()
-    
-    # Check for urgent keywords
-    for keyword in URGENT_KEYWORDS:
-        if keyword in text_lower:
-            return QueryPriority.URGENT
-    
-    # Check for high priority keywords
-    for keyword in HIGH_KEYWORDS:
-        if keyword in text_lower:
-            return QueryPriority.HIGH
-    
-    # Check for medium priority keywords
-    for keyword in MEDIUM_KEYWORDS:
-        if keyword in text_lower:
-            return QueryPriority.MEDIUM
-    
-    # Default to low priority
-    return QueryPriority.LOW
+    return _TRIAGE.priority(text)
 
 def calculate_safety_score(text: str) -> float:
     """Calculate safety score based on text content
@@ -60,28 +209,8 @@ def calculate_safety_score(text: str) -> float:
     - 0.0 means no safety concerns
     - 1.0 means highest level of safety concerns
     """
-    # Convert to lowercase for case-insensitive matching
-    text_lower = text.lower()
-    
-    # Initialize score
-    score = 0.0
-    
-    # Check for safety concern keywords
-    for keyword in SAFETY_CONCERN_KEYWORDS:
-        if keyword in text_lower:
-            # Increase score for each match
-            score += 0.2
-    
-    # Cap score at 1.0
-    return min(score, 1.0)
+    return _TRIAGE.safety_score(text)
 
 def should_escalate(text: str) -> bool:
     """Determine if a query should be escalated for immediate attention"""
-    # Calculate safety score
-    safety_score = calculate_safety_score(text)
-    
-    # Calculate priority
-    priority = calculate_priority(text)
-    
-    # Escalate if safety score is high or priority is urgent
-    return safety_score > 0.6 or priority == QueryPriority.URGENT
+    return triage_text(text).escalate
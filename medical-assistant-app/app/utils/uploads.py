@@ -0,0 +1,151 @@
+"""Stream uploaded files to disk without holding them in memory
+
+The upload is copied in fixed-size chunks to a temporary file, hashed as it
+goes, and only kept once it is complete and within the size limit; the blob
+store then moves it into place. Blocking file I/O runs in the thread pool so
+the event loop is never stalled by disk writes.
+
+Starlette parses a multipart body, spooling each file to a temporary file,
+before the route runs, so ``stream_upload`` only sees an oversized file
+after it has been received in full. ``UploadLimitMiddleware`` bounds the
+request body itself before any parsing happens.
+"""
+from typing import NamedTuple, Optional
+import hashlib
+import os
+import tempfile
+
+from fastapi import UploadFile
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+
+from app.utils.file_validation import MAX_FILE_SIZE
+
+# Bytes read from the upload and written to disk per step
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(64 * 1024)))
+
+# Multipart boundaries, part headers and form fields allowed on top of the file
+UPLOAD_FORM_OVERHEAD = int(os.getenv("UPLOAD_FORM_OVERHEAD", str(64 * 1024)))
+
+class UploadTooLarge(Exception):
+    """Raised when an upload exceeds the size limit"""
+
+    def __init__(self, limit: int):
+        super().__init__(f"File too large. Maximum size is {limit / 1024 / 1024} MB")
+        self.limit = limit
+
+class StoredUpload(NamedTuple):
+    path: str
+    size: int
+    sha256: str
+
+def discard(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+async def stream_upload(
+    upload: UploadFile,
+    dest_dir: str,
+    max_size: int = MAX_FILE_SIZE,
+    chunk_size: int = UPLOAD_CHUNK_SIZE,
+) -> StoredUpload:
+    """Copy an upload into a temporary file in ``dest_dir`` chunk by chunk
+
+    The size limit is checked as bytes arrive, so an oversized upload is
+    rejected after at most ``max_size + chunk_size`` bytes and leaves nothing
+    behind. The caller owns the returned temporary file: it must move it
+    into place (``os.replace``, atomic on the same filesystem) or discard it.
+
+    By the time the route calls this, Starlette has already received and
+    spooled the whole multipart body; ``UploadLimitMiddleware`` is what stops
+    a huge request from being read at all.
+    """
+    # Starlette records the size of spooled uploads; reject before copying anything
+    declared: Optional[int] = getattr(upload, "size", None)
+    if declared is not None and declared > max_size:
+        raise UploadTooLarge(max_size)
+
+    fd, tmp_path = await run_in_threadpool(tempfile.mkstemp, dir=dest_dir, prefix=".upload-", suffix=".part")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = await upload.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_size:
+                    raise UploadTooLarge(max_size)
+                digest.update(chunk)
+                await run_in_threadpool(out.write, chunk)
+            await run_in_threadpool(out.flush)
+            await run_in_threadpool(os.fsync, out.fileno())
+    except BaseException:
+        # Also runs on client disconnect/cancellation, so no awaiting here
+        discard(tmp_path)
+        raise
+
+    return StoredUpload(path=tmp_path, size=size, sha256=digest.hexdigest())
+
+class UploadLimitMiddleware:
+    """Reject upload requests whose body exceeds ``max_body`` before it is parsed
+
+    A declared Content-Length over the limit is answered with 413 without
+    reading the body. A body without one (chunked) is counted as it arrives
+    and cut off once it passes the limit, and the 413 replaces whatever the
+    route would have answered.
+    """
+
+    def __init__(self, app, max_body: int = MAX_FILE_SIZE + UPLOAD_FORM_OVERHEAD, path_suffix: str = "/upload"):
+        self.app = app
+        self.max_body = max_body
+        self.path_suffix = path_suffix
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or not scope["path"].rstrip("/").endswith(self.path_suffix):
+            await self.app(scope, receive, send)
+            return
+
+        declared = dict(scope["headers"]).get(b"content-length", b"")
+        if declared.isdigit() and int(declared) > self.max_body:
+            await self._reject(scope, receive, send)
+            return
+
+        received = 0
+        exceeded = False
+        started = False
+
+        async def limited_receive():
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body:
+                    exceeded = True
+                    raise UploadTooLarge(self.max_body)
+            return message
+
+        async def send_wrapper(message):
+            nonlocal started
+            if exceeded:
+                # The parser's failure surfaces as some other error response; answer 413 instead
+                if message["type"] == "http.response.start" and not started:
+                    started = True
+                    await self._reject(scope, receive, send)
+                return
+            started = started or message["type"] == "http.response.start"
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, send_wrapper)
+        except UploadTooLarge:
+            if started:
+                raise
+            await self._reject(scope, receive, send)
+
+    async def _reject(self, scope, receive, send) -> None:
+        response = JSONResponse({"detail": str(UploadTooLarge(self.max_body))}, status_code=413)
+        await response(scope, receive, send)
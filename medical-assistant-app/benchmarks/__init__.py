@@ -0,0 +1,2 @@
+# Benchmarks package initialization
+# Run individual benchmarks with: python -m benchmarks.<module>
@@ -0,0 +1,279 @@
+"""Load-test the API in process and compare against a stored baseline
+
+Generates a synthetic database (``benchmarks.datagen``), then drives the
+FastAPI app through httpx's ASGI transport: for each scenario and
+concurrency level, ``--requests`` calls are spread over that many
+concurrent clients. Reports throughput and p50/p95/p99 latency.
+
+Scenarios:
+    list     GET listings (queries by status, a patient's history, reviews, review queue)
+    create   POST /api/query/
+    upload   POST /api/file/{id}/upload with TXT and PDF lab reports
+    triage   POST /api/triage/{id}
+    review   POST /api/review/{id} on queries awaiting review
+
+``--save-baseline`` stores the results; ``--baseline`` compares a run with
+stored results and exits with status 1 when a scenario failed more
+requests than before, or a p95 latency grew, or throughput fell, by more
+than ``--tolerance``. Baselines are only
+comparable on the same machine and settings.
+
+Usage:
+    python -m benchmarks.bench_api_load [--patients 2000] [--queries 50000] [--concurrency 1,8,32]
+    python -m benchmarks.bench_api_load --save-baseline benchmarks/baselines/api_load.json
+    python -m benchmarks.bench_api_load --baseline benchmarks/baselines/api_load.json
+"""
+from typing import Any, Callable, Dict, List, NamedTuple, Tuple
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+import httpx
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.db.database import SQLITE_PRAGMAS, get_async_session
+from app.db.engine_profile import engine_options, install_sqlite_pragmas
+from app.main import app
+from app.routes import file as file_routes
+from app.utils.blob_store import BlobStore
+from app.utils.text_extraction import close_extraction_engine
+from benchmarks.datagen import DataSize, generate_database, lab_report
+
+SCENARIOS = ("list", "create", "upload", "triage", "review")
+
+# Request description: method, URL and keyword arguments for httpx
+Call = Tuple[str, str, Dict[str, Any]]
+
+class Workload(NamedTuple):
+    size: DataSize
+    # Queries awaiting review with no review yet, handed out once each
+    reviewable: List[int]
+
+class ScenarioResult(NamedTuple):
+    requests: int
+    errors: int
+    seconds: float
+    latencies: List[float]
+
+    def summary(self) -> Dict[str, float]:
+        ok = sorted(self.latencies)
+        cuts = statistics.quantiles(ok, n=100, method="inclusive") if len(ok) > 1 else ok * 99
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "throughput": round(self.requests / self.seconds, 1),
+            "p50_ms": round(cuts[49] * 1e3, 2) if cuts else None,
+            "p95_ms": round(cuts[94] * 1e3, 2) if cuts else None,
+            "p99_ms": round(cuts[98] * 1e3, 2) if cuts else None,
+        }
+
+def request_factory(scenario: str, workload: Workload, rng: random.Random) -> Callable[[], Call]:
+    size = workload.size
+
+    def listing() -> Call:
+        return rng.choice([
+            ("GET", "/api/query/", {"params": {"status": rng.choice(["pending", "awaiting_review", "completed"])}}),
+            ("GET", "/api/query/", {"params": {"patient_id": rng.randint(1, size.patients)}}),
+            ("GET", "/api/review/", {"params": {"doctor_id": rng.randint(1, size.doctors)}}),
+            ("GET", "/api/queue/", {}),
+        ])
+
+    def create() -> Call:
+        return ("POST", "/api/query/", {"json": {
+            "patient_id": rng.randint(1, size.patients),
+            "content": "I have had a persistent cough for two weeks and now a mild fever.",
+        }})
+
+    def upload() -> Call:
+        name, content, content_type = lab_report(rng, rng.choice(["txt", "pdf"]))
+        return ("POST", f"/api/file/{rng.randint(1, size.queries)}/upload",
+                {"files": {"file": (name, content, content_type)}})
+
+    def triage() -> Call:
+        return ("POST", f"/api/triage/{rng.randint(1, size.queries)}", {})
+
+    def review() -> Call:
+        query_id = workload.reviewable.pop()
+        return ("POST", f"/api/review/{query_id}", {"json": {
+            "doctor_id": rng.randint(1, size.doctors),
+            "content": "Reviewed: please book a follow-up appointment.",
+            "approved": rng.random() < 0.8,
+        }})
+
+    return {"list": listing, "create": create, "upload": upload, "triage": triage, "review": review}[scenario]
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    next_call: Callable[[], Call],
+    requests: int,
+    concurrency: int,
+) -> ScenarioResult:
+    """Send ``requests`` calls from ``concurrency`` clients, each sending its next call as soon as one returns"""
+    latencies: List[float] = []
+    errors = 0
+    remaining = requests
+
+    async def client_loop() -> None:
+        nonlocal errors, remaining
+        while remaining > 0:
+            remaining -= 1
+            method, url, kwargs = next_call()
+            start = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            if response.status_code >= 400:
+                errors += 1
+            else:
+                latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+    return ScenarioResult(requests, errors, time.perf_counter() - start, latencies)
+
+def compare_to_baseline(results: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float) -> List[str]:
+    """Describe each result that errored more than before, or whose p95 rose or throughput fell beyond ``tolerance``"""
+    regressions = []
+    for key, current in results.items():
+        previous = baseline.get(key)
+        if not previous:
+            continue
+        # Failed requests are left out of the latencies, so a faster run may just be a failing one
+        if current["errors"] > previous.get("errors", 0):
+            regressions.append(f"{key}: errors {previous.get('errors', 0)} -> {current['errors']}")
+        if previous.get("p95_ms") and current["p95_ms"] and current["p95_ms"] > previous["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{key}: p95 {previous['p95_ms']:.1f} -> {current['p95_ms']:.1f} ms")
+        if current["throughput"] < previous["throughput"] * (1 - tolerance):
+            regressions.append(f"{key}: throughput {previous['throughput']:.1f} -> {current['throughput']:.1f} req/s")
+    return regressions
+
+async def load_test(
+    path: str,
+    workload: Workload,
+    scenarios: List[str],
+    levels: List[int],
+    requests: int,
+    seed: int,
+) -> Dict[str, Dict]:
+    # Configured like the app's engine; created inside the running loop, which aiosqlite connections belong to
+    url = f"sqlite+aiosqlite:///{path}"
+    async_engine = create_async_engine(url, **engine_options(url, pool_size=max(levels), max_overflow=0))
+    install_sqlite_pragmas(async_engine.sync_engine, SQLITE_PRAGMAS)
+
+    async def get_session_override():
+        async with AsyncSession(async_engine, expire_on_commit=False) as session:
+            yield session
+
+    app.dependency_overrides[get_async_session] = get_session_override
+    saved_store = file_routes.blob_store
+    file_routes.blob_store = BlobStore(os.path.join(os.path.dirname(path), "uploads"))
+    rng = random.Random(seed)
+    results = {}
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            for scenario in scenarios:
+                for concurrency in levels:
+                    next_call = request_factory(scenario, workload, rng)
+                    await run_scenario(client, next_call, min(requests, 2 * concurrency), concurrency)  # warm-up
+                    result = await run_scenario(client, next_call, requests, concurrency)
+                    summary = results[f"{scenario}@{concurrency}"] = result.summary()
+                    print(f"{scenario:<8} {concurrency:>11} {summary['requests']:>8} {summary['errors']:>6} "
+                          f"{summary['throughput']:>8.1f} {summary['p50_ms']:>9.1f} {summary['p95_ms']:>9.1f} "
+                          f"{summary['p99_ms']:>9.1f}")
+    finally:
+        app.dependency_overrides.clear()
+        file_routes.blob_store = saved_store
+        await async_engine.dispose()
+    return results
+
+def reviewable_queries(path: str) -> List[int]:
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.connect() as connection:
+        ids = connection.execute(text(
+            "SELECT id FROM query WHERE status = 'AWAITING_REVIEW' "
+            "AND id NOT IN (SELECT query_id FROM review) ORDER BY id"
+        )).scalars().all()
+    engine.dispose()
+    return list(ids)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--patients", type=int, default=2_000)
+    parser.add_argument("--doctors", type=int, default=50)
+    parser.add_argument("--queries", type=int, default=50_000)
+    parser.add_argument("--db", help="Existing database generated by benchmarks.datagen (sizes are then ignored)")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--concurrency", default="1,8,32", help="Comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per scenario and concurrency level")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write results as JSON")
+    parser.add_argument("--baseline", help="Compare with results saved by --save-baseline")
+    parser.add_argument("--save-baseline", help="Save results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative regression (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    scenarios = args.scenarios.split(",")
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    levels = [int(level) for level in args.concurrency.split(",")]
+
+    if args.db:
+        path = args.db
+        engine = create_engine(f"sqlite:///{path}")
+        with engine.connect() as connection:
+            size = DataSize(*(connection.execute(text(f'SELECT max(id) FROM "{table}"')).scalar() or 0
+                              for table in ("patient", "doctor", "query")))
+        engine.dispose()
+    else:
+        path = os.path.join(tempfile.mkdtemp(), "bench_api.db")
+        size = DataSize(args.patients, args.doctors, args.queries)
+        counts = generate_database(f"sqlite:///{path}", size, seed=args.seed)
+        print(f"Generated {counts['queries']} queries for {counts['patients']} patients in "
+              f"{counts['load_seconds'] + counts['index_seconds']:.1f}s ({path})")
+
+    workload = Workload(size, reviewable_queries(path))
+    needed = args.requests * len(levels) + 2 * sum(levels)
+    if "review" in scenarios and len(workload.reviewable) < needed:
+        parser.error(f"review needs {needed} queries awaiting review, the database has {len(workload.reviewable)}")
+
+    print(f"\n{'scenario':<8} {'concurrency':>11} {'requests':>8} {'errors':>6} {'req/s':>8} "
+          f"{'p50 (ms)':>9} {'p95 (ms)':>9} {'p99 (ms)':>9}")
+    try:
+        results = asyncio.run(load_test(path, workload, scenarios, levels, args.requests, args.seed))
+    finally:
+        close_extraction_engine()
+
+    report = {
+        "settings": {"patients": size.patients, "doctors": size.doctors, "queries": size.queries,
+                     "requests": args.requests, "python": platform.python_version(), "machine": platform.machine()},
+        "results": results,
+    }
+    for target in (args.output, args.save_baseline):
+        if target:
+            os.makedirs(os.path.dirname(os.path.abspath(target)), exist_ok=True)
+            with open(target, "w") as f:
+                json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(results, baseline["results"], args.tolerance)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regressions against {args.baseline}:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"\n✅ Within {args.tolerance:.0%} of {args.baseline}")
+
+if __name__ == "__main__":
+    main()
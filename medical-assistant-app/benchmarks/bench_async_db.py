@@ -0,0 +1,141 @@
+"""Benchmark concurrent list requests on the async session layer
+
+Seeds a scratch SQLite database with ``--rows`` queries and sends
+``--requests`` ``GET /api/query/`` calls through an in-process ASGI client at
+several concurrency levels. Each level runs twice: against the real routes
+(``AsyncSession`` on aiosqlite) and against a copy of the old route that
+runs a blocking ``Session`` inside ``async def``. A heartbeat measures
+event-loop lag during each run; the blocking route stalls the loop for every
+statement, so its requests serialize.
+
+``--db-latency`` makes SQLite sleep as each statement starts (a trace
+callback, so it runs on whichever thread executes the statement) to stand in
+for the network round trip of a server database (PostgreSQL). On
+a local SQLite file statements take microseconds and the remaining cost is
+ORM work under the GIL, so without it the two modes finish close together;
+the loop-lag column still shows the difference.
+
+Usage:
+    python -m benchmarks.bench_async_db [--rows 200000] [--requests 256] [--db-latency 0.005]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+import httpx
+from fastapi import Depends, FastAPI
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import Session, SQLModel, create_engine, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.db.database import get_async_session
+from app.db.pagination import paginate
+from app.main import app
+from app.models import Query
+from app.routes.query import filter_queries
+from benchmarks.bench_llm import heartbeat
+from benchmarks.bench_query_indexes import seed
+
+def add_latency(engine, seconds: float) -> None:
+    """Sleep as each statement starts, on the thread that executes it"""
+    if seconds <= 0:
+        return
+
+    def sleep(statement: str) -> None:
+        time.sleep(seconds)
+
+    @event.listens_for(engine, "connect")
+    def install(dbapi_connection, connection_record):
+        if hasattr(dbapi_connection, "run_async"):
+            # aiosqlite: register on the driver connection, which runs statements in its own thread
+            dbapi_connection.run_async(lambda conn: conn.set_trace_callback(sleep))
+        else:
+            dbapi_connection.set_trace_callback(sleep)
+
+def blocking_app(engine) -> FastAPI:
+    """The list route as it was before the async session layer"""
+    blocking = FastAPI()
+
+    def get_session():
+        with Session(engine) as session:
+            yield session
+
+    @blocking.get("/api/query/")
+    async def get_queries(status: str = None, session: Session = Depends(get_session)):
+        page = paginate(session, filter_queries(select(Query), status, None), Query)
+        return {"total": page.total, "queries": [q.id for q in page.items]}
+
+    return blocking
+
+async def run(asgi_app, requests: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    transport = httpx.ASGITransport(app=asgi_app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def one(i: int) -> None:
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.get("/api/query/", params={"status": ("pending", "completed")[i % 2]})
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - start)
+
+        stop = asyncio.Event()
+        lag_task = asyncio.create_task(heartbeat(stop))
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests)))
+        elapsed = time.perf_counter() - start
+        stop.set()
+        worst_lag = await lag_task
+    return elapsed, statistics.median(latencies), worst_lag
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--requests", type=int, default=256)
+    parser.add_argument("--db-latency", type=float, default=0.005)
+    parser.add_argument("--db", default=None)
+    args = parser.parse_args()
+
+    path = args.db or os.path.join(tempfile.mkdtemp(), "bench_async.db")
+    # Both modes get a pool large enough for the highest concurrency level
+    sync_engine = create_engine(
+        f"sqlite:///{path}", connect_args={"check_same_thread": False}, pool_size=64, max_overflow=0
+    )
+    SQLModel.metadata.create_all(sync_engine)
+    seed(sync_engine, args.rows, patients=max(1, args.rows // 20))
+    print(f"Seeded {args.rows} queries at {path}, {args.db_latency * 1e3:.1f} ms per statement\n")
+    # Reconnect so the pooled connections pick up the latency hook
+    sync_engine.dispose()
+    add_latency(sync_engine, args.db_latency)
+
+    print(f"{'mode':<9} {'concurrency':>11} {'seconds':>8} {'req/s':>7} {'p50 (ms)':>9} {'max loop lag (ms)':>18}")
+    asyncio.run(compare(sync_engine, path, args.requests, args.db_latency))
+
+async def compare(sync_engine, path: str, requests: int, db_latency: float) -> None:
+    # Created inside the running loop: aiosqlite connections belong to it
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}", pool_size=64, max_overflow=0)
+    add_latency(async_engine.sync_engine, db_latency)
+
+    async def get_session_override():
+        async with AsyncSession(async_engine, expire_on_commit=False) as session:
+            yield session
+
+    app.dependency_overrides[get_async_session] = get_session_override
+    modes = {"blocking": blocking_app(sync_engine), "async": app}
+    try:
+        for concurrency in (1, 4, 16, 64):
+            for mode, asgi_app in modes.items():
+                elapsed, p50, lag = await run(asgi_app, requests, concurrency)
+                print(f"{mode:<9} {concurrency:>11} {elapsed:>8.2f} {requests / elapsed:>7.1f} "
+                      f"{p50 * 1e3:>9.1f} {lag * 1e3:>18.1f}")
+    finally:
+        app.dependency_overrides.clear()
+        await async_engine.dispose()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Benchmark PDF text extraction backends
+
+Generates a synthetic lab report of ``--pages`` pages and times each backend
+with ``extract_document`` directly (median of ``--repeat`` runs), then runs
+``--documents`` concurrent extractions through ``ExtractionEngine`` while a
+heartbeat measures event-loop lag. Parsing inline on the loop (the old
+upload path) stalls it for the whole document; the process pool keeps it
+responsive.
+
+Usage:
+    python -m benchmarks.bench_extraction [--pages 300] [--documents 8] [--workers 2]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+import fitz  # PyMuPDF
+
+from app.utils.text_extraction import PDF_BACKENDS, ExtractionEngine, extract_document
+from benchmarks.bench_llm import heartbeat
+
+LINES_PER_PAGE = 40
+
+def make_pdf(path: str, pages: int) -> None:
+    doc = fitz.open()
+    for number in range(pages):
+        page = doc.new_page()
+        body = "\n".join(
+            f"Page {number + 1} line {line}: glucose 5.{line % 10} mmol/L, HbA1c 6.{line % 7}%"
+            for line in range(LINES_PER_PAGE)
+        )
+        page.insert_text((36, 36), body, fontsize=8)
+    doc.save(path)
+    doc.close()
+
+async def loop_lag(run) -> float:
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(heartbeat(stop))
+    await asyncio.sleep(0)
+    await run()
+    stop.set()
+    return await lag_task
+
+async def inline(path: str, backend: str, documents: int) -> None:
+    for _ in range(documents):
+        extract_document(path, ".pdf", backend=backend)
+
+async def pooled(engine: ExtractionEngine, path: str, backend: str, documents: int) -> None:
+    await asyncio.gather(*(engine.extract(path, ".pdf", backend=backend) for _ in range(documents)))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--documents", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "bench_report.pdf")
+    make_pdf(path, args.pages)
+    print(f"Generated {args.pages}-page PDF ({os.path.getsize(path) / 1024:.0f} KiB) at {path}\n")
+
+    print(f"{'backend':<8} {'seconds':>8} {'pages/s':>9} {'chars':>9}")
+    for backend in PDF_BACKENDS:
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            result = extract_document(path, ".pdf", backend=backend, max_pages=args.pages, timeout=600)
+            timings.append(time.perf_counter() - start)
+        elapsed = statistics.median(timings)
+        print(f"{backend:<8} {elapsed:>8.3f} {result.pages / elapsed:>9.0f} {len(result.text):>9}")
+
+    print(f"\n{args.documents} documents, {args.workers} worker processes")
+    print(f"{'backend':<8} {'mode':<7} {'seconds':>8} {'max loop lag (ms)':>18}")
+    for backend in PDF_BACKENDS:
+        start = time.perf_counter()
+        lag = asyncio.run(loop_lag(lambda: inline(path, backend, args.documents)))
+        print(f"{backend:<8} {'inline':<7} {time.perf_counter() - start:>8.2f} {lag * 1e3:>18.1f}")
+
+        engine = ExtractionEngine(max_workers=args.workers, max_pages=args.pages, timeout=600)
+        try:
+            # Start the workers outside the timed run
+            asyncio.run(pooled(engine, path, backend, args.workers))
+            start = time.perf_counter()
+            lag = asyncio.run(loop_lag(lambda: pooled(engine, path, backend, args.documents)))
+            print(f"{backend:<8} {'pool':<7} {time.perf_counter() - start:>8.2f} {lag * 1e3:>18.1f}")
+        finally:
+            engine.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Benchmark suggestion throughput against the mock OpenAI server
+
+Starts ``benchmarks.mock_openai`` in a background thread, then fires
+``--requests`` completions through ``SuggestionEngine`` at several
+concurrency limits. A heartbeat task measures event-loop lag during each run:
+with the async client it stays near zero, whereas the old synchronous call
+blocked the loop for the full completion time.
+
+Usage:
+    python -m benchmarks.bench_llm [--requests 64] [--latency 0.5] [--error-rate 0.05]
+"""
+import argparse
+import asyncio
+import socket
+import threading
+import time
+
+import uvicorn
+from openai import AsyncOpenAI
+
+from app.llm.suggestion import SuggestionEngine, SYSTEM_PROMPT
+from benchmarks.mock_openai import create_mock_app
+
+def start_mock_server(latency: float, jitter: float, error_rate: float) -> str:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    config = uvicorn.Config(create_mock_app(latency, jitter, error_rate), host="127.0.0.1", port=port, log_level="warning")
+    server = uvicorn.Server(config)
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}/v1"
+
+async def heartbeat(stop: asyncio.Event, interval: float = 0.01) -> float:
+    """Return the worst scheduling delay seen while ``stop`` is unset"""
+    worst = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - start - interval)
+    return worst
+
+async def run(base_url: str, requests: int, concurrency: int):
+    client = AsyncOpenAI(api_key="mock", base_url=base_url, max_retries=0)
+    engine = SuggestionEngine(client=client, model="mock", max_concurrency=concurrency, backoff_base=0.05)
+    messages = [{"role": "system", "content": SYSTEM_PROMPT}, {"role": "user", "content": "My glucose was 180 after lunch"}]
+
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(heartbeat(stop))
+    start = time.perf_counter()
+    results = await asyncio.gather(*(engine.complete(messages) for _ in range(requests)), return_exceptions=True)
+    elapsed = time.perf_counter() - start
+    stop.set()
+    worst_lag = await lag_task
+    await engine.aclose()
+
+    failures = sum(isinstance(r, Exception) for r in results)
+    return elapsed, failures, worst_lag
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--error-rate", type=float, default=0.05)
+    args = parser.parse_args()
+
+    base_url = start_mock_server(args.latency, args.jitter, args.error_rate)
+    print(f"Mock server at {base_url} (latency {args.latency}s, error rate {args.error_rate:.0%})")
+    print(f"Sequential blocking calls would take ~{args.requests * args.latency:.1f}s\n")
+    print(f"{'concurrency':>11} {'seconds':>8} {'req/s':>7} {'failed':>7} {'max loop lag (ms)':>18}")
+    for concurrency in (1, 4, 16, 64):
+        elapsed, failures, lag = asyncio.run(run(base_url, args.requests, concurrency))
+        print(f"{concurrency:>11} {elapsed:>8.2f} {args.requests / elapsed:>7.1f} {failures:>7} {lag * 1e3:>18.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""Benchmark list-query latency on the Query table with and without its indexes
+
+Seeds a scratch SQLite database with ``--rows`` queries (1M by default),
+drops the managed indexes, times the list endpoints' SQL, then applies the
+index migration and times the same statements again.
+
+Usage:
+    python -m benchmarks.bench_query_indexes [--rows N] [--db PATH]
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, insert, text
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from app.models import Patient, Query, QueryPriority, QueryStatus
+from app.db.migrations import ensure_indexes
+from app.db.pagination import paginate
+
+STATUS_MIX = [
+    (QueryStatus.PENDING, 0.05),
+    (QueryStatus.PROCESSING, 0.02),
+    (QueryStatus.AWAITING_REVIEW, 0.08),
+    (QueryStatus.REVIEWED, 0.25),
+    (QueryStatus.COMPLETED, 0.60),
+]
+PRIORITY_MIX = [
+    (QueryPriority.LOW, 0.40),
+    (QueryPriority.MEDIUM, 0.35),
+    (QueryPriority.HIGH, 0.20),
+    (QueryPriority.URGENT, 0.05),
+]
+
+def seed(engine, rows: int, patients: int, batch: int = 50_000) -> None:
+    rng = random.Random(42)
+    statuses, status_weights = zip(*STATUS_MIX)
+    priorities, priority_weights = zip(*PRIORITY_MIX)
+    start = datetime(2023, 1, 1)
+
+    with engine.begin() as connection:
+        connection.execute(insert(Patient.__table__), [
+            {"external_id": f"PAT{i:07d}", "name": f"Patient {i}", "email": f"p{i}@example.com", "age": rng.randint(18, 90)}
+            for i in range(1, patients + 1)
+        ])
+
+    for offset in range(0, rows, batch):
+        size = min(batch, rows - offset)
+        with engine.begin() as connection:
+            connection.execute(insert(Query.__table__), [
+                {
+                    "patient_id": rng.randint(1, patients),
+                    "content": "Follow-up question about my glucose readings",
+                    "status": rng.choices(statuses, status_weights)[0].name,
+                    "priority": rng.choices(priorities, priority_weights)[0].name,
+                    "safety_score": rng.choice((0.0, 0.0, 0.0, 0.2, 0.4, 0.8)),
+                    "created_at": start + timedelta(seconds=offset + i),
+                }
+                for i in range(size)
+            ])
+
+def drop_query_indexes(engine) -> None:
+    with engine.begin() as connection:
+        for index in Query.__table__.indexes:
+            connection.execute(text(f"DROP INDEX IF EXISTS {index.name}"))
+
+def workload(session: Session, patients: int):
+    """Statements issued by the list endpoints for a doctor and a patient"""
+    return {
+        "awaiting_review page": lambda: paginate(
+            session, select(Query).where(Query.status == QueryStatus.AWAITING_REVIEW), Query, limit=10, cache=None
+        ),
+        "urgent awaiting review": lambda: session.exec(
+            select(Query)
+            .where(Query.status == QueryStatus.AWAITING_REVIEW, Query.priority == QueryPriority.URGENT)
+            .order_by(Query.created_at)
+            .limit(10)
+        ).all(),
+        "patient history": lambda: paginate(
+            session, select(Query).where(Query.patient_id == random.randint(1, patients)), Query, limit=10, cache=None
+        ),
+        "high safety score count": lambda: session.exec(
+            select(func.count()).select_from(Query).where(Query.safety_score >= 0.6)
+        ).one(),
+    }
+
+def measure(engine, patients: int, repeat: int):
+    results = {}
+    with Session(engine) as session:
+        for name, run in workload(session, patients).items():
+            run()  # warm the page cache
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                run()
+                timings.append(time.perf_counter() - start)
+            results[name] = statistics.median(timings)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--patients", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--db", help="SQLite file to use (defaults to a temporary file)")
+    args = parser.parse_args()
+
+    path = args.db or os.path.join(tempfile.mkdtemp(), "bench_indexes.db")
+    engine = create_engine(f"sqlite:///{path}")
+    SQLModel.metadata.create_all(engine)
+    drop_query_indexes(engine)
+
+    start = time.perf_counter()
+    seed(engine, args.rows, args.patients)
+    print(f"Seeded {args.rows} queries in {time.perf_counter() - start:.1f}s ({path})")
+
+    before = measure(engine, args.patients, args.repeat)
+
+    start = time.perf_counter()
+    with engine.begin() as connection:
+        created = ensure_indexes(connection, "query")
+        connection.execute(text("ANALYZE"))
+    print(f"Created {', '.join(created)} in {time.perf_counter() - start:.1f}s")
+
+    after = measure(engine, args.patients, args.repeat)
+
+    print(f"\n{'statement':<26} {'no index (ms)':>14} {'indexed (ms)':>13} {'speedup':>8}")
+    for name in before:
+        print(f"{name:<26} {before[name] * 1e3:>14.2f} {after[name] * 1e3:>13.2f} {before[name] / after[name]:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Benchmark SQLite write throughput across worker processes per engine profile
+
+Each worker process opens its own engine on a shared scratch database and
+commits ``--transactions`` small write transactions shaped like
+``POST /api/query/`` (a query plus its suggestion job). Runs with 1, 4 and 8
+workers for the old engine (SQLite defaults: rollback journal, full sync)
+and the tuned profile (WAL, ``synchronous=NORMAL``, busy timeout, ...),
+reporting commits per second and transactions that failed with
+"database is locked".
+
+Usage:
+    python -m benchmarks.bench_sqlite_writes [--transactions 300] [--workers 1 4 8]
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+
+from sqlalchemy.exc import OperationalError
+from sqlmodel import Session, SQLModel, create_engine
+
+from app.db.engine_profile import SQLitePragmas, engine_options, install_sqlite_pragmas
+from app.models import Patient, Query, QueryPriority, QueryStatus, SuggestionJob
+
+PROFILES = {
+    "default": None,
+    "tuned": SQLitePragmas(),
+}
+
+def make_engine(url: str, profile: str):
+    if PROFILES[profile] is None:
+        # The engine as it was configured before the tuned profile
+        return create_engine(url, connect_args={"check_same_thread": False})
+    engine = create_engine(url, **engine_options(url))
+    install_sqlite_pragmas(engine, PROFILES[profile])
+    return engine
+
+def write_worker(url: str, profile: str, transactions: int, start_at: float, results) -> None:
+    engine = make_engine(url, profile)
+    committed = locked = 0
+    while time.time() < start_at:
+        time.sleep(0.001)
+    for _ in range(transactions):
+        try:
+            with Session(engine) as session:
+                query = Query(
+                    patient_id=1,
+                    content="Follow-up question about my glucose readings",
+                    status=QueryStatus.PENDING,
+                    priority=QueryPriority.MEDIUM,
+                )
+                session.add(query)
+                session.flush()
+                session.add(SuggestionJob(query_id=query.id))
+                session.commit()
+            committed += 1
+        except OperationalError as e:
+            if "locked" not in str(e):
+                raise
+            locked += 1
+    engine.dispose()
+    results.put((committed, locked))
+
+def run(profile: str, workers: int, transactions: int):
+    path = os.path.join(tempfile.mkdtemp(), f"bench_writes_{profile}.db")
+    url = f"sqlite:///{path}"
+    engine = make_engine(url, profile)
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add(Patient(external_id="PAT1", name="Patient 1", email="p1@example.com", age=40))
+        session.commit()
+    engine.dispose()
+
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    # Give every process time to start so they begin writing together
+    start_at = time.time() + 2.0
+    processes = [
+        context.Process(target=write_worker, args=(url, profile, transactions, start_at, results))
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    outcomes = [results.get() for _ in processes]
+    elapsed = time.time() - start_at
+    for process in processes:
+        process.join()
+
+    committed = sum(c for c, _ in outcomes)
+    locked = sum(l for _, l in outcomes)
+    return committed, locked, elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--transactions", type=int, default=300, help="transactions per worker")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8])
+    args = parser.parse_args()
+
+    print(f"{'profile':<8} {'workers':>7} {'commits':>8} {'locked':>7} {'seconds':>8} {'commits/s':>10}")
+    for workers in args.workers:
+        for profile in PROFILES:
+            committed, locked, elapsed = run(profile, workers, args.transactions)
+            print(f"{profile:<8} {workers:>7} {committed:>8} {locked:>7} {elapsed:>8.2f} {committed / elapsed:>10.0f}")
+
+if __name__ == "__main__":
+    main()
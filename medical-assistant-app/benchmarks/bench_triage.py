@@ -0,0 +1,98 @@
+"""Benchmark keyword triage: the legacy per-call scans vs KeywordTriage
+
+The legacy implementation lowercases the text and runs one ``in`` scan per
+keyword, three times over for ``should_escalate``. KeywordTriage lowers the
+text once and stops the priority scan at the first hit; from
+``TRIE_MIN_KEYWORDS`` keywords on it walks the text once with the trie regex
+instead of one scan per keyword. The "trie" column forces the trie path to
+show where the threshold sits.
+
+Usage:
+    python -m benchmarks.bench_triage [--repeat N]
+"""
+import argparse
+import random
+import time
+from typing import Callable, Dict, List
+
+from app.models import QueryPriority
+from app.utils.triage import (
+    URGENT_KEYWORDS, HIGH_KEYWORDS, MEDIUM_KEYWORDS, SAFETY_WEIGHTS, ESCALATION_THRESHOLD, KeywordTriage,
+)
+
+FILLER_WORDS = (
+    "patient reports mild discomfort after meals and asks about diet vitamins exercise "
+    "sleep glucose readings appointment schedule results normal range follow up"
+).split()
+
+def legacy_triage(text: str, urgent: List[str], high: List[str], medium: List[str], safety: Dict[str, float]):
+    """Reproduce the original scan-per-keyword triage (priority, score, escalation)"""
+    def priority(text_lower):
+        for keywords, level in ((urgent, QueryPriority.URGENT), (high, QueryPriority.HIGH), (medium, QueryPriority.MEDIUM)):
+            for keyword in keywords:
+                if keyword in text_lower:
+                    return level
+        return QueryPriority.LOW
+
+    def score(text_lower):
+        return round(min(sum(weight for keyword, weight in safety.items() if keyword in text_lower), 1.0), 2)
+
+    text_lower = text.lower()
+    p, s = priority(text_lower), score(text_lower)
+    # should_escalate recomputed both from scratch
+    escalate = score(text.lower()) > ESCALATION_THRESHOLD or priority(text.lower()) == QueryPriority.URGENT
+    return p, s, escalate
+
+def synthetic_keywords(base: List[str], factor: int) -> List[str]:
+    """Grow a keyword list by ``factor`` with distinct, realistic-looking phrases"""
+    extra = [f"{word} {suffix}" for word in base for suffix in ("syndrome", "episode", "symptoms", "flare", "attack")]
+    return base + extra[: len(base) * (factor - 1)]
+
+def make_text(n_chars: int, seed: int = 7) -> str:
+    rng = random.Random(seed)
+    words = []
+    size = 0
+    while size < n_chars:
+        word = rng.choice(FILLER_WORDS)
+        words.append(word)
+        size += len(word) + 1
+    # One real hit near the end so no scan can stop early
+    return " ".join(words) + " with chest pain"
+
+def time_call(fn: Callable[[str], object], text: str, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(text)
+    return (time.perf_counter() - start) / repeat
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{'keywords':>9} {'text chars':>11} {'legacy (us)':>12} {'triage (us)':>12} {'speedup':>8} {'trie (us)':>10}")
+    for factor in (1, 3, 5):
+        urgent = synthetic_keywords(URGENT_KEYWORDS, factor)
+        high = synthetic_keywords(HIGH_KEYWORDS, factor)
+        medium = synthetic_keywords(MEDIUM_KEYWORDS, factor)
+        safety_keywords = synthetic_keywords(list(SAFETY_WEIGHTS), factor)
+        safety = {k: SAFETY_WEIGHTS.get(k, 0.2) for k in safety_keywords}
+        triage = KeywordTriage(urgent, high, medium, safety)
+        trie = KeywordTriage(urgent, high, medium, safety, trie_min_keywords=0)
+        legacy = lambda text: legacy_triage(text, urgent, high, medium, safety)
+        n_keywords = len(triage.matcher.keywords)
+
+        for n_chars in (200, 5_000, 100_000):
+            text = make_text(n_chars)
+            assert legacy(text) == tuple(triage.triage(text)) == tuple(trie.triage(text))
+            repeat = max(1, args.repeat * 200 // max(n_chars // 100, 1)) if n_chars < 100_000 else args.repeat // 10 or 1
+            legacy_s = time_call(legacy, text, repeat)
+            triage_s = time_call(triage.triage, text, repeat)
+            trie_s = time_call(trie.triage, text, repeat)
+            print(
+                f"{n_keywords:>9} {len(text):>11} {legacy_s * 1e6:>12.1f} {triage_s * 1e6:>12.1f}"
+                f" {legacy_s / triage_s:>7.2f}x {trie_s * 1e6:>10.1f}"
+            )
+
+if __name__ == "__main__":
+    main()
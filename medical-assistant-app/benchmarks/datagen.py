@@ -0,0 +1,302 @@
+"""Synthetic clinical data for benchmarks
+
+Generates patients, doctors and queries whose wording matches their
+priority (so triage reproduces the mix), plus AI suggestions for queries
+past triage and doctor reviews for answered ones. Rows are written with
+batched Core inserts into a fresh database; indexes, the search tables and
+change tracking are built once the data is in, which is what keeps 10M
+queries practical. Lab reports are produced as TXT or single-page PDF bytes
+for upload benchmarks.
+
+Generation is deterministic for a given ``seed``.
+
+Usage:
+    python -m benchmarks.datagen --db /tmp/bench.db [--patients 100000] [--queries 10000000]
+"""
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, NamedTuple, Tuple
+import argparse
+import random
+import time
+
+from sqlalchemy import insert, text
+from sqlmodel import SQLModel, create_engine
+
+from app.db.migrations import ensure_indexes, run_migrations
+from app.models import AISuggestion, Doctor, Patient, Query, QueryPriority, QueryStatus, Review
+from benchmarks.bench_query_indexes import PRIORITY_MIX, STATUS_MIX, drop_query_indexes
+
+# Wording per priority; each phrase hits that level's triage keywords, and no
+# detail hits any (tests.test_safety checks every combination)
+PRIORITY_PHRASES: Dict[QueryPriority, List[str]] = {
+    QueryPriority.URGENT: [
+        "I have chest pain spreading to my left arm",
+        "My father collapsed and is having difficulty breathing",
+        "I think I am having an allergic reaction, my throat is closing",
+        "I took too many pills by accident, possible overdose",
+        "Head injury after a car accident and now I feel confused",
+    ],
+    QueryPriority.HIGH: [
+        "I have had a fever of 39C and vomiting since last night",
+        "The rash from my new medication is spreading",
+        "I am pregnant and feel dizzy when I stand up",
+        "The swelling in my ankle is getting worse",
+        "There is blood in my urine this morning",
+    ],
+    QueryPriority.MEDIUM: [
+        "I have had a persistent cough for two weeks",
+        "Ongoing lower back pain that makes it hard to sleep",
+        "I feel tired all the time and worried it is my thyroid",
+        "Recurring headaches for the past few days",
+        "My knee is sore after running",
+    ],
+    QueryPriority.LOW: [
+        "Can I take my vitamin D with breakfast?",
+        "When should I schedule my annual check-up?",
+        "Is it fine to exercise the day after a flu shot?",
+        "What are normal cholesterol numbers for my age?",
+        "Do I need to fast before my next lab work?",
+    ],
+}
+
+DETAILS = [
+    "I am {age} years old.",
+    "I have type 2 diabetes and take metformin.",
+    "No known allergies.",
+    "My last appointment was three months ago.",
+    "My home readings were 132/85 last week.",
+    "I had the same problem last winter.",
+]
+
+SPECIALTIES = ["Internal Medicine", "Cardiology", "Family Medicine", "Neurology", "Dermatology", "Pediatrics"]
+
+SUGGESTION_TEXT = (
+    "Summary: {summary}\n"
+    "Considerations: symptoms are consistent with several benign causes; red flags should be excluded.\n"
+    "Suggested approach: assess vital signs, review current medication and arrange follow-up.\n"
+    "Urgency: {priority}"
+)
+
+# Statuses that have been through the suggestion worker, and those a doctor answered
+SUGGESTED_STATUSES = {QueryStatus.AWAITING_REVIEW, QueryStatus.REVIEWED, QueryStatus.COMPLETED}
+REVIEWED_STATUSES = {QueryStatus.REVIEWED, QueryStatus.COMPLETED}
+
+# Share of reviews approving the AI text, and of those sent without edits
+APPROVAL_RATE = 0.8
+UNMODIFIED_RATE = 0.6
+
+LAB_TESTS = [
+    ("Glucose (fasting)", "mg/dL", 70, 99),
+    ("HbA1c", "%", 4.0, 5.6),
+    ("Total cholesterol", "mg/dL", 125, 200),
+    ("LDL", "mg/dL", 50, 100),
+    ("HDL", "mg/dL", 40, 80),
+    ("Triglycerides", "mg/dL", 50, 150),
+    ("Hemoglobin", "g/dL", 12.0, 17.5),
+    ("WBC", "10^3/uL", 4.5, 11.0),
+    ("Creatinine", "mg/dL", 0.6, 1.3),
+    ("TSH", "mIU/L", 0.4, 4.0),
+]
+
+class DataSize(NamedTuple):
+    patients: int
+    doctors: int
+    queries: int
+
+def _pick(rng: random.Random, mix) -> object:
+    values, weights = zip(*mix)
+    return rng.choices(values, weights)[0]
+
+def query_content(rng: random.Random, priority: QueryPriority, age: int) -> str:
+    details = rng.sample(DETAILS, 2)
+    return " ".join([rng.choice(PRIORITY_PHRASES[priority]) + ".", *(d.format(age=age) for d in details)])
+
+def patient_rows(size: DataSize, rng: random.Random) -> List[dict]:
+    return [
+        {"id": i, "external_id": f"PAT{i:08d}", "name": f"Patient {i}", "email": f"patient{i}@example.com",
+         "age": rng.randint(18, 90)}
+        for i in range(1, size.patients + 1)
+    ]
+
+def doctor_rows(size: DataSize, rng: random.Random) -> List[dict]:
+    return [
+        {"id": i, "external_id": f"DOC{i:05d}", "name": f"Dr. Doctor {i}", "email": f"doctor{i}@example.com",
+         "specialty": rng.choice(SPECIALTIES)}
+        for i in range(1, size.doctors + 1)
+    ]
+
+def generate_queries(
+    size: DataSize,
+    rng: random.Random,
+    ages: List[int],
+    batch: int,
+    start: datetime,
+    span: timedelta,
+) -> Iterator[Tuple[List[dict], List[dict], List[dict]]]:
+    """Batches of (query, suggestion, review) rows in id order
+
+    Queries are spread evenly over ``span`` from ``start``; suggestions
+    follow a few minutes later and reviews a few hours later.
+    """
+    step = span / max(1, size.queries)
+    for offset in range(0, size.queries, batch):
+        queries, suggestions, reviews = [], [], []
+        for query_id in range(offset + 1, min(size.queries, offset + batch) + 1):
+            patient_id = rng.randint(1, size.patients)
+            status = _pick(rng, STATUS_MIX)
+            priority = _pick(rng, PRIORITY_MIX)
+            created_at = start + step * (query_id - 1)
+            content = query_content(rng, priority, ages[patient_id - 1])
+            queries.append({
+                "id": query_id,
+                "patient_id": patient_id,
+                "content": content,
+                "status": status.name,
+                "priority": priority.name,
+                "safety_score": 0.8 if priority is QueryPriority.URGENT else rng.choice((0.0, 0.0, 0.2, 0.4)),
+                "created_at": created_at,
+            })
+            if status not in SUGGESTED_STATUSES:
+                continue
+            suggestion = SUGGESTION_TEXT.format(summary=content[:120], priority=priority.value)
+            suggestions.append({
+                "query_id": query_id,
+                "content": suggestion,
+                "model_used": "synthetic",
+                "confidence_score": round(rng.uniform(0.55, 0.95), 2),
+                "created_at": created_at + timedelta(minutes=rng.uniform(0.5, 5)),
+            })
+            if status not in REVIEWED_STATUSES:
+                continue
+            approved = rng.random() < APPROVAL_RATE
+            unmodified = approved and rng.random() < UNMODIFIED_RATE
+            reviews.append({
+                "query_id": query_id,
+                "doctor_id": rng.randint(1, size.doctors),
+                "content": suggestion if unmodified else "Reviewed: " + suggestion.split("\n", 1)[1],
+                "approved": approved,
+                "created_at": created_at + timedelta(hours=rng.expovariate(1 / 6)),
+            })
+        yield queries, suggestions, reviews
+
+def generate_database(
+    url: str,
+    size: DataSize,
+    seed: int = 42,
+    batch: int = 20_000,
+    start: datetime = datetime(2023, 1, 1),
+    span: timedelta = timedelta(days=365),
+) -> Dict[str, float]:
+    """Create and fill a database at ``url``; returns row counts and timings
+
+    The target must be empty: tables are created here and ids are assigned
+    explicitly.
+    """
+    rng = random.Random(seed)
+    engine = create_engine(url)
+    SQLModel.metadata.create_all(engine)
+    # Inserting into an unindexed table and indexing once is far cheaper than maintaining indexes row by row
+    drop_query_indexes(engine)
+
+    started = time.perf_counter()
+    patients = patient_rows(size, rng)
+    with engine.begin() as connection:
+        for offset in range(0, len(patients), batch):
+            connection.execute(insert(Patient.__table__), patients[offset:offset + batch])
+        connection.execute(insert(Doctor.__table__), doctor_rows(size, rng))
+    ages = [p["age"] for p in patients]
+    del patients
+
+    counts = {"patients": size.patients, "doctors": size.doctors, "queries": 0, "suggestions": 0, "reviews": 0}
+    for queries, suggestions, reviews in generate_queries(size, rng, ages, batch, start, span):
+        with engine.begin() as connection:
+            connection.execute(insert(Query.__table__), queries)
+            if suggestions:
+                connection.execute(insert(AISuggestion.__table__), suggestions)
+            if reviews:
+                connection.execute(insert(Review.__table__), reviews)
+        counts["queries"] += len(queries)
+        counts["suggestions"] += len(suggestions)
+        counts["reviews"] += len(reviews)
+    counts["load_seconds"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    with engine.begin() as connection:
+        ensure_indexes(connection, "query")
+    # Search tables, change tracking and the rest of the schema, built over the loaded rows
+    run_migrations(engine)
+    with engine.begin() as connection:
+        connection.execute(text("ANALYZE"))
+    counts["index_seconds"] = time.perf_counter() - started
+    engine.dispose()
+    return counts
+
+def lab_report_text(rng: random.Random, patient: str = "Synthetic Patient") -> str:
+    lines = [
+        "CLINICAL LABORATORY REPORT",
+        f"Patient: {patient}",
+        f"Collected: {datetime(2024, 1, 1) + timedelta(days=rng.randint(0, 365)):%Y-%m-%d}",
+        "",
+        f"{'Test':<20} {'Result':>8} {'Units':<9} Reference",
+    ]
+    for name, units, low, high in rng.sample(LAB_TESTS, rng.randint(4, len(LAB_TESTS))):
+        value = rng.uniform(low * 0.8, high * 1.25)
+        flag = " H" if value > high else " L" if value < low else ""
+        lines.append(f"{name:<20} {value:>8.1f} {units:<9} {low}-{high}{flag}")
+    return "\n".join(lines) + "\n"
+
+def _pdf_escape(line: str) -> str:
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def text_to_pdf(content: str) -> bytes:
+    """Single-page PDF showing ``content`` in Courier, readable by the extraction backends"""
+    stream = "BT /F1 10 Tf 12 TL 50 780 Td " + " ".join(
+        f"({_pdf_escape(line)}) '" for line in content.splitlines()
+    ) + " ET"
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        "<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] /Contents 4 0 R "
+        "/Resources << /Font << /F1 5 0 R >> >> >>",
+        f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream",
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Courier >>",
+    ]
+    body = "%PDF-1.4\n"
+    offsets = []
+    for number, obj in enumerate(objects, 1):
+        offsets.append(len(body))
+        body += f"{number} 0 obj\n{obj}\nendobj\n"
+    xref = len(body)
+    body += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n"
+    body += "".join(f"{offset:010d} 00000 n \n" for offset in offsets)
+    body += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n"
+    return body.encode("latin-1")
+
+def lab_report(rng: random.Random, kind: str = "txt") -> Tuple[str, bytes, str]:
+    """(filename, bytes, content type) of a synthetic lab report"""
+    content = lab_report_text(rng)
+    name = f"lab_report_{rng.randrange(10 ** 8):08d}"
+    if kind == "pdf":
+        return f"{name}.pdf", text_to_pdf(content), "application/pdf"
+    return f"{name}.txt", content.encode(), "text/plain"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", required=True, help="SQLite file to create")
+    parser.add_argument("--patients", type=int, default=10_000)
+    parser.add_argument("--doctors", type=int, default=50)
+    parser.add_argument("--queries", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--batch", type=int, default=20_000)
+    args = parser.parse_args()
+
+    counts = generate_database(
+        f"sqlite:///{args.db}", DataSize(args.patients, args.doctors, args.queries), seed=args.seed, batch=args.batch
+    )
+    print(f"Loaded {counts['patients']} patients, {counts['doctors']} doctors, {counts['queries']} queries, "
+          f"{counts['suggestions']} suggestions and {counts['reviews']} reviews in {counts['load_seconds']:.1f}s "
+          f"({counts['queries'] / counts['load_seconds']:,.0f} queries/s)")
+    print(f"Built indexes, search tables and change tracking in {counts['index_seconds']:.1f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Minimal OpenAI-compatible chat completion server with injected latency
+
+Serves ``POST /v1/chat/completions`` with a canned answer after a
+configurable delay, and fails a configurable fraction of requests with a 500
+so retry behaviour can be exercised.
+
+Usage:
+    python -m benchmarks.mock_openai [--port 8100] [--latency 1.5] [--jitter 0.5] [--error-rate 0.0]
+    OPENAI_BASE_URL=http://127.0.0.1:8100/v1 OPENAI_API_KEY=mock uvicorn app.main:app
+"""
+import argparse
+import asyncio
+import random
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+def create_mock_app(latency: float = 1.0, jitter: float = 0.0, error_rate: float = 0.0) -> FastAPI:
+    app = FastAPI(title="Mock OpenAI")
+    app.state.requests = 0
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        app.state.requests += 1
+        await asyncio.sleep(max(0.0, latency + random.uniform(-jitter, jitter)))
+        if random.random() < error_rate:
+            return JSONResponse(status_code=500, content={"error": {"message": "injected failure", "type": "server_error"}})
+
+        prompt_chars = sum(len(m.get("content") or "") for m in body.get("messages", []))
+        content = "Mock suggestion: monitor symptoms and follow up with your care team."
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "mock"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_chars // 4,
+                "completion_tokens": len(content) // 4,
+                "total_tokens": prompt_chars // 4 + len(content) // 4,
+            },
+        }
+
+    return app
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency", type=float, default=1.0, help="Seconds per completion")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Uniform +/- seconds added to latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 500")
+    args = parser.parse_args()
+
+    uvicorn.run(create_mock_app(args.latency, args.jitter, args.error_rate), host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,26 @@ import streamlit as st
 from typing import Dict, Any, List, Optional
 import requests
 
+def fetch_query_details(api_url: str, query_ids: List[int], include_text: bool = False) -> Dict[int, Dict[str, Any]]:
+    """Fetch queries with their files, AI suggestion and review in one request
+    
+    Args:
+        api_url: Base API URL
+        query_ids: IDs of the queries to fetch
+        include_text: Whether to include extracted file text
+    
+    Returns:
+        Dict[int, Dict[str, Any]]: Query detail dictionaries keyed by query ID
+    """
+    if not query_ids:
+        return {}
+    response = requests.get(
+        f"{api_url}/query/details",
+        params={"ids": list(query_ids), "limit": len(query_ids), "include_text": include_text}
+    )
+    response.raise_for_status()
+    return {q["id"]: q for q in response.json()["queries"]}
+
 def display_query_card(query: Dict[str, Any], api_url: str, show_review: bool = True):
     """Display a patient query in a card format
     
@@ -37,30 +57,27 @@ def display_query_card(query: Dict[str, Any], api_url: str, show_review: bool =
         st.markdown("**Query:**")
         st.write(query['content'])
         
-        # Get and display files if any
-        try:
-            files_response = requests.get(f"{api_url}/file/{query['id']}")
-            if files_response.status_code == 200:
-                files = files_response.json()["files"]
-                if files:
-                    st.markdown("**Attached Files:**")
-                    for file in files:
-                        st.write(f"- {file['filename']} ({file['file_type']}, {file['file_size']} bytes)")
-        except Exception as e:
-            st.warning(f"Could not retrieve files: {str(e)}")
-        
-        # Get and display review if available and requested
-        if show_review and (query['status'] == "reviewed" or query['status'] == "completed"):
+        # Files and review come from /query/details; fetch them only if missing
+        if "files" not in query:
             try:
-                review_response = requests.get(f"{api_url}/review/{query['id']}")
-                if review_response.status_code == 200:
-                    review = review_response.json()
-                    st.markdown("---")
-                    st.markdown("**Doctor's Response:**")
-                    st.write(review["content"])
-                    st.write(f"*Reviewed by Doctor ID: {review['doctor_id']}*")
+                query = {**query, **fetch_query_details(api_url, [query["id"]]).get(query["id"], {})}
             except Exception as e:
-                st.warning(f"Could not retrieve review: {str(e)}")
+                st.warning(f"Could not retrieve query details: {str(e)}")
+        
+        # Display files if any
+        files = query.get("files") or []
+        if files:
+            st.markdown("**Attached Files:**")
+            for file in files:
+                st.write(f"- {file['filename']} ({file['file_type']}, {file['file_size']} bytes)")
+        
+        # Display review if available and requested
+        review = query.get("review")
+        if show_review and review and (query['status'] == "reviewed" or query['status'] == "completed"):
+            st.markdown("---")
+            st.markdown("**Doctor's Response:**")
+            st.write(review["content"])
+            st.write(f"*Reviewed by Doctor ID: {review['doctor_id']}*")
         
         st.markdown('</div>', unsafe_allow_html=True)
 
@@ -76,6 +93,15 @@ def display_query_list(queries: List[Dict[str, Any]], api_url: str, show_reviews
         st.info("No queries found.")
         return
     
+    # Load files and reviews for the whole list in one request instead of one per card
+    missing = [q["id"] for q in queries if "files" not in q]
+    if missing:
+        try:
+            details = fetch_query_details(api_url, missing)
+            queries = [details.get(q["id"], q) for q in queries]
+        except Exception as e:
+            st.warning(f"Could not retrieve query details: {str(e)}")
+    
     for query in queries:
         display_query_card(query, api_url, show_reviews)
 
@@ -1,31 +1,45 @@
 import pytest
 from fastapi.testclient import TestClient
-from sqlmodel import Session, SQLModel, create_engine
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+from sqlmodel import Session, SQLModel, create_engine, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlmodel.pool import StaticPool
 
 from app.main import app
-from app.db.database import get_session
+from app.db.database import get_async_session
+from app.db.change_tracking import install_change_tracking
 from app.models import Patient, Doctor, Query, QueryStatus, QueryPriority
 
-# Create in-memory SQLite database for testing
+# Create a file-backed SQLite database for testing, shared by the sync test
+# session and the async sessions the API routes use
+@pytest.fixture(name="db_path")
+def db_path_fixture(tmp_path):
+    return tmp_path / "test.db"
+
 @pytest.fixture(name="session")
-def session_fixture():
-    engine = create_engine(
-        "sqlite://",
-        connect_args={"check_same_thread": False},
-        poolclass=StaticPool,
-    )
+def session_fixture(db_path):
+    engine = create_engine(f"sqlite:///{db_path}", connect_args={"check_same_thread": False})
     SQLModel.metadata.create_all(engine)
+    with engine.begin() as connection:
+        install_change_tracking(connection)
     with Session(engine) as session:
         yield session
+    engine.dispose()
 
 # Create test client with dependency override
+@pytest.fixture(name="async_engine")
+def async_engine_fixture(session: Session, db_path):
+    # No pooling: TestClient may run each request on a different event loop
+    return create_async_engine(f"sqlite+aiosqlite:///{db_path}", poolclass=NullPool)
+
 @pytest.fixture(name="client")
-def client_fixture(session: Session):
-    def get_session_override():
-        return session
+def client_fixture(async_engine):
+    async def get_session_override():
+        async with AsyncSession(async_engine, expire_on_commit=False) as session:
+            yield session
     
-    app.dependency_overrides[get_session] = get_session_override
+    app.dependency_overrides[get_async_session] = get_session_override
     client = TestClient(app)
     yield client
     app.dependency_overrides.clear()
@@ -152,4 +166,675 @@ def test_create_review(client: TestClient, test_data, session: Session):
     
     # Check that query status was updated
     query_response = client.get(f"/api/query/{query.id}")
-    assert query_response.json()["status"] == "reviewed"
\ No newline at end of file
+    assert query_response.json()["status"] == "reviewed"
+
+# Test re-triaging queries in bulk
+def test_batch_triage(client: TestClient, test_data, session: Session):
+    urgent = Query(
+        patient_id=test_data["patient"].id,
+        content="I think I'm having a heart attack",
+        status=QueryStatus.REVIEWED,
+        priority=QueryPriority.LOW
+    )
+    session.add(urgent)
+    session.commit()
+    
+    response = client.post("/api/triage/batch", json={"chunk_size": 2})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["scanned"] == 3
+    assert data["chunks"] == 2
+    assert data["updated"] == 3
+    
+    session.refresh(urgent)
+    assert urgent.priority == QueryPriority.URGENT
+    assert urgent.status == QueryStatus.REVIEWED
+    
+    # Nothing changed since the last run, so nothing is rewritten
+    response = client.post("/api/triage/batch", json={"status": "reviewed"})
+    assert response.json()["scanned"] == 1
+    assert response.json()["updated"] == 0
+
+# Test keyset pagination over the query list
+def test_get_queries_cursor_pagination(client: TestClient, test_data):
+    first = client.get("/api/query/", params={"limit": 1}).json()
+    assert first["total"] == 2
+    assert len(first["queries"]) == 1
+    assert first["next_cursor"]
+    
+    second = client.get("/api/query/", params={"limit": 1, "cursor": first["next_cursor"]}).json()
+    assert second["total"] == 2
+    assert [q["id"] for q in second["queries"]] != [q["id"] for q in first["queries"]]
+    
+    third = client.get("/api/query/", params={"limit": 1, "cursor": second["next_cursor"]}).json()
+    assert third["queries"] == []
+    assert third["next_cursor"] is None
+    
+    response = client.get("/api/query/", params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
+
+# Test that migrations bring an old database up to the current schema
+def test_run_migrations_adds_missing_indexes():
+    from sqlalchemy import inspect, text
+    from app.db.migrations import MIGRATIONS, run_migrations
+    
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(text("DROP INDEX ix_query_review_queue"))
+        connection.execute(text("CREATE INDEX ix_query_status_priority_created_at ON query (status, priority, created_at)"))
+        connection.execute(text('ALTER TABLE "file" DROP COLUMN text_length'))
+        connection.execute(text(
+            "INSERT INTO file (query_id, filename, file_path, file_type, file_size, text_content, created_at) "
+            "VALUES (1, 'a.txt', '/a.txt', 'text/plain', 5, 'héllo', '2024-01-01 00:00:00')"
+        ))
+        connection.execute(text(
+            "INSERT INTO blob (sha256, path, size, ref_count, text_content, created_at) "
+            "VALUES ('d1', '/b.txt', 3, 1, 'abc', '2024-01-01 00:00:00')"
+        ))
+        connection.execute(text(
+            "INSERT INTO file (query_id, filename, file_path, file_type, file_size, sha256, text_content, created_at) "
+            "VALUES (1, 'b.txt', '/b.txt', 'text/plain', 3, 'd1', 'abc', '2024-01-01 00:00:00')"
+        ))
+    
+    applied = run_migrations(engine)
+    assert [m.version for m in applied] == [m.version for m in MIGRATIONS]
+    index_names = {ix["name"] for ix in inspect(engine).get_indexes("query")}
+    assert "ix_query_review_queue" in index_names
+    # The index the review queue index made redundant is dropped
+    assert "ix_query_status_priority_created_at" not in index_names
+    # Existing file rows get their text length backfilled
+    with engine.connect() as connection:
+        rows = connection.execute(text('SELECT filename, text_length, text_content FROM "file" ORDER BY id')).all()
+    assert [row.text_length for row in rows] == [5, 3]
+    # Only the row without a digest keeps its own copy of the text
+    assert [row.text_content for row in rows] == ["héllo", None]
+    
+    # Already applied migrations are not run again
+    assert run_migrations(engine) == []
+
+# Test the priority-ordered review queue and claiming
+def test_review_queue_order_and_claims(client: TestClient, test_data, session: Session):
+    patient_id = test_data["patient"].id
+    low = Query(patient_id=patient_id, content="Diet question", status=QueryStatus.AWAITING_REVIEW,
+                priority=QueryPriority.LOW, safety_score=0.0)
+    urgent = Query(patient_id=patient_id, content="Chest pain", status=QueryStatus.AWAITING_REVIEW,
+                   priority=QueryPriority.URGENT, safety_score=0.2)
+    high_safe = Query(patient_id=patient_id, content="Fever", status=QueryStatus.AWAITING_REVIEW,
+                      priority=QueryPriority.HIGH, safety_score=0.0)
+    high_risky = Query(patient_id=patient_id, content="Fever and violent thoughts", status=QueryStatus.AWAITING_REVIEW,
+                       priority=QueryPriority.HIGH, safety_score=0.4)
+    other_doctor = Doctor(external_id="doc456", name="Other Doctor", email="other@example.com")
+    session.add_all([low, urgent, high_safe, high_risky, other_doctor])
+    session.commit()
+    
+    response = client.get("/api/queue/")
+    assert response.status_code == 200
+    assert [q["id"] for q in response.json()["queries"]] == [urgent.id, high_risky.id, high_safe.id, low.id]
+    
+    doctor_id = test_data["doctor"].id
+    claimed = client.post("/api/queue/claim", json={"doctor_id": doctor_id, "limit": 2}).json()["queries"]
+    assert [q["id"] for q in claimed] == [urgent.id, high_risky.id]
+    assert all(q["claimed_by"] == doctor_id for q in claimed)
+    
+    # Claimed queries are hidden from other doctors and cannot be claimed twice
+    response = client.get("/api/queue/", params={"doctor_id": other_doctor.id})
+    assert [q["id"] for q in response.json()["queries"]] == [high_safe.id, low.id]
+    response = client.post(f"/api/queue/{urgent.id}/claim", json={"doctor_id": other_doctor.id})
+    assert response.status_code == 409
+    response = client.post(
+        f"/api/review/{urgent.id}",
+        json={"doctor_id": other_doctor.id, "content": "Call 911", "approved": True}
+    )
+    assert response.status_code == 409
+    
+    # Released queries go back to the queue
+    response = client.post(f"/api/queue/{urgent.id}/release", json={"doctor_id": doctor_id})
+    assert response.status_code == 200
+    assert response.json()["claimed_by"] is None
+    response = client.post(f"/api/queue/{urgent.id}/claim", json={"doctor_id": other_doctor.id})
+    assert response.status_code == 200
+
+# Test the aggregated query detail list issues a constant number of statements
+def test_get_query_details(client: TestClient, test_data, session: Session, async_engine):
+    from sqlalchemy import event
+    from app.models import File, AISuggestion, Review
+    
+    for query in test_data["queries"]:
+        session.add(File(query_id=query.id, filename="labs.txt", file_path="/tmp/labs.txt",
+                         file_type="text/plain", file_size=10, text_content="glucose 110"))
+        session.add(AISuggestion(query_id=query.id, content="Monitor symptoms", model_used="demo_model"))
+    session.add(Review(query_id=test_data["queries"][0].id, doctor_id=test_data["doctor"].id,
+                       content="Rest and fluids", approved=True))
+    session.commit()
+    
+    statements = []
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    
+    # Routes run on the async engine; its events fire on the wrapped sync engine
+    engine = async_engine.sync_engine
+    event.listen(engine, "before_cursor_execute", count_statement)
+    try:
+        response = client.get("/api/query/details", params={"include_text": True})
+    finally:
+        event.remove(engine, "before_cursor_execute", count_statement)
+    
+    assert response.status_code == 200
+    data = response.json()
+    assert data["total"] == 2
+    first, second = data["queries"]
+    assert first["files"][0]["text_content"] == "glucose 110"
+    assert first["ai_suggestion"]["content"] == "Monitor symptoms"
+    assert first["review"]["content"] == "Rest and fluids"
+    assert second["review"] is None
+    # change counters (ETag), COUNT, page, files, suggestions, reviews
+    assert len(statements) == 6
+    
+    response = client.get(f"/api/query/{first['id']}/details")
+    assert response.status_code == 200
+    assert response.json()["files"][0]["text_content"] is None
+
+# Test that suggestion generation runs as a background job
+def test_suggestion_job_pipeline(client: TestClient, test_data, session: Session, monkeypatch):
+    import asyncio
+    from app.jobs.worker import drain_jobs, save_suggestion
+    from app.models import AISuggestion
+    
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    response = client.post(
+        "/api/query/",
+        json={"patient_id": test_data["patient"].id, "content": "I have had a fever since yesterday"}
+    )
+    query_id = response.json()["id"]
+    assert response.json()["status"] == "pending"
+    assert client.get("/api/jobs/metrics").json()["depth"]["queued"] == 1
+    
+    # Database steps run in the thread pool, never on the event loop's thread
+    from app.jobs import worker
+    import threading
+    threads = []
+    claim_job = worker.claim_job
+    monkeypatch.setattr(worker, "claim_job", lambda s: threads.append(threading.current_thread()) or claim_job(s))
+    monkeypatch.setattr(worker, "save_suggestion", lambda *args: threads.append(threading.current_thread()) or save_suggestion(*args))
+    assert asyncio.run(drain_jobs(session)) == 1
+    assert threads and threading.main_thread() not in threads
+    
+    assert client.get(f"/api/query/{query_id}").json()["status"] == "awaiting_review"
+    suggestion = session.exec(select(AISuggestion).where(AISuggestion.query_id == query_id)).one()
+    assert "fever" in suggestion.content.lower()
+    metrics = client.get("/api/jobs/metrics").json()
+    assert metrics["depth"]["succeeded"] == 1
+    assert metrics["sample_size"] == 1
+
+# Test that a job failing every attempt is dead-lettered and still reaches doctors
+def test_suggestion_job_dead_letter(client: TestClient, test_data, session: Session, monkeypatch):
+    import asyncio
+    from app.jobs import queue as job_queue
+    from app.jobs import worker
+    from app.jobs.worker import drain_jobs
+    
+    def broken_suggestion(content):
+        raise RuntimeError("model unavailable")
+    
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    monkeypatch.setattr(job_queue, "JOB_MAX_ATTEMPTS", 1)
+    monkeypatch.setattr(worker, "demo_suggestion", broken_suggestion)
+    
+    query_id = client.post(
+        "/api/query/",
+        json={"patient_id": test_data["patient"].id, "content": "Question about my test results"}
+    ).json()["id"]
+    asyncio.run(drain_jobs(session))
+    
+    dead = client.get("/api/jobs/", params={"status": "dead"}).json()
+    assert dead["total"] == 1
+    assert "model unavailable" in dead["jobs"][0]["last_error"]
+    assert client.get(f"/api/query/{query_id}").json()["status"] == "awaiting_review"
+    
+    response = client.post(f"/api/jobs/{dead['jobs'][0]['id']}/retry")
+    assert response.status_code == 200
+    assert response.json()["status"] == "queued"
+
+# Test that retrying a dead job after the doctor reviewed the query leaves the query alone
+def test_retried_job_after_review_skips_query(client: TestClient, test_data, session: Session, monkeypatch):
+    import asyncio
+    from app.jobs import queue as job_queue
+    from app.jobs import worker
+    from app.jobs.worker import drain_jobs
+    
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    monkeypatch.setattr(job_queue, "JOB_MAX_ATTEMPTS", 1)
+    monkeypatch.setattr(worker, "demo_suggestion", lambda content: 1 / 0)
+    query_id = client.post(
+        "/api/query/",
+        json={"patient_id": test_data["patient"].id, "content": "Question about my test results"}
+    ).json()["id"]
+    asyncio.run(drain_jobs(session))
+    job_id = client.get("/api/jobs/", params={"status": "dead"}).json()["jobs"][0]["id"]
+    
+    review = client.post(f"/api/review/{query_id}", json={
+        "doctor_id": test_data["doctor"].id, "content": "Please book an appointment", "approved": True,
+    })
+    assert review.status_code == 201
+    
+    assert client.post(f"/api/jobs/{job_id}/retry").status_code == 200
+    assert asyncio.run(drain_jobs(session)) == 1
+    assert client.get(f"/api/query/{query_id}").json()["status"] == "reviewed"
+    assert client.get("/api/jobs/metrics").json()["depth"]["succeeded"] == 1
+
+# Test regenerating a suggestion replaces the stored one
+def test_regenerate_suggestion(client: TestClient, test_data, session: Session, monkeypatch):
+    from app.models import AISuggestion
+    
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    query = test_data["queries"][0]
+    session.add(AISuggestion(query_id=query.id, content="Old suggestion", model_used="demo_model"))
+    session.commit()
+    
+    response = client.post(f"/api/suggestion/{query.id}/regenerate")
+    assert response.status_code == 200
+    assert "headache" in response.json()["content"].lower()
+    assert len(session.exec(select(AISuggestion).where(AISuggestion.query_id == query.id)).all()) == 1
+    
+    assert client.post("/api/suggestion/9999/regenerate").status_code == 404
+    assert client.get("/api/suggestion/cache/stats").status_code == 200
+
+# Test uploads are streamed to disk, hashed and size-limited
+def test_upload_file_streaming(client: TestClient, test_data, monkeypatch, tmp_path):
+    import hashlib
+    from app.routes import file as file_routes
+    from app.utils import text_extraction
+    from app.utils.blob_store import BlobStore
+    
+    store = BlobStore(str(tmp_path))
+    monkeypatch.setattr(text_extraction, "_engine", text_extraction.ExtractionEngine(max_workers=0))
+    monkeypatch.setattr(file_routes, "blob_store", store)
+    monkeypatch.setattr(file_routes, "MAX_FILE_SIZE", 1024)
+    query_id = test_data["queries"][0].id
+    
+    body = b"Blood pressure 120/80\n" * 20
+    response = client.post(
+        f"/api/file/{query_id}/upload",
+        files={"file": ("readings.txt", body, "text/plain")}
+    )
+    assert response.status_code == 201
+    data = response.json()
+    assert data["file_size"] == len(body)
+    assert data["sha256"] == hashlib.sha256(body).hexdigest()
+    assert data["text_content"].startswith("Blood pressure")
+    
+    response = client.post(
+        f"/api/file/{query_id}/upload",
+        files={"file": ("big.txt", b"x" * 2048, "text/plain")}
+    )
+    assert response.status_code == 413
+    # The oversized upload leaves no partial file behind
+    assert list((tmp_path / ".tmp").iterdir()) == []
+
+# Test oversized upload bodies are refused before the multipart parser reads them
+def test_upload_limit_middleware():
+    import asyncio
+    import httpx
+    from fastapi import FastAPI, UploadFile
+    from app.utils.uploads import UploadLimitMiddleware
+    
+    spooled = []
+    inner = FastAPI()
+    
+    @inner.post("/api/file/{query_id}/upload")
+    async def upload(query_id: int, file: UploadFile):
+        spooled.append(file.filename)
+        return {"ok": True}
+    
+    multipart = (b"--b\r\nContent-Disposition: form-data; name=\"file\"; filename=\"a.txt\"\r\n\r\n"
+                 + b"x" * 4096 + b"\r\n--b--\r\n")
+    headers = {"Content-Type": "multipart/form-data; boundary=b"}
+    
+    async def chunked():
+        for start in range(0, len(multipart), 512):
+            yield multipart[start:start + 512]
+    
+    async def run():
+        transport = httpx.ASGITransport(app=UploadLimitMiddleware(inner, max_body=1024))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            # Declared too large: refused without reading the body
+            declared = await http.post("/api/file/1/upload", content=multipart, headers=headers)
+            # No Content-Length: cut off once the limit is passed
+            streamed = await http.post("/api/file/1/upload", content=chunked(), headers=headers)
+        transport = httpx.ASGITransport(app=UploadLimitMiddleware(inner, max_body=len(multipart)))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            fits = await http.post("/api/file/1/upload", content=chunked(), headers=headers)
+        return declared, streamed, fits
+    
+    declared, streamed, fits = asyncio.run(run())
+    assert declared.status_code == 413
+    assert streamed.status_code == 413
+    assert "too large" in streamed.json()["detail"]
+    assert fits.status_code == 200
+    assert spooled == ["a.txt"]
+
+# Test identical uploads share one blob that is deleted with its last reference
+def test_upload_file_deduplication(client: TestClient, test_data, session: Session, monkeypatch, tmp_path):
+    import os
+    from app.models import Blob
+    from app.routes import file as file_routes
+    from app.utils import text_extraction
+    from app.utils.blob_store import BlobStore
+    
+    engine = text_extraction.ExtractionEngine(max_workers=0)
+    calls = []
+    original_extract = engine.extract
+    async def counting_extract(*args, **kwargs):
+        calls.append(args)
+        return await original_extract(*args, **kwargs)
+    monkeypatch.setattr(engine, "extract", counting_extract)
+    monkeypatch.setattr(text_extraction, "_engine", engine)
+    monkeypatch.setattr(file_routes, "blob_store", BlobStore(str(tmp_path)))
+    
+    body = b"HbA1c 6.1%"
+    uploads = [
+        client.post(
+            f"/api/file/{query.id}/upload",
+            files={"file": ("labs.txt", body, "text/plain")}
+        ).json()
+        for query in test_data["queries"]
+    ]
+    assert uploads[0]["sha256"] == uploads[1]["sha256"]
+    assert uploads[1]["text_content"] == "HbA1c 6.1%"
+    assert len(calls) == 1  # the duplicate was not parsed again
+    
+    # The text is stored once, on the blob, and read through it
+    from sqlalchemy import text
+    assert session.exec(text('SELECT count(*) FROM "file" WHERE text_content IS NOT NULL')).one()[0] == 0
+    assert client.get(f"/api/file/{uploads[1]['id']}/text").json()["text"] == "HbA1c 6.1%"
+    
+    blob = session.get(Blob, uploads[0]["sha256"])
+    assert blob.ref_count == 2
+    digest, blob_path = blob.sha256, blob.path
+    assert blob_path == os.path.join(str(tmp_path), digest[:2], digest[2:4], digest)
+    
+    assert client.delete(f"/api/file/{uploads[0]['id']}").status_code == 204
+    session.expire_all()
+    assert session.get(Blob, digest).ref_count == 1
+    assert os.path.exists(blob_path)
+    
+    assert client.delete(f"/api/file/{uploads[1]['id']}").status_code == 204
+    session.expire_all()
+    assert session.get(Blob, digest) is None
+    assert not os.path.exists(blob_path)
+
+# Test a failed extraction is not cached on the blob: the next duplicate upload retries it
+def test_upload_retries_failed_extraction(client: TestClient, test_data, session: Session, monkeypatch, tmp_path):
+    from app.models import Blob
+    from app.routes import file as file_routes
+    from app.utils import text_extraction
+    from app.utils.blob_store import BlobStore
+    from app.utils.text_extraction import ExtractionResult
+    
+    engine = text_extraction.ExtractionEngine(max_workers=0)
+    calls = []
+    original_extract = engine.extract
+    async def flaky_extract(*args, **kwargs):
+        calls.append(args)
+        if len(calls) == 1:
+            # What the engine returns when a worker hangs past the deadline
+            return ExtractionResult("", 0, 0, True, "text", failed=True)
+        return await original_extract(*args, **kwargs)
+    monkeypatch.setattr(engine, "extract", flaky_extract)
+    monkeypatch.setattr(text_extraction, "_engine", engine)
+    monkeypatch.setattr(file_routes, "blob_store", BlobStore(str(tmp_path)))
+    
+    from app.db.search import install_search
+    with session.get_bind().begin() as connection:
+        install_search(connection)
+    
+    query_id = test_data["queries"][0].id
+    def upload():
+        return client.post(f"/api/file/{query_id}/upload", files={"file": ("labs.txt", b"LDL 3.4 mmol/L", "text/plain")}).json()
+    
+    first = upload()
+    assert not first["text_content"]
+    assert session.get(Blob, first["sha256"]).extraction_backend is None
+    assert upload()["text_content"] == "LDL 3.4 mmol/L"
+    assert upload()["text_content"] == "LDL 3.4 mmol/L"
+    assert len(calls) == 2  # retried once, then cached
+    
+    # The earlier upload reads the retried text through the shared blob
+    listed = {f["id"]: f for f in client.get(f"/api/file/{query_id}").json()["files"]}
+    assert listed[first["id"]]["text_length"] == len("LDL 3.4 mmol/L")
+    assert client.get(f"/api/file/{first['id']}/text").json()["text"] == "LDL 3.4 mmol/L"
+    found = client.get("/api/search/", params={"q": "LDL", "sources": ["file"]}).json()["results"]
+    assert {r["source_id"] for r in found} == set(listed)
+    
+# Test file listings leave out the text and the text endpoint serves slices of it
+def test_file_text_ranges(client: TestClient, test_data, session: Session):
+    from app.models import File
+    
+    pages = ["Page one: glucose 5.4", "Page two: HbA1c 6.1%", "Page three: lipids normal"]
+    text = "\f".join(pages)
+    db_file = File(
+        query_id=test_data["queries"][0].id,
+        filename="labs.pdf",
+        file_path="/nonexistent/labs.pdf",
+        file_type="application/pdf",
+        file_size=1234,
+        text_content=text
+    )
+    session.add(db_file)
+    session.commit()
+    
+    listed = client.get(f"/api/file/{db_file.query_id}").json()["files"][0]
+    assert listed["text_content"] is None
+    assert listed["text_length"] == len(text)
+    
+    response = client.get(f"/api/file/{db_file.id}/text", params={"offset": 5, "limit": 3})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["text"] == text[5:8]
+    assert data["total_length"] == len(text)
+    assert data["has_more"]
+    
+    data = client.get(f"/api/file/{db_file.id}/text", params={"page": 2}).json()
+    assert data["text"] == pages[1]
+    assert data["total_pages"] == 3
+    assert data["offset"] == text.index(pages[1])
+    assert data["has_more"]
+    
+    data = client.get(f"/api/file/{db_file.id}/text", params={"page": 2, "pages": 2}).json()
+    assert data["text"] == "\f".join(pages[1:])
+    assert not data["has_more"]
+    
+    assert client.get("/api/file/9999/text").status_code == 404
+    assert client.get(f"/api/file/{db_file.id}/text", params={"limit": 0}).status_code == 422
+
+# Test full-text search stays in sync with its sources and can catch up after bulk loads
+def test_search(client: TestClient, test_data, session: Session):
+    from app.models import AISuggestion, File
+    from app.db.search import drop_search_triggers, reindex
+    
+    # Installs the indexes and triggers and indexes the existing test queries
+    engine = session.get_bind()
+    reindex(engine)
+    
+    query = test_data["queries"][0]
+    suggestion = AISuggestion(query_id=query.id, content="Consider tension-type headaches", model_used="demo_model")
+    session.add(suggestion)
+    session.add(File(
+        query_id=query.id, filename="labs.pdf", file_path="/nonexistent", file_type="application/pdf",
+        file_size=1, text_content="Fasting glucose 7.2 mmol/L"
+    ))
+    session.commit()
+    
+    data = client.get("/api/search/", params={"q": "headache"}).json()
+    assert data["total"] == 2
+    assert {r["source"] for r in data["results"]} == {"query", "suggestion"}
+    assert all(r["query_id"] == query.id for r in data["results"])
+    assert "**" in data["results"][0]["snippet"]
+    
+    # Pages are cut from the merged ranking; the total can be skipped
+    pages = [client.get("/api/search/", params={"q": "headache", "skip": skip, "limit": 1}).json() for skip in (0, 1)]
+    assert [r for page in pages for r in page["results"]] == data["results"]
+    assert client.get("/api/search/", params={"q": "headache", "include_total": False}).json()["total"] is None
+    
+    # Prefix match on the last word, restricted to one source
+    data = client.get("/api/search/", params={"q": "gluc", "sources": ["file"]}).json()
+    assert [r["source"] for r in data["results"]] == ["file"]
+    
+    # Updates and deletes are picked up by the triggers
+    suggestion.content = "Consider migraine"
+    session.add(suggestion)
+    session.commit()
+    assert client.get("/api/search/", params={"q": "tension"}).json()["total"] == 0
+    assert client.get("/api/search/", params={"q": "migraine"}).json()["total"] == 1
+    
+    # Rows written without triggers are found by an incremental reindex
+    with engine.begin() as connection:
+        drop_search_triggers(connection)
+    session.add(Query(patient_id=1, content="Persistent dizziness when standing", status=QueryStatus.PENDING, priority=QueryPriority.LOW))
+    session.commit()
+    assert client.get("/api/search/", params={"q": "dizziness"}).json()["total"] == 0
+    stats = reindex(engine)
+    assert stats["sources"]["query"]["indexed"] == 1
+    assert client.get("/api/search/", params={"q": "dizziness"}).json()["total"] == 1
+    
+    assert client.get("/api/search/", params={"q": "AND OR (\""}).json()["total"] == 0
+    assert client.get("/api/search/", params={"q": "x", "sources": ["bogus"]}).status_code == 400
+
+# Test search is skipped by migrations and reported as unavailable on databases without FTS5
+def test_search_needs_sqlite(client: TestClient, monkeypatch):
+    from sqlalchemy import create_mock_engine
+    from app.db import search as search_module
+    from app.db.migrations import MIGRATIONS
+    
+    statements = []
+    postgres = create_mock_engine("postgresql://", lambda sql, *args, **kwargs: statements.append(sql))
+    next(m for m in MIGRATIONS if m.version == 6).apply(postgres)
+    assert statements == []
+    
+    monkeypatch.setattr(search_module, "search_supported", lambda connection: False)
+    response = client.get("/api/search/", params={"q": "headache"})
+    assert response.status_code == 501
+
+# Test the diagnostics endpoint reports the pragmas in effect on the route engine
+def test_database_diagnostics(client: TestClient, async_engine):
+    from app.db.engine_profile import SQLitePragmas, install_sqlite_pragmas
+    
+    install_sqlite_pragmas(async_engine.sync_engine, SQLitePragmas(busy_timeout=1234))
+    response = client.get("/api/diagnostics/database")
+    assert response.status_code == 200
+    engine_info = response.json()["engine"]
+    assert engine_info["driver"] == "aiosqlite"
+    assert engine_info["pool_class"] == "NullPool"
+    assert engine_info["pragmas"]["journal_mode"] == "wal"
+    assert engine_info["pragmas"]["synchronous"] == 1  # NORMAL
+    assert engine_info["pragmas"]["busy_timeout"] == 1234
+    assert engine_info["pragmas"]["temp_store"] == 2  # MEMORY
+    
+    sql_profile = client.get("/api/diagnostics/sql")
+    assert sql_profile.status_code == 200
+    assert set(sql_profile.json()) == {"mode", "routes", "n_plus_one", "slow_statements"}
+
+# Test list endpoints answer a matching If-None-Match with 304 until a tracked table changes
+def test_list_etags(client: TestClient, test_data, session: Session):
+    from app.models import Review
+    
+    response = client.get("/api/query/", params={"limit": 5})
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    assert response.headers["cache-control"] == "no-cache"
+    
+    cached = client.get("/api/query/", params={"limit": 5}, headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.content == b""
+    assert cached.headers["etag"] == etag
+    # Another page or filter is a different resource
+    assert client.get("/api/query/", params={"limit": 2}, headers={"If-None-Match": etag}).status_code == 200
+    
+    reviews_etag = client.get("/api/review/").headers["etag"]
+    files_etag = client.get(f"/api/file/{test_data['queries'][0].id}").headers["etag"]
+    
+    # A write from outside the API (worker, script) still invalidates the tag
+    query = test_data["queries"][0]
+    query.content = "Headache is now worse"
+    session.add(query)
+    session.commit()
+    changed = client.get("/api/query/", params={"limit": 5}, headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+    assert changed.json()["queries"][0]["content"] == "Headache is now worse"
+    
+    # Unrelated tables leave the review listing cached; the file listing also depends on the query
+    assert client.get("/api/review/", headers={"If-None-Match": reviews_etag}).status_code == 304
+    assert client.get(f"/api/file/{query.id}", headers={"If-None-Match": files_etag}).status_code == 200
+    
+    session.add(Review(query_id=query.id, doctor_id=test_data["doctor"].id, content="Rest", approved=True))
+    session.commit()
+    assert client.get("/api/review/", headers={"If-None-Match": reviews_etag}).status_code == 200
+
+# Test state changes made through the API are published to event-stream subscribers
+def test_query_events_published(client: TestClient, test_data, monkeypatch):
+    from app.events import broadcaster as events
+    
+    broadcaster = events.EventBroadcaster()
+    monkeypatch.setattr(events, "_broadcaster", broadcaster)
+    
+    created = client.post("/api/query/", json={"patient_id": 1, "content": "Chest pain since this morning"}).json()
+    assert client.post(f"/api/triage/{created['id']}").status_code == 200
+    review = client.post(f"/api/review/{created['id']}", json={
+        "doctor_id": test_data["doctor"].id, "content": "Go to the ER", "approved": False
+    })
+    assert review.status_code == 201
+    
+    published = broadcaster.replay_after(f"{broadcaster.epoch}-0")
+    assert [e.type for e in published] == ["query.created", "query.triaged", "query.reviewed"]
+    assert all(e.data["query_id"] == created["id"] and e.data["patient_id"] == 1 for e in published)
+    assert published[1].data["status"] == "awaiting_review"
+    assert published[2].data["status"] == "reviewed"
+    assert published[2].data["review_id"] == review.json()["id"]
+
+# Test the Prometheus endpoint reports per-route latency, SQL work and the workflow KPIs
+def test_metrics_endpoint(client: TestClient, test_data, session: Session, async_engine):
+    from app.metrics import kpi_cache
+    from app.metrics.instruments import HTTP_REQUEST_DB_STATEMENTS, instrument_engine
+    from app.models import AISuggestion, Review
+    
+    instrument_engine(async_engine.sync_engine, "test")
+    query = test_data["queries"][0]
+    session.add(AISuggestion(query_id=query.id, content="Rest and fluids", confidence_score=0.7, model_used="gpt-4"))
+    session.add(Review(query_id=query.id, doctor_id=test_data["doctor"].id, content="Rest and fluids", approved=True))
+    session.commit()
+    
+    before = HTTP_REQUEST_DB_STATEMENTS.count(method="GET", route="/api/query/{query_id}")
+    assert client.get(f"/api/query/{query.id}").status_code == 200
+    assert HTTP_REQUEST_DB_STATEMENTS.count(method="GET", route="/api/query/{query_id}") == before + 1
+    
+    kpi_cache.invalidate()
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = response.text
+    assert 'http_request_duration_seconds_count{method="GET",route="/api/query/{query_id}",status="200"}' in text
+    assert "# TYPE http_requests_in_flight gauge" in text
+    assert 'db_statements_total{engine="test"}' in text
+    assert 'workflow_query_volume{window="1h"} 2' in text
+    assert 'workflow_open_queries{status="processing"} 1' in text
+    assert "workflow_ai_suggestion_approval_rate 1" in text
+    assert 'workflow_alert{alert="low_approval_rate"} 0' in text
+
+# Test that concurrent scrapes of a stale KPI cache don't block each other or the loop
+def test_metrics_concurrent_scrapes(client: TestClient, test_data, async_engine):
+    import asyncio
+    import httpx
+    from app.metrics import kpi_cache
+    
+    async def scrape_together():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            kpi_cache.invalidate()
+            return await asyncio.wait_for(asyncio.gather(*(http.get("/metrics") for _ in range(4))), timeout=10)
+    
+    responses = asyncio.run(scrape_together())
+    assert [r.status_code for r in responses] == [200] * 4
+    assert all('workflow_query_volume{window="1h"} 2' in r.text for r in responses)
+    assert not kpi_cache.stale()
@@ -0,0 +1,89 @@
+import json
+
+import pytest
+from sqlalchemy import text
+from sqlmodel import SQLModel, create_engine
+
+from app.db.bulk_import import BulkImportError, bulk_import
+from app.db.change_tracking import install_change_tracking, table_versions
+from app.db.search import install_search
+
+@pytest.fixture(name="engine")
+def engine_fixture(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'import.db'}")
+    SQLModel.metadata.create_all(engine)
+    with engine.begin() as connection:
+        install_search(connection)
+        install_change_tracking(connection)
+    yield engine
+    engine.dispose()
+
+def write_csv(path, header, rows):
+    path.write_text("\n".join([header, *rows]) + "\n")
+    return str(path)
+
+def test_bulk_import_remaps_keys(engine, tmp_path):
+    patients = write_csv(tmp_path / "patients.csv", "external_id,name,email,age", [
+        f"PAT{i},Patient {i},p{i}@example.com,{30 + i}" for i in range(1, 6)
+    ])
+    doctors = write_csv(tmp_path / "doctors.csv", "external_id,name,email,specialty", ["DOC1,Dr. One,d1@example.com,Cardiology"])
+    # Queries reference patients by external id; their own ids are the exporter's
+    queries = tmp_path / "queries.ndjson"
+    queries.write_text("\n".join(json.dumps({
+        "id": 100 + i, "patient_external_id": f"PAT{5 - i % 5}", "content": f"Chest pain number {i}",
+        "status": "awaiting_review", "priority": "URGENT", "created_at": "2024-05-01T10:00:00",
+    }) for i in range(7)))
+    reviews = write_csv(tmp_path / "reviews.csv", "query_id,doctor_id,content,approved", ["103,1,Go to the ER,true"])
+    with engine.connect() as connection:
+        before = table_versions(connection, ["query"])["query"]
+
+    stats = bulk_import(engine, [("review", reviews), ("query", str(queries)), ("patient", patients), ("doctor", doctors)], chunk_size=3)
+
+    assert [e["entity"] for e in stats["entities"]] == ["patient", "doctor", "query", "review"]
+    assert [e["imported"] for e in stats["entities"]] == [5, 1, 7, 1]
+    with engine.connect() as connection:
+        row = connection.execute(text(
+            "SELECT p.external_id, q.status, q.priority, q.content FROM review r "
+            "JOIN query q ON q.id = r.query_id JOIN patient p ON p.id = q.patient_id"
+        )).one()
+        assert tuple(row) == ("PAT2", "AWAITING_REVIEW", "URGENT", "Chest pain number 3")
+        # Loaded with the sync triggers off, then indexed for search and counted as a change
+        assert connection.execute(text("SELECT count(*) FROM search_query WHERE search_query MATCH 'chest'")).scalar() == 7
+        assert table_versions(connection, ["query"])["query"] == before + 1
+        assert connection.execute(text("SELECT count(*) FROM sqlite_master WHERE name = 'ix_query_status_created_at'")).scalar() == 1
+
+def test_bulk_import_resumes_after_bad_row(engine, tmp_path):
+    patients = write_csv(tmp_path / "patients.csv", "external_id,name,email", ["PAT1,One,one@example.com"])
+    rows = [f"1,Question {i},LOW" for i in range(10)]
+    rows[7] = "9,Question 7,LOW"  # unknown patient
+    queries = write_csv(tmp_path / "queries.csv", "patient_id,content,priority", rows)
+
+    with pytest.raises(BulkImportError, match="unknown patient '9'"):
+        bulk_import(engine, [("patient", patients), ("query", queries)], chunk_size=3)
+
+    # The two chunks before the bad one stay committed; the rerun continues from there
+    rows[7] = "1,Question 7,LOW"
+    write_csv(tmp_path / "queries.csv", "patient_id,content,priority", rows)
+    stats = bulk_import(engine, [("query", queries)], chunk_size=3)
+    assert stats["entities"][0]["skipped"] == 6
+    assert stats["entities"][0]["imported"] == 4
+    with engine.connect() as connection:
+        contents = connection.execute(text("SELECT content FROM query ORDER BY id")).scalars().all()
+    assert contents == [f"Question {i}" for i in range(10)]
+
+def test_change_tracking_ddl_is_portable(engine):
+    from sqlalchemy import create_mock_engine
+
+    # Reinstalling keeps the counters
+    with engine.begin() as connection:
+        before = table_versions(connection, ["query", "review"])
+        install_change_tracking(connection)
+        assert table_versions(connection, ["query", "review"]) == before
+
+    statements = []
+    postgres = create_mock_engine("postgresql://", lambda sql, *args, **kwargs: statements.append(str(sql)))
+    install_change_tracking(postgres)
+    ddl = "\n".join(statements)
+    assert "ON CONFLICT (table_name) DO NOTHING" in ddl
+    assert "OR IGNORE" not in ddl and "random()" not in ddl and "IF NOT EXISTS change_counter_" not in ddl
+    assert ddl.count("FOR EACH STATEMENT EXECUTE FUNCTION change_counter_bump") == 4
@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+
+from app.events.broadcaster import RESET_EVENT, EventBroadcaster, SlowSubscriber
+from app.routes.events import event_stream
+
+async def take(iterator, count):
+    return [await iterator.__anext__() for _ in range(count)]
+
+def test_broadcaster_fan_out_and_filters():
+    async def run():
+        broadcaster = EventBroadcaster()
+        everything = broadcaster.subscribe()
+        patient_one = broadcaster.subscribe(types=["query.created"], patient_id=1)
+        # Subscriptions start when first awaited
+        first = asyncio.ensure_future(take(everything, 3))
+        second = asyncio.ensure_future(take(patient_one, 1))
+        await asyncio.sleep(0)
+
+        broadcaster.publish("query.created", {"query_id": 10, "patient_id": 2})
+        broadcaster.publish("query.reviewed", {"query_id": 11, "patient_id": 1})
+        broadcaster.publish("query.created", {"query_id": 12, "patient_id": 1})
+
+        assert [e.data["query_id"] for e in await first] == [10, 11, 12]
+        assert [e.data["query_id"] for e in await second] == [12]
+        await everything.aclose()
+        await patient_one.aclose()
+        assert broadcaster.subscriber_count == 0
+
+    asyncio.run(run())
+
+def test_broadcaster_resume_tokens():
+    async def run():
+        broadcaster = EventBroadcaster(history_size=3)
+        events = [broadcaster.publish("query.created", {"query_id": i}) for i in range(1, 5)]
+
+        # Caught up from history after the token, then live
+        resumed = broadcaster.subscribe(last_event_id=events[1].id)
+        assert [e.data["query_id"] for e in await take(resumed, 2)] == [3, 4]
+        pending = asyncio.ensure_future(take(resumed, 1))
+        await asyncio.sleep(0)
+        broadcaster.publish("query.created", {"query_id": 5})
+        assert (await pending)[0].data["query_id"] == 5
+        await resumed.aclose()
+
+        # Evicted from history, or issued by another broadcaster (restart): reload
+        for token in (events[0].id, "0000-1", "garbage"):
+            stream = broadcaster.subscribe(last_event_id=token)
+            assert (await take(stream, 1))[0].type == RESET_EVENT
+            await stream.aclose()
+
+        # Filtered subscribers are told to reload too
+        stream = broadcaster.subscribe(last_event_id="0000-1", types=["query.reviewed"], patient_id=7)
+        assert (await asyncio.wait_for(take(stream, 1), 1))[0].type == RESET_EVENT
+        await stream.aclose()
+
+    asyncio.run(run())
+
+def test_broadcaster_drops_slow_subscribers():
+    async def run():
+        broadcaster = EventBroadcaster(queue_size=2)
+        slow = broadcaster.subscribe()
+        fast = broadcaster.subscribe()
+        slow_first = asyncio.ensure_future(take(slow, 1))
+        fast_all = asyncio.ensure_future(take(fast, 4))
+        await asyncio.sleep(0.01)
+
+        # The fast reader drains between publishes; the slow one stops after the first event
+        for i in range(4):
+            broadcaster.publish("query.created", {"query_id": i})
+            await asyncio.sleep(0.01)
+
+        assert (await slow_first)[0].data == {"query_id": 0}
+        assert [e.data["query_id"] for e in await fast_all] == [0, 1, 2, 3]
+        assert broadcaster.dropped_subscribers == 1
+        assert broadcaster.subscriber_count == 1
+        with pytest.raises(SlowSubscriber):
+            await slow.__anext__()
+        await fast.aclose()
+
+    asyncio.run(run())
+
+def test_event_stream_encoding():
+    async def run():
+        broadcaster = EventBroadcaster()
+        stream = event_stream(broadcaster, keepalive=0.01, patient_id=3)
+        assert await stream.__anext__() == "retry: 3000\n\n"
+        assert await stream.__anext__() == ": keep-alive\n\n"
+
+        broadcaster.publish("query.created", {"query_id": 8, "patient_id": 4})
+        broadcaster.publish("query.created", {"query_id": 9, "patient_id": 3})
+        chunk = await stream.__anext__()
+        assert chunk == f'id: {broadcaster.epoch}-2\nevent: query.created\ndata: {{"query_id": 9, "patient_id": 3}}\n\n'
+        await stream.aclose()
+
+    asyncio.run(run())
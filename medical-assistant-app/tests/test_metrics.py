@@ -0,0 +1,41 @@
+from app.metrics.registry import Registry
+
+def test_registry_renders_prometheus_text():
+    registry = Registry()
+    requests = registry.counter("requests_total", "Requests", ("route",))
+    in_flight = registry.gauge("in_flight", "In flight")
+    latency = registry.histogram("latency_seconds", "Latency", ("route",), buckets=(0.1, 1.0))
+
+    requests.inc(route="/a")
+    requests.inc(2, route='/b"')
+    in_flight.inc()
+    in_flight.dec()
+    for value in (0.05, 0.1, 0.5, 3.0):
+        latency.observe(value, route="/a")
+
+    assert registry.render().splitlines() == [
+        "# HELP requests_total Requests",
+        "# TYPE requests_total counter",
+        'requests_total{route="/a"} 1',
+        'requests_total{route="/b\\""} 2',
+        "# HELP in_flight In flight",
+        "# TYPE in_flight gauge",
+        "in_flight 0",
+        "# HELP latency_seconds Latency",
+        "# TYPE latency_seconds histogram",
+        # Buckets are cumulative and inclusive of their upper bound
+        'latency_seconds_bucket{route="/a",le="0.1"} 2',
+        'latency_seconds_bucket{route="/a",le="1"} 3',
+        'latency_seconds_bucket{route="/a",le="+Inf"} 4',
+        'latency_seconds_sum{route="/a"} 3.65',
+        'latency_seconds_count{route="/a"} 4',
+    ]
+
+def test_gauge_function_is_read_at_render_time():
+    registry = Registry()
+    depth = registry.gauge("depth", "Depth", ("status",))
+    values = {("queued",): 3}
+    depth.set_function(lambda: values)
+    assert 'depth{status="queued"} 3' in registry.render()
+    values[("queued",)] = 5
+    assert 'depth{status="queued"} 5' in registry.render()
@@ -0,0 +1,54 @@
+from pathlib import Path
+
+import pytest
+from sqlmodel import Session, SQLModel, create_engine
+
+from app.llm.patient_context import PatientContextStore, extract_lab_values, record_file
+from app.models import Patient, PatientContext, Query, Review
+
+SAMPLE_LABS = Path(__file__).parent.parent / "data" / "sample_lab_results.txt"
+
+@pytest.fixture(name="session")
+def session_fixture(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'context.db'}")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        yield session
+    engine.dispose()
+
+def test_extract_lab_values_from_report():
+    labs = {lab["test"]: lab for lab in extract_lab_values(SAMPLE_LABS.read_text())}
+    assert labs["Glucose"] == {"test": "Glucose", "value": "105", "reference": "70-99 mg/dL", "flag": "H"}
+    assert labs["Hemoglobin"]["flag"] is None
+    assert "Patient" not in labs and "Test" not in labs
+
+def test_snapshot_is_built_once_then_updated_incrementally(session):
+    store = PatientContextStore(max_entries=10, ttl=60)
+    patient = Patient(external_id="PAT1", name="Pat", email="pat@example.com", age=47)
+    session.add(patient)
+    session.commit()
+    old = Query(patient_id=patient.id, content="Is my cholesterol too high?")
+    session.add(old)
+    session.commit()
+    session.add(Review(query_id=old.id, doctor_id=1, content="Repeat the lipid panel in 3 months.", approved=True))
+    session.commit()
+
+    # Cold: rebuilt from the history and stored
+    context = store.get(session, patient.id)
+    assert "Age: 47" in context and "Repeat the lipid panel" in context
+    assert store.stats["rebuilds"] == 1 and session.get(PatientContext, patient.id) is not None
+
+    # A file upload updates the stored row and the cache without a rebuild
+    query = Query(patient_id=patient.id, content="Here are my new results")
+    session.add(query)
+    update = record_file(session, query, SAMPLE_LABS.read_text(), store=store)
+    session.commit()
+    store.remember(patient.id, *update)
+    context = store.get(session, patient.id)
+    assert "Glucose: 105 (70-99 mg/dL) [H]" in context
+    assert store.stats == {**store.stats, "rebuilds": 1, "updates": 1, "hits": 1}
+
+    # A fresh process reads the one stored row
+    other = PatientContextStore(max_entries=10, ttl=60)
+    assert other.get(session, patient.id) == context
+    assert other.stats["loads"] == 1 and other.stats["rebuilds"] == 0
@@ -0,0 +1,78 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlmodel import create_engine
+
+from app.db.profiler import install_profiler, profile_block, profiler, repeated_shapes, statement_shape
+from app.metrics.instruments import DB_STATEMENTS, instrument_engine
+from app.metrics.middleware import MetricsMiddleware
+
+@pytest.fixture(name="engine")
+def engine_fixture():
+    engine = create_engine("sqlite://")
+    instrument_engine(engine, "profiler-test")
+    profiler.reset()
+    yield engine
+    install_profiler("off")
+
+def test_statement_shape():
+    assert statement_shape("SELECT *\n  FROM file WHERE query_id IN (?, ?, ?) LIMIT 10") == \
+        "SELECT * FROM file WHERE query_id IN (?) LIMIT ?"
+    assert statement_shape("SELECT anon_1.id FROM t WHERE x IN (?)") == "SELECT anon_1.id FROM t WHERE x IN (?)"
+
+def test_profile_block_flags_repeated_shapes(engine, capsys):
+    install_profiler("prod", slow_ms=10_000)
+
+    with profile_block("loop") as tally, engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+        for i in range(6):
+            connection.execute(text("SELECT :id"), {"id": i})
+
+    assert tally.statements == 7
+    assert repeated_shapes(tally) == [("SELECT ?", 7)]
+    report = profiler.report()
+    assert report["routes"][0]["route"] == "loop"
+    assert report["n_plus_one"] == [{"route": "loop", "statement": "SELECT ?", "requests": 1, "max_repeats": 7}]
+    assert "Possible N+1 in loop" in capsys.readouterr().out
+
+def test_profile_block_records_nothing_when_off(engine):
+    with profile_block("loop") as tally, engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+
+    assert tally.statements == 1
+    assert tally.shapes is None
+    assert profiler.report()["routes"] == []
+
+def test_slow_statements_logged_with_parameters(engine, capsys):
+    install_profiler("prod", slow_ms=0)
+
+    with engine.connect() as connection:
+        connection.execute(text("SELECT :name"), {"name": "headache"})
+
+    slow = profiler.report()["slow_statements"]
+    assert slow[-1]["statement"] == "SELECT ?"
+    assert "headache" in slow[-1]["parameters"]
+    assert "Slow SQL" in capsys.readouterr().out
+
+def test_middleware_headers_in_dev(engine):
+    install_profiler("dev", slow_ms=10_000)
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/items/{count}")
+    def items(count: int):
+        with engine.connect() as connection:
+            return [connection.execute(text("SELECT :i"), {"i": i}).scalar() for i in range(count)]
+
+    client = TestClient(app)
+    before = DB_STATEMENTS.value(engine="profiler-test")
+    few = client.get("/items/2")
+    assert few.headers["x-sql-statements"] == "2"
+    assert few.headers["server-timing"].startswith("db;dur=")
+    assert "x-sql-n-plus-one" not in few.headers
+    # Timed once, by the metrics listener the profiler shares
+    assert DB_STATEMENTS.value(engine="profiler-test") == before + 2
+    many = client.get("/items/8")
+    assert many.headers["x-sql-n-plus-one"] == "8x SELECT ?"
+    assert {row["route"] for row in profiler.report()["routes"]} == {"GET /items/{count}"}
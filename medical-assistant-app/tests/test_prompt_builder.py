@@ -0,0 +1,40 @@
+from app.llm.prompt_builder import OMITTED, build_document_prompt, count_tokens, normalize_document
+from app.utils.text_extraction import PAGE_BREAK
+
+def page(number, body):
+    return f"CITY HOSPITAL - DISCHARGE SUMMARY\nPatient: Jane Roe\n{body}\nPage {number} of 4\nConfidential  record  {number}"
+
+def test_normalize_document_strips_running_headers_and_joins_words():
+    text = PAGE_BREAK.join([
+        page(1, "History of hypo-\nthyroidism, treated since 2019."),
+        page(2, "Thyroid panel:   TSH 6.2 mIU/L   H"),
+        page(3, "No allergies."),
+        page(4, "Follow up in six weeks."),
+    ])
+    normalized = normalize_document(text)
+    assert "hypothyroidism, treated" in normalized
+    assert "TSH 6.2 mIU/L H" in normalized
+    assert "DISCHARGE SUMMARY" not in normalized and "Page" not in normalized and "Confidential" not in normalized
+
+def test_normalize_document_keeps_numbers_inside_a_page():
+    cells = "Potassium\n6.8\nmmol/L\nGlucose\n105\nmg/dL"
+    assert normalize_document(cells) == cells
+    assert normalize_document(f"3\n{cells}\n4") == cells
+
+def test_document_prompt_packs_relevant_chunks_within_budget():
+    filler = [f"Section {i}: routine dermatology follow-up notes, skin clear, no changes observed." for i in range(200)]
+    filler[150] = "Cardiology: troponin elevated at 0.9 ng/mL, chest pain on exertion, ECG shows ST depression."
+    report = "\n\n".join(filler)
+
+    prompt = build_document_prompt("Why do I get chest pain when I climb stairs?", {"report.txt": report}, budget=300, chunk_tokens=60)
+
+    assert prompt.tokens <= 300 < prompt.original_tokens
+    assert prompt.tokens_saved == prompt.original_tokens - prompt.tokens
+    assert prompt.chunks_used < prompt.chunks
+    excerpt = prompt.excerpts["report.txt"]
+    assert "troponin elevated" in excerpt and excerpt.count(OMITTED) >= 1
+    assert prompt.text.startswith("\n\nThe following files were uploaded") and "--- report.txt ---" in prompt.text
+
+    small = build_document_prompt("chest pain", {"labs.txt": "Troponin   0.01 ng/mL"}, budget=300)
+    assert small.excerpts == {"labs.txt": "Troponin 0.01 ng/mL"} and small.chunks_used == small.chunks == 1
+    assert small.tokens == count_tokens("Troponin 0.01 ng/mL")
@@ -0,0 +1,90 @@
+import gzip
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import func, insert, select, text
+from sqlmodel import SQLModel, create_engine
+
+from app.db.change_tracking import install_change_tracking
+from app.db.search import install_search
+from app.models import AISuggestion, Blob, File, Patient, Query, QueryStatus, Review
+from app.utils.retention import FileArchive, TableArchive, purge_queries, query_archive
+
+@pytest.fixture(name="engine")
+def engine_fixture(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'retention.db'}")
+    SQLModel.metadata.create_all(engine)
+    with engine.begin() as connection:
+        install_search(connection)
+        install_change_tracking(connection)
+    yield engine
+    engine.dispose()
+
+def add_blob(connection, root, digest, ref_count):
+    path = root / digest
+    path.write_bytes(b"x" * 10)
+    connection.execute(insert(Blob.__table__).values(sha256=digest, path=str(path), size=10, ref_count=ref_count))
+    return path
+
+def add_query(connection, status, created_at, digests=()):
+    query_id = connection.execute(insert(Query.__table__).values(
+        patient_id=1, content=f"Headache since {created_at:%Y-%m-%d}", status=status.name, priority="MEDIUM",
+        created_at=created_at,
+    )).inserted_primary_key[0]
+    for digest in digests:
+        connection.execute(insert(File.__table__).values(
+            query_id=query_id, filename=f"{digest}.txt", file_path="unused", file_type="text/plain", file_size=10,
+            sha256=digest,
+        ))
+    return query_id
+
+def test_purge_releases_shared_blobs_after_last_reference(engine, tmp_path):
+    uploads = tmp_path / "uploads"
+    uploads.mkdir()
+    old = datetime(2024, 1, 1)
+    with engine.begin() as connection:
+        connection.execute(insert(Patient.__table__).values(external_id="PAT1", name="Pat", email="pat@example.com"))
+        shared = add_blob(connection, uploads, "shared", ref_count=3)
+        private = add_blob(connection, uploads, "private", ref_count=2)
+        purged = [add_query(connection, QueryStatus.COMPLETED, old + timedelta(hours=i), ["shared", "private"]) for i in range(2)]
+        kept = add_query(connection, QueryStatus.COMPLETED, datetime.utcnow(), ["shared"])
+        connection.execute(insert(AISuggestion.__table__).values(query_id=purged[0], content="Rest", model_used="m"))
+        connection.execute(insert(Review.__table__).values(query_id=purged[0], doctor_id=1, content="Agreed", approved=True))
+
+    stats = purge_queries(engine, str(uploads), status=[QueryStatus.COMPLETED], older_than=datetime(2024, 6, 1), chunk_size=1)
+
+    assert (stats["queries"], stats["files"], stats["suggestions"], stats["reviews"], stats["chunks"]) == (2, 4, 1, 1, 2)
+    assert (stats["blobs_removed"], stats["bytes_freed"]) == (1, 10)
+    assert shared.exists() and not private.exists()
+    with engine.connect() as connection:
+        assert connection.execute(select(Blob.sha256, Blob.ref_count)).all() == [("shared", 1)]
+        assert connection.execute(select(Query.id)).scalars().all() == [kept]
+        # The delete triggers kept the search index in step
+        assert connection.execute(text("SELECT count(*) FROM search_query")).scalar() == 1
+
+def test_purge_archives_cases_before_deleting(engine, tmp_path):
+    with engine.begin() as connection:
+        connection.execute(insert(Patient.__table__).values(external_id="PAT1", name="Pat", email="pat@example.com"))
+        ids = [add_query(connection, QueryStatus.COMPLETED, datetime(2024, 1, 1)) for _ in range(3)]
+        connection.execute(insert(AISuggestion.__table__).values(query_id=ids[1], content="Drink water", model_used="m"))
+        connection.execute(insert(Review.__table__).values(query_id=ids[1], doctor_id=1, content="Drink water", approved=True))
+
+    # Without a filter the whole table would go: refused unless asked for
+    with pytest.raises(ValueError):
+        purge_queries(engine, str(tmp_path), archive=TableArchive())
+    with engine.connect() as connection:
+        assert connection.execute(select(func.count()).select_from(Query)).scalar() == 3
+
+    stats = purge_queries(engine, str(tmp_path), archive=TableArchive(), chunk_size=2, everything=True)
+    assert (stats["queries"], stats["archived"]) == (3, 3)
+    with engine.connect() as connection:
+        row = connection.execute(select(query_archive).where(query_archive.c.query_id == ids[1])).mappings().one()
+        assert (row["status"], row["suggestion"], row["review"], row["review_approved"]) == ("completed", "Drink water", "Drink water", True)
+
+    with engine.begin() as connection:
+        add_query(connection, QueryStatus.PENDING, datetime(2024, 1, 1))
+    archive_path = tmp_path / "archive" / "queries.ndjson.gz"
+    purge_queries(engine, str(tmp_path), archive=FileArchive(str(archive_path)), everything=True)
+    with gzip.open(archive_path, "rt") as f:
+        assert [json.loads(line)["status"] for line in f] == ["pending"]
@@ -1,5 +1,5 @@
 import pytest
-from app.utils.triage import calculate_priority, calculate_safety_score, should_escalate
+from app.utils.triage import calculate_priority, calculate_safety_score, should_escalate, triage_text, KeywordMatcher
 from app.models import QueryPriority
 
 # Test priority calculation
@@ -123,4 +123,47 @@ def test_should_not_escalate():
     ]
     
     for case in non_escalation_cases:
-        assert should_escalate(case) == False, f"Expected no escalation for '{case}'"
\ No newline at end of file
+        assert should_escalate(case) == False, f"Expected no escalation for '{case}'"
+
+# Test the single-pass keyword matcher
+def test_keyword_matcher_finds_overlapping_keywords():
+    matcher = KeywordMatcher(["severe", "severe pain", "pain", "ache", "allergic reaction", "reaction"])
+    
+    assert matcher.find("SEVERE PAIN and a headache") == {"severe", "severe pain", "pain", "ache"}
+    assert matcher.find("possible allergic reaction") == {"allergic reaction", "reaction"}
+    assert matcher.find("nothing relevant here") == set()
+
+def test_keyword_matcher_trie_matches_substring_scan():
+    # Lists past the threshold go through the trie regex; results must not change
+    keywords = ["severe", "severe pain", "pain", "ache", "head", "headache", "ever", "reaction", "action"]
+    scan = KeywordMatcher(keywords)
+    trie = KeywordMatcher(keywords, trie_min_keywords=0)
+    assert trie.uses_trie and not scan.uses_trie
+    
+    for text in ["SEVERE PAIN and a headache", "severeaction", "a headache reaction", "nothing relevant here"]:
+        assert trie.find(text) == scan.find(text)
+
+def test_triage_text_matches_individual_functions():
+    texts = [
+        "I'm having severe chest pain and difficulty breathing",
+        "I took an overdose and want to end my life, it's an emergency",
+        "I've had a persistent cough for a week",
+        "What vitamins should I take for general health?",
+    ]
+    
+    for text in texts:
+        result = triage_text(text)
+        assert result.priority == calculate_priority(text)
+        assert result.safety_score == calculate_safety_score(text)
+        assert result.escalate == should_escalate(text)
+
+def test_benchmark_queries_triage_at_their_priority():
+    # The synthetic load must reproduce its priority mix when triaged
+    from itertools import combinations
+    from benchmarks.datagen import DETAILS, PRIORITY_PHRASES
+
+    for priority, phrases in PRIORITY_PHRASES.items():
+        for phrase in phrases:
+            for details in combinations(DETAILS, 2):
+                query = " ".join([phrase + ".", *(d.format(age=40) for d in details)])
+                assert calculate_priority(query) == priority, query
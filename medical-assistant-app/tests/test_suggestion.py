@@ -0,0 +1,153 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+from openai import APIConnectionError
+
+from app.llm.suggestion import SuggestionEngine, cached_complete
+from app.llm.cache import SuggestionCache, suggestion_cache_key
+
+class FakeCompletions:
+    """Stands in for client.chat.completions with a fixed latency"""
+    def __init__(self, latency=0.0, failures=0):
+        self.latency = latency
+        self.failures = failures
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+    
+    async def create(self, **kwargs):
+        self.calls += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency)
+            if self.failures > 0:
+                self.failures -= 1
+                raise APIConnectionError(request=None)
+            message = SimpleNamespace(content=f"suggestion for {kwargs['messages'][-1]['content']}")
+            return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+        finally:
+            self.in_flight -= 1
+
+def make_engine(completions, **kwargs):
+    client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    return SuggestionEngine(client=client, model="fake", **kwargs)
+
+# Test that completions run concurrently up to the semaphore limit
+def test_completions_run_concurrently_with_bound():
+    completions = FakeCompletions(latency=0.1)
+    engine = make_engine(completions, max_concurrency=5)
+    
+    async def run():
+        messages = [{"role": "user", "content": "hello"}]
+        return await asyncio.gather(*(engine.complete(messages) for _ in range(10)))
+    
+    start = time.perf_counter()
+    results = asyncio.run(run())
+    elapsed = time.perf_counter() - start
+    
+    assert results == ["suggestion for hello"] * 10
+    assert completions.max_in_flight == 5
+    # Two waves of 0.1s rather than ten sequential calls
+    assert elapsed < 0.5
+
+# Test retries on transient errors
+def test_retries_transient_errors():
+    completions = FakeCompletions(failures=2)
+    engine = make_engine(completions, max_retries=3, backoff_base=0.001)
+    
+    result = asyncio.run(engine.complete([{"role": "user", "content": "retry"}]))
+    assert result == "suggestion for retry"
+    assert completions.calls == 3
+
+# Test giving up after the retry budget and on timeouts
+def test_gives_up_after_retries_and_timeout():
+    completions = FakeCompletions(failures=5)
+    engine = make_engine(completions, max_retries=1, backoff_base=0.001)
+    with pytest.raises(APIConnectionError):
+        asyncio.run(engine.complete([{"role": "user", "content": "fail"}]))
+    assert completions.calls == 2
+    
+    slow = FakeCompletions(latency=1.0)
+    engine = make_engine(slow, timeout=0.05, max_retries=0)
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(engine.complete([{"role": "user", "content": "slow"}]))
+
+# Test that the cache key ignores formatting but not content
+def test_suggestion_cache_key():
+    key = suggestion_cache_key("prompt", "gpt-4", 0.3, 1000, "My  glucose was HIGH\n")
+    assert key == suggestion_cache_key("prompt", "gpt-4", 0.3, 1000, "my glucose was high")
+    assert key != suggestion_cache_key("prompt", "gpt-4", 0.3, 1000, "my glucose was low")
+    assert key != suggestion_cache_key("prompt", "gpt-3.5", 0.3, 1000, "my glucose was high")
+    assert key != suggestion_cache_key("prompt", "gpt-4", 0.3, 1000, "my glucose was high", {"labs.txt": "HbA1c 7.1"})
+
+# Test LRU eviction, TTL expiry and the persistent tier
+def test_suggestion_cache_tiers(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "cache.db")
+    cache = SuggestionCache(max_entries=2, ttl=60, db_path=db_path)
+    cache.set("a", "A")
+    cache.set("b", "B")
+    cache.set("c", "C")
+    assert cache.stats["evictions"] == 1
+    
+    # Evicted from memory but still on disk
+    assert cache.get("a") == "A"
+    assert cache.stats["disk_hits"] == 1
+    assert cache.get("c") == "C"
+    assert cache.stats["memory_hits"] == 1
+    
+    # A new process sees the persisted entries
+    assert SuggestionCache(max_entries=2, ttl=60, db_path=db_path).get("b") == "B"
+    
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 120)
+    assert cache.get("c") is None
+    assert cache.stats["expirations"] >= 1
+
+# Test that cached completions skip the model unless bypassed
+def test_cached_complete_hits_and_bypass():
+    completions = FakeCompletions()
+    engine = make_engine(completions)
+    cache = SuggestionCache(max_entries=10, ttl=60, db_path=None)
+    messages = [{"role": "user", "content": "same question"}]
+    
+    async def run(use_cache):
+        return await cached_complete(engine, messages, "key", max_tokens=10, temperature=0.3, use_cache=use_cache, cache=cache)
+    
+    assert asyncio.run(run(True)) == "suggestion for same question"
+    assert asyncio.run(run(True)) == "suggestion for same question"
+    assert completions.calls == 1
+    
+    asyncio.run(run(False))
+    assert completions.calls == 2
+    assert cache.snapshot()["bypasses"] == 1
+    assert cache.snapshot()["hit_rate"] == 0.5
+
+# Test that the SQLite tier is read and written off the event loop thread
+def test_cached_complete_persistent_tier_off_loop(tmp_path):
+    import threading
+    
+    class ThreadRecordingCache(SuggestionCache):
+        threads = []
+        
+        def get(self, key):
+            self.threads.append(threading.get_ident())
+            return super().get(key)
+        
+        def set(self, key, content):
+            self.threads.append(threading.get_ident())
+            super().set(key, content)
+    
+    engine = make_engine(FakeCompletions())
+    cache = ThreadRecordingCache(max_entries=10, ttl=60, db_path=str(tmp_path / "cache.db"))
+    
+    async def run():
+        result = await cached_complete(engine, [{"role": "user", "content": "q"}], "key", max_tokens=10, temperature=0.3, cache=cache)
+        return result, threading.get_ident()
+    
+    result, loop_thread = asyncio.run(run())
+    assert result == "suggestion for q"
+    assert len(cache.threads) == 2
+    assert loop_thread not in cache.threads
@@ -0,0 +1,114 @@
+import asyncio
+import multiprocessing
+import os
+import time
+
+import fitz  # PyMuPDF
+import pytest
+
+from app.utils.text_extraction import ExtractionEngine, extract_document
+
+@pytest.fixture(name="pdf_path")
+def pdf_path_fixture(tmp_path):
+    path = tmp_path / "labs.pdf"
+    doc = fitz.open()
+    for number in range(1, 6):
+        page = doc.new_page()
+        page.insert_text((72, 72), f"Lab report page {number}")
+    doc.save(str(path))
+    doc.close()
+    return str(path)
+
+@pytest.mark.parametrize("backend", ["pymupdf", "pypdf2"])
+def test_extract_document_backends(pdf_path, backend):
+    result = extract_document(pdf_path, ".pdf", backend=backend)
+    assert result.backend == backend
+    assert (result.pages, result.total_pages, result.truncated) == (5, 5, False)
+    assert "Lab report page 1" in result.text
+    assert result.text.index("page 1") < result.text.index("page 5")
+
+def test_extract_document_page_cap(pdf_path):
+    result = extract_document(pdf_path, ".pdf", max_pages=2)
+    assert (result.pages, result.total_pages, result.truncated) == (2, 5, True)
+    assert "page 3" not in result.text
+
+def test_extract_document_time_limit(pdf_path):
+    # With no time budget only the first page is read
+    result = extract_document(pdf_path, ".pdf", timeout=0)
+    assert result.pages == 1
+    assert result.truncated
+
+def test_extract_document_unknown_backend(pdf_path):
+    with pytest.raises(ValueError):
+        extract_document(pdf_path, ".pdf", backend="ocr")
+
+def test_extraction_engine_process_pool(pdf_path, tmp_path):
+    txt_path = tmp_path / "notes.txt"
+    txt_path.write_text("Taking metformin twice daily", encoding="utf-8")
+    engine = ExtractionEngine(max_workers=1)
+
+    async def run():
+        return await asyncio.gather(
+            engine.extract(pdf_path, ".pdf", backend="pypdf2"),
+            engine.extract(str(txt_path), ".txt"),
+        )
+
+    try:
+        pdf, txt = asyncio.run(run())
+    finally:
+        engine.close()
+    assert pdf.pages == 5 and pdf.backend == "pypdf2"
+    assert txt.text == "Taking metformin twice daily"
+
+def hanging_extract(path, ext, *args):
+    # Runs in a spawned worker: a document named "*.hang" never finishes, like a parser stuck in one page
+    if path.endswith(".hang"):
+        import time
+        time.sleep(3600)
+    return extract_document(path, ext, *args)
+
+def test_extraction_timeout_spares_other_documents(tmp_path, monkeypatch):
+    from app.utils import text_extraction
+
+    hang_path = tmp_path / "scan.hang"
+    hang_path.write_text("stuck")
+    txt_path = tmp_path / "notes.txt"
+    txt_path.write_text("Blood pressure 150/95", encoding="utf-8")
+    monkeypatch.setattr(text_extraction, "EXTRACTION_GRACE_SECONDS", 0)
+    engine = ExtractionEngine(max_workers=2, timeout=1.0, extractor=hanging_extract)
+
+    async def run():
+        async def later(delay):
+            await asyncio.sleep(delay)
+            return await engine.extract(str(txt_path), ".txt")
+
+        # Start both workers (spawning is slow) before the short deadline applies
+        engine.timeout = 30
+        await asyncio.gather(engine.extract(str(txt_path), ".txt"), engine.extract(str(txt_path), ".txt"))
+        engine.timeout = 1.0
+        pids = engine.worker_pids()
+        stuck, same_pool = await asyncio.gather(engine.extract(str(hang_path), ".txt"), later(0.5))
+        await asyncio.gather(*engine._reapers)
+        engine.timeout = 30
+        return pids, (stuck, same_pool, await engine.extract(str(txt_path), ".txt"))
+
+    try:
+        pids, (stuck, same_pool, fresh_pool) = asyncio.run(run())
+    finally:
+        engine.close()
+    assert stuck.failed and stuck.text == ""
+    assert same_pool.text == fresh_pool.text == "Blood pressure 150/95"
+    assert len(pids) == 2
+    assert all(process_gone(pid) for pid in pids)
+
+def process_gone(pid, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        # Reaps exited pool workers so they stop showing up as zombies
+        multiprocessing.active_children()
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return True
+        time.sleep(0.05)
+    return False
@@ -0,0 +1,28 @@
+import streamlit as st
+import requests
+
+# Characters of extracted text fetched per request
+TEXT_PREVIEW_CHARS = 2000
+
+def fetch_file_text(api_url, file_id, offset=0, limit=TEXT_PREVIEW_CHARS):
+    """Fetch a slice of a file's extracted text"""
+    response = requests.get(f"{api_url}/file/{file_id}/text", params={"offset": offset, "limit": limit})
+    response.raise_for_status()
+    return response.json()
+
+def show_extracted_text(api_url, file_info, key_prefix):
+    """Show a file's extracted text on request, a preview first and more on demand"""
+    total = file_info.get("text_length") or 0
+    if not total:
+        return
+    state_key = f"{key_prefix}_file_text_{file_info['id']}"
+    if state_key not in st.session_state:
+        if not st.button(f"📄 View extracted text ({total:,} characters)", key=f"{state_key}_show"):
+            return
+        st.session_state[state_key] = fetch_file_text(api_url, file_info["id"])["text"]
+
+    text = st.session_state[state_key]
+    st.code(text, language="text")
+    if len(text) < total and st.button(f"Load more ({len(text):,} of {total:,} shown)", key=f"{state_key}_more"):
+        st.session_state[state_key] = text + fetch_file_text(api_url, file_info["id"], offset=len(text))["text"]
+        st.rerun()
@@ -0,0 +1,17 @@
+from src.http_cache import cached_get
+
+def fetch_query_details(api_url, query_ids=None, patient_id=None, include_text=False):
+    """Fetch queries with their files, AI suggestion and review in one request, keyed by id
+
+    Pass ``query_ids`` for specific queries or ``patient_id`` for a patient's
+    history; the returned dict keeps the API's ordering.
+    """
+    if query_ids is not None:
+        if not query_ids:
+            return {}
+        params = {"ids": list(query_ids), "limit": len(query_ids)}
+    else:
+        params = {"patient_id": patient_id}
+    response = cached_get(f"{api_url}/query/details", params={**params, "include_text": include_text})
+    response.raise_for_status()
+    return {q["id"]: q for q in response.json()["queries"]}
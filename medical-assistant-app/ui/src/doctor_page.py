@@ -2,6 +2,11 @@ import streamlit as st
 import requests
 import os
 
+from src.http_cache import cached_get
+from src.live_updates import follow_events
+from src.components.file_text import show_extracted_text
+from src.components.query_display import fetch_query_details
+
 API_URL = os.getenv("API_URL", "http://localhost:8001/api")
 API_HOST = os.getenv("API_HOST", "localhost")
 API_PORT = os.getenv("API_PORT", "8001")
@@ -16,53 +21,66 @@ def show_doctor_ui():
 
         if st.button("Refresh Queries"):
             st.rerun()
+        st.checkbox("Live updates", value=True, key="doctor_live_updates",
+                    help="Refresh automatically when queries are created, triaged or reviewed")
 
         # st.write(f"🔍 **Debug**: Fetching from `{API_URL}/query/?status=awaiting_review`")
 
         try:
-            response = requests.get(f"{API_URL}/query/", params={"status": "awaiting_review"})
+            # Review queue: urgent and high-safety-score queries first, then oldest
+            response = requests.get(
+                f"{API_URL}/queue/",
+                params={"doctor_id": st.session_state.doctor_id, "limit": 50}
+            )
             # st.write(f"**API Response Status**: {response.status_code}")
 
             if response.status_code == 200:
                 data = response.json()
                 queries = data["queries"]
-                total = data["total"]
-                st.write(f"**Total queries awaiting review**: {total}")
+                st.write(f"**Next queries awaiting review**: {len(queries)}")
 
                 if not queries:
                     st.info("No queries awaiting review.")
                     st.write("---")
                     st.write("**Debug: All queries in system:**")
-                    all_response = requests.get(f"{API_URL}/query/")
+                    all_response = cached_get(f"{API_URL}/query/")
                     if all_response.status_code == 200:
                         all_queries = all_response.json()["queries"]
                         for q in all_queries:
                             st.write(f"- Query {q['id']}: Status = {q['status']}, Priority = {q['priority']}")
                 else:
+                    details = fetch_query_details(API_URL, [q["id"] for q in queries])
                     for query in queries:
+                        detail = details.get(query["id"], {})
                         with st.expander(f"Query ID {query['id']}: {query['content'][:50]}... (Priority: {query['priority']})"):
                             st.write(f"**Patient Query:** {query['content']}")
                             st.write(f"**Priority:** {query['priority']}")
                             st.write(f"**Submitted:** {query['created_at']}")
 
-                            try:
-                                files_response = requests.get(f"{API_URL}/file/{query['id']}")
-                                if files_response.status_code == 200:
-                                    files_data = files_response.json()
-                                    if files_data["files"]:
-                                        st.write("**Uploaded Files:**")
-                                        for file_info in files_data["files"]:
-                                            st.write(f"- {file_info['filename']} ({file_info['file_type']})")
-                                            if file_info.get("text_content"):
-                                                with st.expander(f"View extracted text from {file_info['filename']}"):
-                                                    st.code(file_info["text_content"], language="text")
-                            except:
-                                pass
+                            if query.get("claimed_by") == st.session_state.doctor_id:
+                                st.caption("🩺 Claimed by you")
+                                if st.button("Release", key=f"release_{query['id']}"):
+                                    requests.post(f"{API_URL}/queue/{query['id']}/release", json={"doctor_id": st.session_state.doctor_id})
+                                    st.rerun()
+                            elif st.button("🩺 Claim for review", key=f"claim_{query['id']}"):
+                                claim_response = requests.post(f"{API_URL}/queue/{query['id']}/claim", json={"doctor_id": st.session_state.doctor_id})
+                                if claim_response.status_code == 200:
+                                    st.rerun()
+                                else:
+                                    st.warning("Another doctor has already claimed this query.")
+
+                            if detail.get("files"):
+                                st.write("**Uploaded Files:**")
+                                for file_info in detail["files"]:
+                                    st.write(f"- {file_info['filename']} ({file_info['file_type']})")
+                                    show_extracted_text(API_URL, file_info, "doctor")
 
                             st.write("---")
                             st.subheader("💡 AI-Generated Suggestion")
 
                             default_suggestion = f"Based on the patient's reported symptoms, consider further evaluation for diabetes-related complications and lifestyle modifications."
+                            if detail.get("ai_suggestion"):
+                                default_suggestion = detail["ai_suggestion"]["content"]
                             ai_key = f"ai_suggestion_{query['id']}"
                             if ai_key not in st.session_state:
                                 st.session_state[ai_key] = default_suggestion
@@ -70,8 +88,13 @@ def show_doctor_ui():
                             st.text_area("AI Suggestion:", value=st.session_state[ai_key], height=120, disabled=True, key=f"ai_suggestion_display_{query['id']}")
 
                             if st.button("🔄 Regenerate Suggestion", key=f"regen_{query['id']}"):
-                                st.session_state[ai_key] = f"🔄 Regenerated suggestion for Query {query['id']}: Recommend further lab tests and glucose monitoring."
-                                st.experimental_rerun()
+                                # Bypasses the server-side suggestion cache
+                                regen_response = requests.post(f"{API_URL}/suggestion/{query['id']}/regenerate")
+                                if regen_response.status_code == 200:
+                                    st.session_state[ai_key] = regen_response.json()["content"]
+                                    st.rerun()
+                                else:
+                                    st.error(f"❌ Could not regenerate suggestion: {regen_response.text}")
 
                             with st.form(f"review_form_{query['id']}"):
                                 st.write("🩺 **Doctor Review**")
@@ -104,16 +127,16 @@ def show_doctor_ui():
         st.write("View your previously completed reviews.")
 
         try:
-            response = requests.get(f"{API_URL}/review/", params={"doctor_id": st.session_state.doctor_id})
+            response = cached_get(f"{API_URL}/review/", params={"doctor_id": st.session_state.doctor_id})
             if response.status_code == 200:
                 reviews = response.json()["reviews"]
                 if not reviews:
                     st.info("You haven't completed any reviews yet.")
                 else:
+                    reviewed_queries = fetch_query_details(API_URL, [r["query_id"] for r in reviews])
                     for review in reviews:
-                        query_response = requests.get(f"{API_URL}/query/{review['query_id']}")
-                        if query_response.status_code == 200:
-                            query = query_response.json()
+                        query = reviewed_queries.get(review["query_id"])
+                        if query:
                             with st.expander(f"Review for Query ID {review['query_id']} (Completed: {review['created_at']})"):
                                 st.write(f"**Patient Query:** {query['content']}")
                                 st.write("---")
@@ -157,7 +180,7 @@ def show_doctor_ui():
         st.subheader("All Queries in System")
         if st.button("Fetch All Queries"):
             try:
-                all_response = requests.get(f"{API_URL}/query/")
+                all_response = cached_get(f"{API_URL}/query/")
                 if all_response.status_code == 200:
                     all_data = all_response.json()
                     st.json(all_data)
@@ -165,3 +188,11 @@ def show_doctor_ui():
                     st.error(f"Error: {all_response.status_code} - {all_response.text}")
             except Exception as e:
                 st.error(f"Error: {str(e)}")
+
+    # Re-render when the API pushes a queue change instead of waiting for a refresh click
+    if st.session_state.get("doctor_live_updates"):
+        follow_events(
+            API_URL,
+            params={"types": ["query.created", "query.triaged", "query.status_changed", "query.reviewed", "queue.retriaged"]},
+            state_key="doctor_last_event_id"
+        )
@@ -0,0 +1,30 @@
+import streamlit as st
+import requests
+
+# Responses kept per browser session for revalidation
+HTTP_CACHE_MAX_ENTRIES = 64
+
+def cached_get(url, params=None):
+    """GET that revalidates a cached response with If-None-Match
+
+    Streamlit reruns the whole page on every interaction, so listings are
+    requested again and again. When the API answers 304 the response kept
+    from the last full fetch is returned instead, and nothing is re-sent
+    or re-parsed on the server.
+    """
+    cache = st.session_state.setdefault("http_cache", {})
+    key = requests.Request("GET", url, params=params).prepare().url
+    cached = cache.get(key)
+
+    headers = {"If-None-Match": cached.headers["ETag"]} if cached is not None else {}
+    response = requests.get(url, params=params, headers=headers)
+    if response.status_code == 304 and cached is not None:
+        return cached
+
+    if response.status_code == 200 and "ETag" in response.headers:
+        cache.pop(key, None)
+        cache[key] = response
+        while len(cache) > HTTP_CACHE_MAX_ENTRIES:
+            # Drop the least recently stored entry
+            cache.pop(next(iter(cache)))
+    return response
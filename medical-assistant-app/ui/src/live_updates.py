@@ -0,0 +1,62 @@
+import json
+import time
+
+import streamlit as st
+import requests
+
+# Seconds each wait holds the event stream open; between waits Streamlit can
+# act on clicks made meanwhile
+LIVE_UPDATE_WAIT_SECONDS = 5
+
+# Seconds to back off when the API cannot be reached
+LIVE_UPDATE_RETRY_SECONDS = 3
+
+def wait_for_event(api_url, params=None, state_key="last_event_id", timeout=LIVE_UPDATE_WAIT_SECONDS):
+    """Block until the API pushes a matching event (or ``timeout`` passes)
+
+    The last event id is kept in session state and sent as Last-Event-ID,
+    so events published between two waits are not missed. Returns the
+    event dict, or None on timeout or connection error.
+    """
+    deadline = time.monotonic() + timeout
+    headers = {}
+    if st.session_state.get(state_key):
+        headers["Last-Event-ID"] = st.session_state[state_key]
+    try:
+        with requests.get(
+            f"{api_url}/events/", params=params, headers=headers, stream=True, timeout=(5, timeout)
+        ) as response:
+            event = {}
+            for line in response.iter_lines(decode_unicode=True):
+                # Keep-alive comments arrive while idle, so this is checked regularly
+                if time.monotonic() > deadline:
+                    return None
+                if line.startswith("id: "):
+                    event["id"] = line[4:]
+                elif line.startswith("event: "):
+                    event["type"] = line[7:]
+                elif line.startswith("data: "):
+                    event["data"] = json.loads(line[6:])
+                elif not line and "type" in event:
+                    st.session_state[state_key] = event["id"]
+                    return event
+    except requests.exceptions.ReadTimeout:
+        return None
+    except requests.RequestException:
+        time.sleep(LIVE_UPDATE_RETRY_SECONDS)
+        return None
+    return None
+
+def follow_events(api_url, params=None, state_key="last_event_id"):
+    """Rerun the page whenever the API pushes a matching event
+
+    Streamlit pages re-render top to bottom, so instead of polling the
+    listings the page parks here at the end of a run. Call it last: it only
+    returns by rerunning the script.
+    """
+    status = st.empty()
+    while True:
+        # Any st call lets Streamlit stop this run when the user interacts
+        status.caption(f"🟢 Live updates on (last checked {time.strftime('%H:%M:%S')})")
+        if wait_for_event(api_url, params=params, state_key=state_key) is not None:
+            st.rerun()
@@ -2,6 +2,10 @@ import streamlit as st
 import requests
 import os
 
+from src.live_updates import follow_events
+from src.components.file_text import show_extracted_text
+from src.components.query_display import fetch_query_details
+
 API_URL = os.getenv("API_URL", "http://localhost:8001/api")
 API_HOST = os.getenv("API_HOST", "localhost")
 API_PORT = os.getenv("API_PORT", "8001")
@@ -85,62 +89,45 @@ def show_patient_ui():
         # Refresh button
         if st.button("Refresh Queries"):
             st.rerun()
+        st.checkbox("Live updates", value=True, key="patient_live_updates",
+                    help="Refresh automatically when one of your queries changes")
         
         # Get queries from API
         try:
-            response = requests.get(
-                f"{API_URL}/query/",
-                params={"patient_id": st.session_state.patient_id}
-            )
+            # Queries with their files and reviews in a single request
+            queries = list(fetch_query_details(API_URL, patient_id=st.session_state.patient_id).values())
             
-            if response.status_code == 200:
-                queries = response.json()["queries"]
-                
-                if not queries:
-                    st.info("You haven't submitted any queries yet.")
-                else:
-                    for query in queries:
-                        with st.expander(f"Query: {query['content'][:50]}... (Status: {query['status']})"):
-                            st.write(f"**Full Query:** {query['content']}")
-                            st.write(f"**Status:** {query['status']}")
-                            st.write(f"**Priority:** {query['priority']}")
-                            st.write(f"**Submitted:** {query['created_at']}")
-                            
-                            # Show uploaded files if any
-                            try:
-                                files_response = requests.get(f"{API_URL}/file/{query['id']}")
-                                if files_response.status_code == 200:
-                                    files_data = files_response.json()
-                                    if files_data["files"]:
-                                        st.write("**Uploaded Files:**")
-                                        for file_info in files_data["files"]:
-                                            st.write(f"- {file_info['filename']} ({file_info['file_type']})")
-                                            if file_info.get("text_content"):
-                                                st.write("  **Extracted Text:**")
-                                                st.code(file_info["text_content"][:500], language="text")
-                            except:
-                                pass  # Ignore file retrieval errors
-                            
-                            # Get review if available
-                            if query['status'] == "reviewed" or query['status'] == "completed":
-                                try:
-                                    review_response = requests.get(f"{API_URL}/review/{query['id']}")
-                                    if review_response.status_code == 200:
-                                        review = review_response.json()
-                                        st.write("---")
-                                        st.subheader("💡 Final Suggestion from Doctor")
-                                        st.success(review["content"])
-                                        st.caption(f"Reviewed by Doctor ID: {review['doctor_id']}")
-
-                                        if review["approved"]:
-                                            st.info("✅ This suggestion was approved by the doctor.")
-                                        else:
-                                            st.warning("✏️ This is a modified version of the AI suggestion.")
-
-                                except:
-                                    st.warning("Could not retrieve doctor's response.")
+            if not queries:
+                st.info("You haven't submitted any queries yet.")
             else:
-                st.error(f"Error retrieving queries: {response.status_code} - {response.text}")
+                for query in queries:
+                    with st.expander(f"Query: {query['content'][:50]}... (Status: {query['status']})"):
+                        st.write(f"**Full Query:** {query['content']}")
+                        st.write(f"**Status:** {query['status']}")
+                        st.write(f"**Priority:** {query['priority']}")
+                        st.write(f"**Submitted:** {query['created_at']}")
+                        
+                        # Show uploaded files if any
+                        if query["files"]:
+                            st.write("**Uploaded Files:**")
+                            for file_info in query["files"]:
+                                st.write(f"- {file_info['filename']} ({file_info['file_type']})")
+                                show_extracted_text(API_URL, file_info, "patient")
+                        
+                        # Show review if available
+                        review = query.get("review")
+                        if review and (query['status'] == "reviewed" or query['status'] == "completed"):
+                            st.write("---")
+                            st.subheader("💡 Final Suggestion from Doctor")
+                            st.success(review["content"])
+                            st.caption(f"Reviewed by Doctor ID: {review['doctor_id']}")
+
+                            if review["approved"]:
+                                st.info("✅ This suggestion was approved by the doctor.")
+                            else:
+                                st.warning("✏️ This is a modified version of the AI suggestion.")
+        except requests.HTTPError as e:
+            st.error(f"Error retrieving queries: {e.response.status_code} - {e.response.text}")
         except Exception as e:
             st.error(f"Error: {str(e)}")
     
@@ -154,3 +141,11 @@ def show_patient_ui():
         """)
         
         st.warning("**Important**: This is a demo application. In a medical emergency, please call emergency services immediately.")
+
+    # Re-render when one of this patient's queries changes instead of waiting for a refresh click
+    if st.session_state.get("patient_live_updates"):
+        follow_events(
+            API_URL,
+            params={"patient_id": st.session_state.patient_id},
+            state_key="patient_last_event_id"
+        )